@@ -1,22 +1,121 @@
 import os
+from typing import Optional
 from flask import Flask, session, request
 from markupsafe import Markup
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, current_user
-from flask_migrate import Migrate
 from flask_socketio import SocketIO, emit, join_room, leave_room
-from dotenv import load_dotenv
+from .base_datos import (SesionEnrutada, columnas_faltantes, configurar_motor, marcar_revisiones, registrar_pragmas,
+                         revisiones_actuales, revisiones_head)
 
 # Inicialización de extensiones globales
-db = SQLAlchemy()                    # ORM para base de datos
+db = SQLAlchemy(session_options={'class_': SesionEnrutada})  # ORM con enrutado lectura/escritura
 login_manager = LoginManager()       # Gestión de sesiones y autenticación
-migrate = Migrate()                  # Sistema de migraciones de DB
+migrate = None                       # Sistema de migraciones de DB (se crea solo para la CLI)
 socketio = SocketIO()                # WebSockets para tiempo real
 
+_entorno_cargado = False             # .env se lee una vez por proceso
+_app_proceso = None                  # Primera app construida en este proceso (ver obtener_app)
 
-def create_app():
-    # Fábrica de aplicaciones Flask - Configura y retorna la app
-    load_dotenv()
+
+def _cargar_entorno():
+    global _entorno_cargado
+    if not _entorno_cargado:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _entorno_cargado = True
+
+
+def _iniciar_migraciones(app) -> bool:
+    # Flask-Migrate importa Alembic (lento); solo hace falta cuando la app se carga para un
+    # comando de la CLI de Flask que ella misma registra (flask db ..., flask conciliar-pagos):
+    # la CLI carga la app mientras resuelve el comando, antes de anotar el subcomando invocado.
+    # Con flask run, flask shell, etc. el subcomando ya está anotado y la app arranca completa.
+    # Devuelve True si la app se está cargando para esos comandos.
+    import click
+    contexto = click.get_current_context(silent=True)
+    if contexto is None or contexto.find_root().invoked_subcommand not in (None, 'db'):
+        return False
+    _registrar_migraciones(app)
+    return True
+
+
+def _cargada_por_flask_run() -> bool:
+    # flask run (con --app run.py o con la fábrica) es el único comando de la CLI que sirve peticiones
+    import click
+    contexto = click.get_current_context(silent=True)
+    return contexto is not None and contexto.find_root().invoked_subcommand == 'run'
+
+
+def _registrar_migraciones(app):
+    global migrate
+    from flask_migrate import Migrate
+    if migrate is None:
+        migrate = Migrate()
+    migrate.init_app(app, db, directory=app.config['MIGRACIONES_DIR'])
+
+
+REVISION_INICIAL = '0001_esquema_inicial'  # Esquema que creaba create_all antes de las migraciones
+
+
+def _preparar_esquema(app):
+    # Deja la base principal con el esquema de los modelos al arrancar (AUTO_CREAR_TABLAS):
+    #   - en la última revisión: no hace nada
+    #   - vacía: create_all y se anota la última revisión, como si se hubieran aplicado las migraciones
+    #   - con tablas pero sin alembic_version (creada con create_all antes de las migraciones): si le
+    #     faltan columnas se anota el esquema inicial y se aplican las migraciones; si no, se anota head
+    #   - versionada pero atrasada: solo se crean las tablas nuevas y se avisa (flask db upgrade)
+    directorio = app.config['MIGRACIONES_DIR']
+    heads = revisiones_head(directorio)
+    actuales = revisiones_actuales(db)
+    if heads and actuales == heads:
+        return
+    if actuales is not None:
+        app.logger.warning('La base está en la revisión %s y las migraciones en %s: ejecutar flask db upgrade',
+                           ', '.join(sorted(actuales)), ', '.join(sorted(heads)))
+        db.create_all(bind_key=None)
+        return
+    faltantes = columnas_faltantes(db)
+    if faltantes and heads:
+        app.logger.warning('Base sin versionar con el esquema anterior a las migraciones (faltan %s): '
+                           'se anota %s y se aplican las migraciones', faltantes, REVISION_INICIAL)
+        from flask_migrate import stamp, upgrade
+        _registrar_migraciones(app)
+        stamp(directory=directorio, revision=REVISION_INICIAL)
+        upgrade(directory=directorio)
+        return
+    db.create_all(bind_key=None)  # Solo la primaria; la réplica es de solo lectura
+    if heads:
+        marcar_revisiones(db, heads)
+
+
+def obtener_app():
+    # Devuelve la app ya construida en este proceso (o la crea) para reutilizarla
+    # desde hilos de trabajo, comandos y código sin contexto de aplicación
+    return _app_proceso or create_app()
+
+
+def iniciar_servicios(app):
+    # Hilos de fondo del proceso: índices de autocompletado y de alertas (se construyen mientras
+    # la app ya atiende), resumen de alertas, volcado de vistas y conciliación de pagos. Los hilos
+    # no sobreviven a un fork: con el servidor de varios procesos (servidor.py) cada worker los
+    # inicia después de crearse.
+    app.extensions['autocompletado'].iniciar()
+    app.extensions['alertas'].iniciar()
+    app.extensions['vistas'].iniciar()
+    if app.extensions['salud'].worker in (None, 0):
+        # La conciliación corre en un solo proceso (el worker 0 con servidor.py)
+        app.extensions['conciliacion'].iniciar()
+    app.extensions['salud'].servicios_iniciados = True
+
+
+def create_app(servicios: Optional[bool] = None):
+    # Fábrica de aplicaciones Flask - Configura y retorna la app. Los hilos de fondo solo arrancan
+    # en los puntos de entrada que sirven peticiones: run.py pasa servicios=True, flask run los
+    # inicia con el valor por defecto y servidor.py llama a iniciar_servicios en cada worker.
+    # En tests, scripts y benchmarks la app se construye sin hilos.
+    global _app_proceso
+    _cargar_entorno()
     app = Flask(__name__, instance_relative_config=True)
 
     # Configuración básica de la aplicación
@@ -27,16 +126,102 @@ def create_app():
         db_uri = 'sqlite:///' + os.path.join(app.instance_path, 'app.db')
     app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Pool de conexiones, PRAGMA de SQLite y réplica de lectura opcional
+    configurar_motor(app)
     upload_folder = os.path.join(app.root_path, 'static', 'uploads')
     os.makedirs(upload_folder, exist_ok=True)
     app.config['UPLOAD_FOLDER'] = upload_folder
+    # Demora simulada de la pasarela de pago (segundos)
+    app.config['PAGO_DEMORA_SEGUNDOS'] = float(os.environ.get('PAGO_DEMORA_SEGUNDOS', '2'))
+    # Cola de mensajes para compartir eventos de Socket.IO entre procesos
+    # (vacío = solo este proceso; "sqlite:///ruta.db" = broker local; redis://, amqp://, etc.)
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')
+    app.config['SOCKETIO_VENTANA_MS'] = float(os.environ.get('SOCKETIO_VENTANA_MS', '50'))
+    # Transportes que usa el navegador. Con varios procesos detrás del mismo puerto debe ser solo
+    # "websocket": el long-polling necesita que todas las peticiones lleguen al mismo proceso.
+    app.config['SOCKETIO_TRANSPORTES'] = os.environ.get('SOCKETIO_TRANSPORTES', 'polling,websocket').split(',')
+    # Migraciones de Alembic; si la base ya está en la última revisión no se ejecuta create_all
+    app.config['MIGRACIONES_DIR'] = os.path.join(os.path.dirname(app.root_path), 'migrations')
+    app.config['AUTO_CREAR_TABLAS'] = os.environ.get('AUTO_CREAR_TABLAS', '1') == '1'
+    # Caché de fragmentos de templates ({% cache %}); 0 entradas la desactiva
+    app.config['CACHE_FRAGMENTOS_MAX'] = int(os.environ.get('CACHE_FRAGMENTOS_MAX', '5000'))
+    # Auditoría con escritura diferida: cola acotada, lotes por tamaño o intervalo y política de desborde
+    # (bloquear | descartar | archivo)
+    app.config['AUDITORIA_CAPACIDAD'] = int(os.environ.get('AUDITORIA_CAPACIDAD', '10000'))
+    app.config['AUDITORIA_LOTE'] = int(os.environ.get('AUDITORIA_LOTE', '500'))
+    app.config['AUDITORIA_INTERVALO_MS'] = float(os.environ.get('AUDITORIA_INTERVALO_MS', '1000'))
+    app.config['AUDITORIA_DESBORDE'] = os.environ.get('AUDITORIA_DESBORDE', 'descartar')
+    app.config['AUDITORIA_ARCHIVO'] = os.environ.get(
+        'AUDITORIA_ARCHIVO', os.path.join(app.instance_path, 'auditoria_desborde.jsonl'))
+    # Control de admisión de endpoints costosos: tasa (tokens/s) y ráfaga por IP y por usuario,
+    # y máximo de peticiones simultáneas por proceso. Backend "" = memoria del proceso,
+    # "sqlite:///ruta.db" = compartido entre los procesos de la máquina.
+    app.config['LIMITES_ACTIVOS'] = os.environ.get('LIMITES_ACTIVOS', '1') == '1'
+    app.config['LIMITES_BACKEND'] = os.environ.get('LIMITES_BACKEND', '')
+    # Autocompletado de búsqueda: índice en memoria, reconstruido al iniciar y cada N segundos
+    # (0 = solo al iniciar) para incorporar lo que escriban otros procesos
+    app.config['AUTOCOMPLETADO_RECONSTRUIR_S'] = float(os.environ.get('AUTOCOMPLETADO_RECONSTRUIR_S', '600'))
+    # Alertas de búsquedas guardadas: reconstrucción del índice en memoria y resumen por email
+    # de las coincidencias pendientes cada N segundos (0 = índice solo al iniciar / sin resumen)
+    app.config['ALERTAS_RECONSTRUIR_S'] = float(os.environ.get('ALERTAS_RECONSTRUIR_S', '3600'))
+    app.config['ALERTAS_RESUMEN_S'] = float(os.environ.get('ALERTAS_RESUMEN_S', '900'))
+    # Compresión de respuestas HTML/JSON (brotli si el paquete está instalado, si no gzip)
+    # a partir de un tamaño mínimo, y minificado de templates al cargarlos
+    app.config['COMPRESION_ACTIVA'] = os.environ.get('COMPRESION_ACTIVA', '1') == '1'
+    app.config['COMPRESION_MINIMO_BYTES'] = int(os.environ.get('COMPRESION_MINIMO_BYTES', '1024'))
+    app.config['COMPRESION_NIVEL_GZIP'] = int(os.environ.get('COMPRESION_NIVEL_GZIP', '6'))
+    app.config['COMPRESION_NIVEL_BROTLI'] = int(os.environ.get('COMPRESION_NIVEL_BROTLI', '5'))
+    app.config['HTML_MINIFICAR'] = os.environ.get('HTML_MINIFICAR', '1') == '1'
+    # Vistas del detalle: contadores en memoria volcados cada N segundos, sin contar bots ni la
+    # misma propiedad dos veces por sesión dentro de la ventana (0 = sin deduplicar), y vida media
+    # en días del puntaje de popularidad que ordena "Más vistas"
+    app.config['VISTAS_ACTIVAS'] = os.environ.get('VISTAS_ACTIVAS', '1') == '1'
+    app.config['VISTAS_INTERVALO_S'] = float(os.environ.get('VISTAS_INTERVALO_S', '10'))
+    app.config['VISTAS_FRAGMENTOS'] = int(os.environ.get('VISTAS_FRAGMENTOS', '16'))
+    app.config['VISTAS_VIDA_MEDIA_DIAS'] = float(os.environ.get('VISTAS_VIDA_MEDIA_DIAS', '7'))
+    app.config['VISTAS_FILTRAR_BOTS'] = os.environ.get('VISTAS_FILTRAR_BOTS', '1') == '1'
+    app.config['VISTAS_DEDUPLICAR_S'] = float(os.environ.get('VISTAS_DEDUPLICAR_S', '1800'))
+    # Conciliación del estado de venta cada N segundos (0 = solo con flask conciliar-pagos), en lotes
+    # de CONCILIACION_LOTE filas; los pagos en "procesando" más viejos que PAGOS_PROCESANDO_MAX_S expiran
+    app.config['CONCILIACION_INTERVALO_S'] = float(os.environ.get('CONCILIACION_INTERVALO_S', '600'))
+    app.config['CONCILIACION_LOTE'] = int(os.environ.get('CONCILIACION_LOTE', '500'))
+    app.config['PAGOS_PROCESANDO_MAX_S'] = float(os.environ.get('PAGOS_PROCESANDO_MAX_S', '900'))
+    app.config['LIMITES'] = {
+        'pago_estado': {'tasa': 2.0, 'rafaga': 10, 'concurrencia': 16},
+        'login': {'tasa': 0.2, 'rafaga': 10, 'concurrencia': 4},
+        'login_cuenta': {'tasa': 0.05, 'rafaga': 30},
+        'busqueda': {'tasa': 2.0, 'rafaga': 20, 'concurrencia': 8},
+        'sugerencias': {'tasa': 20.0, 'rafaga': 40},
+    }
 
     # Inicializar extensiones con la aplicación
     db.init_app(app)
-    migrate.init_app(app, db)
+    registrar_pragmas(app, db)
+    desde_cli = _iniciar_migraciones(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
-    socketio.init_app(app, cors_allowed_origins="*")  # Permitir CORS para WebSockets
+    from .compresion import configurar as configurar_compresion
+    configurar_compresion(app)
+    from .difusion import configurar as configurar_difusion, crear_gestor_cola
+    socketio.init_app(app, cors_allowed_origins="*",  # Permitir CORS para WebSockets
+                      client_manager=crear_gestor_cola(app.config['SOCKETIO_MESSAGE_QUEUE']))
+    configurar_difusion(app)
+    # Estado del proceso para /salud y /listo; cuenta también las conexiones de Socket.IO
+    from .salud import EstadoProceso
+    app.extensions['salud'] = EstadoProceso()
+    app.wsgi_app = app.extensions['salud'].envolver(app.wsgi_app)
+    from .auditoria import configurar as configurar_auditoria
+    configurar_auditoria(app)
+    from .limites import configurar as configurar_limites
+    configurar_limites(app)
+    from .autocompletado import configurar as configurar_autocompletado
+    configurar_autocompletado(app)
+    from .alertas import configurar as configurar_alertas
+    configurar_alertas(app)
+    from .vistas import configurar as configurar_vistas
+    configurar_vistas(app)
+    from .conciliacion import configurar as configurar_conciliacion
+    configurar_conciliacion(app)
 
     # Configurar el cargador de usuarios para Flask-Login
     from .models import Usuario
@@ -51,10 +236,16 @@ def create_app():
     from .routes.auth import auth_bp
     from .routes.propiedades import propiedades_bp
     from .routes.pago import pago_bp
+    from .salud import salud_bp
     app.register_blueprint(main_bp)
+    app.register_blueprint(salud_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(propiedades_bp, url_prefix='/propiedades')
     app.register_blueprint(pago_bp, url_prefix='/pago')
+
+    # Comandos de mantenimiento de la CLI de Flask
+    from .comandos import registrar_comandos
+    registrar_comandos(app)
     
     # Manejar conexiones de Socket.IO para notificaciones en tiempo real
     @socketio.on('connect')
@@ -67,6 +258,22 @@ def create_app():
         if current_user.is_authenticated:
             leave_room(f'user_{current_user.id}')
 
+    @socketio.on('seguir_propiedades')
+    def handle_seguir_propiedades(datos):
+        # El cliente se une a la sala de cada propiedad que tiene en pantalla para recibir
+        # ventas y cambios de precio en vivo (también usuarios anónimos)
+        from .difusion import MAX_SALAS_POR_CLIENTE, sala_propiedad
+        ids = datos.get('ids') if isinstance(datos, dict) else None
+        for propiedad_id in (ids if isinstance(ids, list) else [])[:MAX_SALAS_POR_CLIENTE]:
+            if isinstance(propiedad_id, int):
+                join_room(sala_propiedad(propiedad_id))
+
+    # Caché de fragmentos renderizados, compartida por todos los templates de la app
+    from .cache_fragmentos import CacheLRU, ExtensionCacheFragmentos
+    app.jinja_env.add_extension(ExtensionCacheFragmentos)
+    if app.config['CACHE_FRAGMENTOS_MAX'] > 0:
+        app.jinja_env.cache_fragmentos = CacheLRU(max_entradas=app.config['CACHE_FRAGMENTOS_MAX'])
+
     # nl2br para que los saltos de linea se muestren en el template
     @app.template_filter('nl2br')
     def nl2br_filter(value):
@@ -74,8 +281,16 @@ def create_app():
             return ''
         return Markup(value.replace('\n', '<br>'))
 
-    # Crear tablas de la base de datos si no existen
-    with app.app_context():
-        db.create_all()
+    # Crear o actualizar el esquema si no está en la última revisión (ver _preparar_esquema).
+    # Desde la CLI el esquema lo gestionan las migraciones (flask db upgrade).
+    if app.config['AUTO_CREAR_TABLAS'] and not desde_cli:
+        with app.app_context():
+            _preparar_esquema(app)
+    if servicios is None:
+        servicios = _cargada_por_flask_run()
+    if servicios and not desde_cli:
+        iniciar_servicios(app)
 
+    if _app_proceso is None:
+        _app_proceso = app
     return app
@@ -0,0 +1,372 @@
+import logging
+import math
+import re
+import time
+from collections import defaultdict
+from datetime import datetime
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from uuid import uuid4
+
+from flask import current_app, has_app_context
+from sqlalchemy import insert, select, update
+
+from . import db, difusion, eventos
+from .autocompletado import normalizar
+
+_RE_PALABRA = re.compile(r'\w+', re.UNICODE)
+
+# Cubos de precio en escala logarítmica: cada uno es un 25% más ancho que el anterior,
+# así un rango de precios ocupa pocas entradas del índice sin importar su magnitud
+_BASE_CUBOS = 1.25
+_CUBO_MAXIMO = 120  # ~4e11: cualquier precio razonable entra por debajo
+
+logger = logging.getLogger(__name__)
+
+
+def terminos(*textos: Optional[str]) -> FrozenSet[str]:
+    # Palabras normalizadas (sin tildes, minúsculas) de los textos, incluidos los números
+    return frozenset(normalizar(p) for texto in textos for p in _RE_PALABRA.findall(texto or ''))
+
+
+def cubo_precio(precio: float) -> int:
+    # inf, nan y los precios enormes van al último cubo (math.log no acepta nan e int() no acepta inf)
+    if not precio < _BASE_CUBOS ** _CUBO_MAXIMO:
+        return _CUBO_MAXIMO
+    return min(_CUBO_MAXIMO, int(math.log(max(precio, 1.0), _BASE_CUBOS)))
+
+
+class IndiceBusquedas:
+    # Índice invertido de búsquedas guardadas. Cada búsqueda se registra una sola vez:
+    # - con texto: bajo su palabra más larga (la más selectiva, en la práctica);
+    # - sin texto: en cada cubo de precio que cubre su rango.
+    # Para una propiedad nueva solo se verifican las búsquedas de sus palabras y de su cubo
+    # de precio, en lugar de recorrer todas las búsquedas guardadas.
+    def __init__(self):
+        self._bloqueo = Lock()
+        self.ultimo_id = 0  # Mayor id agregado alguna vez: las búsquedas con id mayor aún no están
+        self._busquedas: Dict[int, Tuple[int, FrozenSet[str], Optional[float], Optional[float]]] = {}
+        self._por_termino: Dict[str, Set[int]] = {}
+        self._por_cubo: Dict[int, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._busquedas)
+
+    def _entradas(self, criterios) -> List[Tuple[Dict[Any, Set[int]], Any]]:
+        _, palabras_busqueda, precio_min, precio_max = criterios
+        if palabras_busqueda:
+            return [(self._por_termino, max(palabras_busqueda, key=lambda p: (len(p), p)))]
+        desde = cubo_precio(precio_min) if precio_min is not None else 0
+        hasta = cubo_precio(precio_max) if precio_max is not None else _CUBO_MAXIMO
+        return [(self._por_cubo, cubo) for cubo in range(desde, hasta + 1)]
+
+    def agregar(self, busqueda_id: int, usuario_id: int, texto: Optional[str],
+                precio_min: Optional[float], precio_max: Optional[float]) -> bool:
+        # Una fila con precios no finitos (guardada antes de validarlos) se omite: no debe
+        # impedir que se reconstruya el índice de todos los demás
+        valida = all(precio is None or math.isfinite(precio) for precio in (precio_min, precio_max))
+        criterios = (usuario_id, terminos(texto), precio_min, precio_max)
+        with self._bloqueo:
+            self.ultimo_id = max(self.ultimo_id, busqueda_id)
+            if not valida:
+                logger.warning('Búsqueda guardada %s omitida: precio no válido (%s, %s)',
+                               busqueda_id, precio_min, precio_max)
+                return False
+            self._quitar(busqueda_id)
+            self._busquedas[busqueda_id] = criterios
+            for publicaciones, clave in self._entradas(criterios):
+                publicaciones.setdefault(clave, set()).add(busqueda_id)
+        return True
+
+    def quitar(self, busqueda_id: int):
+        with self._bloqueo:
+            self._quitar(busqueda_id)
+
+    def _quitar(self, busqueda_id: int):
+        criterios = self._busquedas.pop(busqueda_id, None)
+        if criterios is None:
+            return
+        for publicaciones, clave in self._entradas(criterios):
+            ids = publicaciones.get(clave)
+            if ids is not None:
+                ids.discard(busqueda_id)
+                if not ids:
+                    del publicaciones[clave]
+
+    def coincidencias(self, propiedad: Dict[str, Any]) -> List[Tuple[int, int]]:
+        # (busqueda_id, usuario_id) de las búsquedas que aceptan la propiedad; las del propietario no cuentan
+        palabras_propiedad = terminos(propiedad['titulo'], propiedad['descripcion'], propiedad['direccion'])
+        precio = propiedad['precio']
+        resultado = []
+        with self._bloqueo:
+            candidatas: Set[int] = set(self._por_cubo.get(cubo_precio(precio), ()))
+            for palabra in palabras_propiedad:
+                candidatas.update(self._por_termino.get(palabra, ()))
+            for busqueda_id in candidatas:
+                usuario_id, palabras_busqueda, precio_min, precio_max = self._busquedas[busqueda_id]
+                if (usuario_id != propiedad['propietario_id']
+                        and palabras_busqueda <= palabras_propiedad
+                        and (precio_min is None or precio >= precio_min)
+                        and (precio_max is None or precio <= precio_max)):
+                    resultado.append((busqueda_id, usuario_id))
+        return resultado
+
+
+class EnviadorCorreoLog:
+    # Envío de correo por defecto: deja el resumen en el log (no hay servidor SMTP configurado).
+    # Cualquier objeto con enviar(destinatario, asunto, cuerpo) puede reemplazarlo.
+    def __init__(self, logger):
+        self.logger = logger
+
+    def enviar(self, destinatario: str, asunto: str, cuerpo: str):
+        self.logger.info('Correo para %s: %s\n%s', destinatario, asunto, cuerpo)
+
+
+class Alertas:
+    # Alertas de búsquedas guardadas del proceso: índice en memoria (reconstruido en segundo plano
+    # y actualizado al guardar o borrar búsquedas), evaluación de propiedades nuevas en un trabajo
+    # aparte y resumen periódico por email de las alertas pendientes.
+    # Con varios workers, agregar/quitar solo tocan el índice del worker que atendió la petición:
+    # antes de evaluar se cargan las búsquedas con id mayor al último indexado y, antes de guardar
+    # alertas, se descartan las de búsquedas que ya no existen. Ambas son lecturas por clave primaria.
+    def __init__(self, app, intervalo_reconstruccion: float = 0, intervalo_resumen: float = 0,
+                 enviador=None):
+        self.app = app
+        self.intervalo_reconstruccion = intervalo_reconstruccion
+        self.intervalo_resumen = intervalo_resumen
+        self.enviador = enviador or EnviadorCorreoLog(app.logger)
+        self.indice = IndiceBusquedas()
+        self.listo = False
+        self._bloqueo = Lock()
+        self._bloqueo_reconstruccion = Lock()
+        self._reconstruyendo = False
+        self._cambios_durante_reconstruccion: List[Callable[[IndiceBusquedas], None]] = []
+        self._hilos: List[Thread] = []
+
+        self.reconstrucciones = 0
+        self.ultima_reconstruccion_ms = 0.0
+        self.propiedades_evaluadas = 0
+        self.coincidencias = 0
+        self.tiempo_evaluacion = 0.0
+        self.resumenes_enviados = 0
+        self.alertas_enviadas = 0
+
+    # ----- Índice -----
+
+    def _cambiar(self, cambio: Callable[[IndiceBusquedas], None]):
+        with self._bloqueo:
+            if self._reconstruyendo:
+                self._cambios_durante_reconstruccion.append(cambio)
+            cambio(self.indice)
+
+    def agregar(self, busqueda):
+        # Se llama después de confirmar la búsqueda guardada
+        datos = (busqueda.id, busqueda.usuario_id, busqueda.texto, busqueda.precio_min, busqueda.precio_max)
+        self._cambiar(lambda indice: indice.agregar(*datos))
+
+    def quitar(self, busqueda_id: int):
+        self._cambiar(lambda indice: indice.quitar(busqueda_id))
+
+    def reconstruir(self, lote: int = 5000):
+        # Igual que el autocompletado: índice nuevo leído por lotes, reemplazo de una vez
+        # y reaplicación de lo que cambió mientras tanto (agregar y quitar son idempotentes)
+        from .models import BusquedaGuardada
+        with self._bloqueo_reconstruccion:
+            inicio = time.perf_counter()
+            with self._bloqueo:
+                self._reconstruyendo = True
+                self._cambios_durante_reconstruccion = []
+            nuevo = IndiceBusquedas()
+            try:
+                with self.app.app_context():
+                    filas = db.session.query(BusquedaGuardada.id, BusquedaGuardada.usuario_id, BusquedaGuardada.texto,
+                                             BusquedaGuardada.precio_min, BusquedaGuardada.precio_max) \
+                        .execution_options(yield_per=lote)
+                    for fila in filas:
+                        nuevo.agregar(*fila)
+                    db.session.remove()
+                with self._bloqueo:
+                    for cambio in self._cambios_durante_reconstruccion:
+                        cambio(nuevo)
+                    self.indice = nuevo
+                    self.listo = True
+            finally:
+                with self._bloqueo:
+                    self._reconstruyendo = False
+                    self._cambios_durante_reconstruccion = []
+            self.reconstrucciones += 1
+            self.ultima_reconstruccion_ms = round((time.perf_counter() - inicio) * 1000, 2)
+
+    def sincronizar(self) -> int:
+        # Agrega al índice las búsquedas guardadas desde otros workers; devuelve cuántas
+        from .models import BusquedaGuardada
+        with self.app.app_context():
+            filas = db.session.execute(
+                select(BusquedaGuardada.id, BusquedaGuardada.usuario_id, BusquedaGuardada.texto,
+                       BusquedaGuardada.precio_min, BusquedaGuardada.precio_max)
+                .where(BusquedaGuardada.id > self.indice.ultimo_id).order_by(BusquedaGuardada.id)).all()
+        for fila in filas:
+            self._cambiar(lambda indice, datos=tuple(fila): indice.agregar(*datos))
+        return len(filas)
+
+    def _vigentes(self, busqueda_ids: Set[int]) -> Set[int]:
+        # Las búsquedas borradas desde otro worker siguen en este índice: se quitan al detectarlas
+        from .models import BusquedaGuardada
+        with self.app.app_context():
+            vigentes = set(db.session.execute(
+                select(BusquedaGuardada.id).where(BusquedaGuardada.id.in_(busqueda_ids))).scalars())
+        for busqueda_id in busqueda_ids - vigentes:
+            self.quitar(busqueda_id)
+        return vigentes
+
+    # ----- Propiedades nuevas -----
+
+    def encolar(self, propiedades: List[Dict[str, Any]]):
+        from .tasks import enviar_trabajo
+        enviar_trabajo(self.app, self.procesar_nuevas, propiedades, meta={'alertas': len(propiedades)})
+
+    def procesar_nuevas(self, propiedades: Iterable[Dict[str, Any]]) -> int:
+        # Busca las búsquedas que aceptan cada propiedad, guarda una alerta por usuario y propiedad
+        # para el resumen y avisa en tiempo real a la sala del usuario. Devuelve las alertas creadas.
+        # Las importaciones masivas (que no pasan por la sesión del ORM) deben llamarla directamente.
+        from .models import AlertaBusqueda
+        if not self.listo:
+            self.reconstruir()
+        else:
+            self.sincronizar()
+        inicio = time.perf_counter()
+        evaluadas = []
+        for propiedad in propiedades:
+            self.propiedades_evaluadas += 1
+            evaluadas.append((propiedad, self.indice.coincidencias(propiedad)))
+        self.tiempo_evaluacion += time.perf_counter() - inicio
+        candidatas = {busqueda_id for _, pares in evaluadas for busqueda_id, _ in pares}
+        if not candidatas:
+            return 0
+
+        vigentes = self._vigentes(candidatas)
+        alertas = []
+        for propiedad, pares in evaluadas:
+            usuarios_avisados: Set[int] = set()
+            for busqueda_id, usuario_id in pares:
+                if busqueda_id not in vigentes or usuario_id in usuarios_avisados:
+                    continue
+                usuarios_avisados.add(usuario_id)
+                alertas.append({
+                    'usuario_id': usuario_id,
+                    'busqueda_id': busqueda_id,
+                    'propiedad_id': propiedad['id'],
+                    'titulo': propiedad['titulo'],
+                    'precio': propiedad['precio'],
+                    'fecha': datetime.utcnow(),
+                })
+        if not alertas:
+            return 0
+
+        with self.app.app_context():
+            with db.engine.begin() as conexion:
+                conexion.execute(insert(AlertaBusqueda.__table__), alertas)
+        self.coincidencias += len(alertas)
+        for alerta in alertas:
+            difusion.emitir('busqueda_coincidencia', {
+                'mensaje': f'Nueva propiedad para tu búsqueda guardada: {alerta["titulo"]}',
+                'propiedad_id': alerta['propiedad_id'],
+                'titulo': alerta['titulo'],
+                'precio': alerta['precio'],
+            }, room=f'user_{alerta["usuario_id"]}')
+        return len(alertas)
+
+    # ----- Resumen por email -----
+
+    def enviar_resumenes(self, lote: int = 1000) -> int:
+        # Reclama lotes de alertas pendientes con un solo UPDATE (seguro con varios procesos:
+        # cada fila queda marcada por un único envío), agrupa por usuario y envía un correo a cada uno.
+        # Si un envío falla, sus alertas se liberan para el próximo intento.
+        from .models import AlertaBusqueda, Usuario
+        enviadas = 0
+        while True:
+            token = str(uuid4())
+            pendientes = select(AlertaBusqueda.id).where(AlertaBusqueda.lote.is_(None)) \
+                .order_by(AlertaBusqueda.usuario_id, AlertaBusqueda.id).limit(lote)
+            db.session.execute(
+                update(AlertaBusqueda).where(AlertaBusqueda.id.in_(pendientes))
+                .values(lote=token, fecha_envio=datetime.utcnow()),
+                execution_options={'synchronize_session': False})
+            db.session.commit()
+            reclamadas = db.session.execute(
+                select(AlertaBusqueda.id, AlertaBusqueda.usuario_id, AlertaBusqueda.propiedad_id,
+                       AlertaBusqueda.titulo, AlertaBusqueda.precio)
+                .where(AlertaBusqueda.lote == token).order_by(AlertaBusqueda.usuario_id, AlertaBusqueda.id)).all()
+            if not reclamadas:
+                return enviadas
+
+            por_usuario: Dict[int, List[Any]] = defaultdict(list)
+            for fila in reclamadas:
+                por_usuario[fila.usuario_id].append(fila)
+            destinatarios = dict(db.session.execute(
+                select(Usuario.id, Usuario.email).where(Usuario.id.in_(list(por_usuario)))).all())
+            fallidas: List[int] = []
+            for usuario_id, filas in por_usuario.items():
+                email = destinatarios.get(usuario_id)
+                if email is None:
+                    continue  # Usuario eliminado: la alerta queda marcada y no se reintenta
+                cuerpo = '\n'.join(f'- {f.titulo} (${f.precio:,.0f}): /propiedades/{f.propiedad_id}' for f in filas)
+                try:
+                    self.enviador.enviar(email, f'{len(filas)} propiedades nuevas para tus búsquedas guardadas',
+                                         cuerpo)
+                    self.resumenes_enviados += 1
+                    enviadas += len(filas)
+                except Exception:  # noqa: BLE001
+                    self.app.logger.error('No se pudo enviar el resumen de alertas a %s', email, exc_info=True)
+                    fallidas.extend(f.id for f in filas)
+            if fallidas:
+                db.session.execute(
+                    update(AlertaBusqueda).where(AlertaBusqueda.id.in_(fallidas)).values(lote=None, fecha_envio=None),
+                    execution_options={'synchronize_session': False})
+                db.session.commit()
+            self.alertas_enviadas = self.alertas_enviadas + len(reclamadas) - len(fallidas)
+            if fallidas or len(reclamadas) < lote:
+                return enviadas
+
+    # ----- Control -----
+
+    def iniciar(self):
+        # Construcción inicial (y periódica) del índice y envío periódico del resumen, en hilos de fondo
+        if self._hilos:
+            return
+        from .tasks import programar_trabajo_periodico
+        self._hilos.append(programar_trabajo_periodico(self.app, self.reconstruir, self.intervalo_reconstruccion,
+                                                       'alertas-indice'))
+        if self.intervalo_resumen:
+            self._hilos.append(programar_trabajo_periodico(self.app, self.enviar_resumenes, self.intervalo_resumen,
+                                                           'alertas-resumen', inmediato=False))
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            'listo': self.listo,
+            'busquedas': len(self.indice),
+            'reconstrucciones': self.reconstrucciones,
+            'ultima_reconstruccion_ms': self.ultima_reconstruccion_ms,
+            'propiedades_evaluadas': self.propiedades_evaluadas,
+            'coincidencias': self.coincidencias,
+            'evaluacion_media_us': (round(self.tiempo_evaluacion / self.propiedades_evaluadas * 1e6, 2)
+                                    if self.propiedades_evaluadas else 0.0),
+            'resumenes_enviados': self.resumenes_enviados,
+            'alertas_enviadas': self.alertas_enviadas,
+        }
+
+
+@eventos.suscribir
+def _cambios_confirmados(cambios: List[Dict[str, Any]]):
+    # Las propiedades recién publicadas se evalúan en un trabajo aparte, fuera de la petición
+    if has_app_context():
+        alertas = current_app.extensions.get('alertas')
+        nuevas = [c['propiedad'] for c in cambios if c['operacion'] == eventos.CREADA]
+        if alertas is not None and nuevas:
+            alertas.encolar(nuevas)
+
+
+def configurar(app):
+    app.extensions['alertas'] = Alertas(
+        app, intervalo_reconstruccion=app.config['ALERTAS_RECONSTRUIR_S'],
+        intervalo_resumen=app.config['ALERTAS_RESUMEN_S'])
@@ -0,0 +1,278 @@
+import atexit
+import glob
+import json
+import os
+import queue
+import time
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Any, Dict, List, Optional
+
+from flask import current_app, has_app_context
+from sqlalchemy import insert
+
+from . import db
+
+# Políticas cuando la cola en memoria está llena
+DESBORDE_BLOQUEAR = 'bloquear'    # La petición espera (hasta espera_maxima) a que haya lugar
+DESBORDE_DESCARTAR = 'descartar'  # Se descarta el evento y se cuenta
+DESBORDE_ARCHIVO = 'archivo'      # Se agrega a un archivo local (JSON por línea) que el escritor reingresa
+                                  # (uno por proceso: <archivo sin extensión>.<pid><extensión>)
+POLITICAS_DESBORDE = (DESBORDE_BLOQUEAR, DESBORDE_DESCARTAR, DESBORDE_ARCHIVO)
+
+
+class RegistroAuditoria:
+    # Registro de auditoría con escritura diferida: registrar() solo encola un diccionario
+    # y un hilo escritor inserta los eventos en lotes (por tamaño o por intervalo),
+    # de modo que la petición no paga un INSERT + commit por cada evento.
+    def __init__(self, capacidad: int = 10_000, lote: int = 500, intervalo: float = 1.0,
+                 desborde: str = DESBORDE_DESCARTAR, archivo: Optional[str] = None,
+                 espera_maxima: float = 5.0):
+        if desborde not in POLITICAS_DESBORDE:
+            raise ValueError(f'Política de desborde no válida: {desborde}')
+        self.lote = lote
+        self.intervalo = intervalo
+        self.desborde = desborde
+        self.archivo = archivo
+        self.espera_maxima = espera_maxima
+        self.app = None
+        self._cola: 'queue.Queue' = queue.Queue(maxsize=capacidad)
+        self._bloqueo = Lock()
+        self._bloqueo_archivo = Lock()
+        self._hilo: Optional[Thread] = None
+        self._detenido = False
+
+        self.encolados = 0
+        self.escritos = 0
+        self.lotes = 0
+        self.descartados = 0
+        self.desbordados = 0   # Enviados al archivo de desborde
+        self.reingresados = 0  # Leídos del archivo de desborde e insertados
+        self.errores = 0
+        self.tiempo_registro = 0.0
+
+    # ----- Lado de la petición -----
+
+    def registrar(self, accion: str, actor_id: Optional[int] = None, objetivo_tipo: Optional[str] = None,
+                  objetivo_id: Optional[int] = None, **detalles):
+        inicio = time.perf_counter()
+        evento = {
+            'fecha': datetime.utcnow(),
+            'accion': accion,
+            'actor_id': actor_id,
+            'objetivo_tipo': objetivo_tipo,
+            'objetivo_id': objetivo_id,
+            'detalles': detalles or None,
+        }
+        try:
+            if self.desborde == DESBORDE_BLOQUEAR:
+                self._cola.put(evento, timeout=self.espera_maxima)
+            else:
+                self._cola.put_nowait(evento)
+            self.encolados += 1
+        except queue.Full:
+            if self.desborde == DESBORDE_ARCHIVO and self.archivo:
+                self._desbordar([evento])
+            else:
+                self.descartados += 1
+        self._asegurar_escritor()
+        self.tiempo_registro += time.perf_counter() - inicio
+
+    def _asegurar_escritor(self):
+        if self._hilo is not None or self.app is None:
+            return
+        with self._bloqueo:
+            if self._hilo is None and not self._detenido:
+                self._hilo = Thread(target=self._bucle, name='auditoria-escritor', daemon=True)
+                self._hilo.start()
+
+    # ----- Hilo escritor -----
+
+    def _bucle(self):
+        pendientes: List[Dict[str, Any]] = []
+        limite = time.monotonic() + self.intervalo
+        while True:
+            try:
+                elemento = self._cola.get(timeout=max(0.0, limite - time.monotonic()))
+            except queue.Empty:
+                elemento = None
+
+            if isinstance(elemento, Event):
+                # Pedido de vaciado (vaciar/detener): se escribe lo acumulado y se avisa
+                self._escribir(pendientes)
+                pendientes = []
+                self._reingresar()
+                elemento.set()
+                if self._detenido:
+                    return
+                continue
+            if elemento is not None:
+                pendientes.append(elemento)
+            if len(pendientes) >= self.lote or time.monotonic() >= limite:
+                self._escribir(pendientes)
+                pendientes = []
+                if self._cola.empty():
+                    self._reingresar()
+                limite = time.monotonic() + self.intervalo
+
+    def _escribir(self, eventos: List[Dict[str, Any]]):
+        if not eventos:
+            return
+        from .models import EventoAuditoria
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as conexion:
+                    for inicio in range(0, len(eventos), self.lote):
+                        conexion.execute(insert(EventoAuditoria.__table__), eventos[inicio:inicio + self.lote])
+            self.escritos += len(eventos)
+            self.lotes += 1
+        except Exception:  # noqa: BLE001
+            self.errores += 1
+            self.app.logger.error('No se pudieron guardar %d eventos de auditoría', len(eventos), exc_info=True)
+            if self.desborde == DESBORDE_ARCHIVO and self.archivo:
+                self._desbordar(eventos)
+            else:
+                self.descartados += len(eventos)
+
+    # ----- Archivo de desborde -----
+
+    def _archivo_propio(self) -> str:
+        # Los workers de servidor.py comparten AUDITORIA_ARCHIVO y se crean con fork después de
+        # configurar el registro: el pid se toma al usarlo, no al crearlo
+        raiz, extension = os.path.splitext(self.archivo)
+        return f'{raiz}.{os.getpid()}{extension}'
+
+    def _archivos_a_reingresar(self) -> List[str]:
+        # El de este proceso y los que dejaron procesos que ya terminaron (p. ej., workers de una recarga)
+        raiz, extension = os.path.splitext(self.archivo)
+        archivos = []
+        for ruta in glob.glob(f'{glob.escape(raiz)}.*{glob.escape(extension)}'):
+            pid = ruta[len(raiz) + 1:len(ruta) - len(extension)]
+            if pid.isdigit() and (int(pid) == os.getpid() or not _proceso_vivo(int(pid))):
+                archivos.append(ruta)
+        return archivos
+
+    def _desbordar(self, eventos: List[Dict[str, Any]]):
+        with self._bloqueo_archivo:
+            with open(self._archivo_propio(), 'a', encoding='utf-8') as f:
+                for evento in eventos:
+                    f.write(json.dumps({**evento, 'fecha': evento['fecha'].isoformat()}) + '\n')
+        self.desbordados += len(eventos)
+
+    def _reingresar(self):
+        # Un error al reingresar no puede terminar el hilo escritor: se registra y se sigue
+        try:
+            self._reingresar_desborde()
+        except Exception:  # noqa: BLE001
+            self.errores += 1
+            self.app.logger.error('No se pudo reingresar el desborde de auditoría', exc_info=True)
+
+    def _reingresar_desborde(self):
+        # Inserta lo que se haya desbordado a archivo cuando la cola vuelve a tener lugar
+        if not self.archivo:
+            return
+        procesando = self._archivo_propio() + '.procesando'
+        for ruta in self._archivos_a_reingresar():
+            with self._bloqueo_archivo:
+                try:
+                    os.replace(ruta, procesando)
+                except FileNotFoundError:
+                    continue  # Otro proceso tomó el archivo de un worker terminado
+            eventos = []
+            with open(procesando, encoding='utf-8') as f:
+                for linea in f:
+                    if not linea.strip():
+                        continue
+                    try:
+                        evento = json.loads(linea)
+                        evento['fecha'] = datetime.fromisoformat(evento['fecha'])
+                    except (ValueError, TypeError, KeyError):
+                        # Línea truncada (p. ej., el proceso murió escribiéndola): se descarta
+                        self.descartados += 1
+                        self.app.logger.error('Línea ilegible en el desborde de auditoría %s: %r', ruta, linea[:200])
+                        continue
+                    eventos.append(evento)
+            os.remove(procesando)
+            escritos_antes = self.escritos
+            self._escribir(eventos)
+            self.reingresados += self.escritos - escritos_antes
+
+    # ----- Control -----
+
+    def vaciar(self, timeout: float = 10.0) -> bool:
+        # Espera a que todo lo encolado hasta ahora quede escrito; devuelve False si no se pudo
+        if self._hilo is None:
+            self._asegurar_escritor()
+            if self._hilo is None:
+                return self._cola.empty()
+        listo = Event()
+        self._cola.put(listo)
+        return listo.wait(timeout)
+
+    def detener(self, timeout: float = 10.0):
+        # Vacía la cola y termina el hilo escritor (se llama al salir del proceso)
+        if self._hilo is None:
+            return
+        self._detenido = True
+        self.vaciar(timeout)
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            'politica_desborde': self.desborde,
+            'en_cola': self._cola.qsize(),
+            'encolados': self.encolados,
+            'escritos': self.escritos,
+            'lotes': self.lotes,
+            'descartados': self.descartados,
+            'desbordados': self.desbordados,
+            'reingresados': self.reingresados,
+            'errores': self.errores,
+            'registro_medio_us': round(self.tiempo_registro / self.encolados * 1e6, 2) if self.encolados else 0.0,
+        }
+
+
+def _proceso_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def configurar(app):
+    # Registro propio de cada app, con su configuración: sus eventos solo se escriben en su base.
+    # El hilo escritor arranca con el primer evento.
+    registro = RegistroAuditoria(
+        capacidad=app.config['AUDITORIA_CAPACIDAD'],
+        lote=app.config['AUDITORIA_LOTE'],
+        intervalo=app.config['AUDITORIA_INTERVALO_MS'] / 1000.0,
+        desborde=app.config['AUDITORIA_DESBORDE'],
+        archivo=app.config['AUDITORIA_ARCHIVO'],
+    )
+    registro.app = app
+    app.extensions['auditoria'] = registro
+    atexit.register(registro.detener)
+
+
+def _registro_actual() -> Optional[RegistroAuditoria]:
+    return current_app.extensions.get('auditoria') if has_app_context() else None
+
+
+def registrar(accion: str, actor_id: Optional[int] = None, objetivo_tipo: Optional[str] = None,
+              objetivo_id: Optional[int] = None, **detalles):
+    # Punto único para registrar eventos de auditoría desde rutas o hilos de trabajo (en el contexto de la app)
+    registro = _registro_actual()
+    if registro is not None:
+        registro.registrar(accion, actor_id, objetivo_tipo, objetivo_id, **detalles)
+
+
+def vaciar(timeout: float = 10.0) -> bool:
+    registro = _registro_actual()
+    return registro.vaciar(timeout) if registro is not None else True
+
+
+def metricas() -> Dict[str, Any]:
+    registro = _registro_actual()
+    return registro.metricas() if registro is not None else {}
@@ -26,7 +26,7 @@ def admin_required(f):
         # Luego verificar si es administrador
         if not current_user.es_admin:
             flash('Acceso denegado. Se requieren privilegios de administrador.', 'danger')
-            return redirect(url_for('main.index'))
+            return redirect(url_for('main.inicio'))
             
         return f(*args, **kwargs)
     return decorated_function
@@ -47,7 +47,7 @@ def propietario_o_admin_required(f):
         # Verificar si es propietario o administrador
         if not (current_user.es_admin or propiedad.propietario_id == current_user.id):
             flash('No tienes permiso para realizar esta acción.', 'danger')
-            return redirect(url_for('main.index'))
+            return redirect(url_for('main.inicio'))
             
         return f(propiedad_id, *args, **kwargs)
     return decorated_function
@@ -0,0 +1,204 @@
+import re
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+from heapq import nlargest
+from threading import Lock, Thread
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app, has_app_context
+
+from . import db, eventos
+
+_RE_PALABRA = re.compile(r'\w+', re.UNICODE)
+
+
+def normalizar(texto: str) -> str:
+    # Minúsculas y sin tildes, para que "cordoba" encuentre "Córdoba"
+    descompuesto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def palabras(*textos: Optional[str]) -> Dict[str, str]:
+    # Palabras sugeribles de los textos: normalizada -> forma original.
+    # Se omiten las de una letra y los números (alturas de calle, etc.)
+    resultado: Dict[str, str] = {}
+    for texto in textos:
+        for palabra in _RE_PALABRA.findall(texto or ''):
+            if len(palabra) > 1 and not palabra.isdigit():
+                resultado.setdefault(normalizar(palabra), palabra)
+    return resultado
+
+
+class IndicePrefijos:
+    # Índice de palabras de títulos y direcciones en un arreglo ordenado (búsqueda por prefijo
+    # con bisect). Cada palabra cuenta en cuántas propiedades aparece, para ordenar por frecuencia.
+    def __init__(self, max_cache: int = 2048):
+        self._bloqueo = Lock()
+        self._ordenadas: List[str] = []
+        self._frecuencia: Dict[str, int] = {}
+        self._formas: Dict[str, Counter] = {}
+        self._por_propiedad: Dict[int, Dict[str, str]] = {}
+        self._cache: Dict[Tuple[str, int], List[Tuple[str, int]]] = {}
+        self._max_cache = max_cache
+
+    def __len__(self) -> int:
+        return len(self._ordenadas)
+
+    def _sumar(self, normalizada: str, forma: str, delta: int):
+        frecuencia = self._frecuencia.get(normalizada, 0) + delta
+        formas = self._formas.setdefault(normalizada, Counter())
+        formas[forma] += delta
+        if formas[forma] <= 0:
+            del formas[forma]
+        if frecuencia <= 0:
+            self._frecuencia.pop(normalizada, None)
+            self._formas.pop(normalizada, None)
+            indice = bisect_left(self._ordenadas, normalizada)
+            if indice < len(self._ordenadas) and self._ordenadas[indice] == normalizada:
+                del self._ordenadas[indice]
+        else:
+            if normalizada not in self._frecuencia:
+                insort(self._ordenadas, normalizada)
+            self._frecuencia[normalizada] = frecuencia
+
+    def actualizar(self, propiedad_id: int, titulo: Optional[str], direccion: Optional[str]):
+        # Alta o modificación incremental: solo se ajustan las palabras que cambiaron
+        nuevas = palabras(titulo, direccion)
+        with self._bloqueo:
+            anteriores = self._por_propiedad.get(propiedad_id, {})
+            for normalizada, forma in anteriores.items():
+                if nuevas.get(normalizada) != forma:
+                    self._sumar(normalizada, forma, -1)
+            for normalizada, forma in nuevas.items():
+                if anteriores.get(normalizada) != forma:
+                    self._sumar(normalizada, forma, 1)
+            self._por_propiedad[propiedad_id] = nuevas
+            self._cache.clear()
+
+    def eliminar(self, propiedad_id: int):
+        with self._bloqueo:
+            for normalizada, forma in self._por_propiedad.pop(propiedad_id, {}).items():
+                self._sumar(normalizada, forma, -1)
+            self._cache.clear()
+
+    def sugerir(self, prefijo: str, limite: int = 8) -> List[Tuple[str, int]]:
+        # Palabras que empiezan con el prefijo (sin tildes), de más a menos frecuente
+        prefijo = normalizar(prefijo)
+        if not prefijo:
+            return []
+        clave = (prefijo, limite)
+        resultado = self._cache.get(clave)
+        if resultado is not None:
+            return resultado
+        with self._bloqueo:
+            inicio = bisect_left(self._ordenadas, prefijo)
+            fin = bisect_left(self._ordenadas, prefijo + '\uffff', inicio)
+            mejores = nlargest(limite, self._ordenadas[inicio:fin], key=self._frecuencia.__getitem__)
+            resultado = [(self._formas[n].most_common(1)[0][0], self._frecuencia[n]) for n in mejores]
+            if len(self._cache) >= self._max_cache:
+                self._cache.clear()
+            self._cache[clave] = resultado
+        return resultado
+
+
+class Autocompletado:
+    # Índice del proceso: se reconstruye en segundo plano desde la base de datos y, mientras tanto,
+    # se mantiene al día con los cambios confirmados de propiedades (ver app/eventos.py)
+    def __init__(self, app, intervalo_reconstruccion: float = 0):
+        self.app = app
+        self.intervalo_reconstruccion = intervalo_reconstruccion
+        self.indice = IndicePrefijos()
+        self.listo = False
+        self.reconstrucciones = 0
+        self.ultima_reconstruccion_ms = 0.0
+        self._bloqueo = Lock()
+        self._bloqueo_reconstruccion = Lock()  # Una reconstrucción a la vez
+        self._reconstruyendo = False
+        self._cambios_durante_reconstruccion: List[Dict[str, Any]] = []
+        self._hilo: Optional[Thread] = None
+
+    def aplicar(self, cambios: Iterable[Dict[str, Any]], indice: Optional[IndicePrefijos] = None):
+        if indice is None:
+            indice = self.indice
+        for cambio in cambios:
+            propiedad = cambio['propiedad']
+            if cambio['operacion'] == eventos.ELIMINADA:
+                indice.eliminar(propiedad['id'])
+            else:
+                indice.actualizar(propiedad['id'], propiedad['titulo'], propiedad['direccion'])
+
+    def recibir_cambios(self, cambios: List[Dict[str, Any]]):
+        with self._bloqueo:
+            if self._reconstruyendo:
+                self._cambios_durante_reconstruccion.extend(cambios)
+            self.aplicar(cambios)
+
+    def reconstruir(self, lote: int = 5000):
+        # Construye un índice nuevo leyendo solo (id, titulo, direccion) por lotes y lo reemplaza
+        # de una vez; los cambios confirmados mientras tanto se vuelven a aplicar sobre el nuevo
+        with self._bloqueo_reconstruccion:
+            inicio = time.perf_counter()
+            self._reconstruir(lote)
+            self.reconstrucciones += 1
+            self.ultima_reconstruccion_ms = round((time.perf_counter() - inicio) * 1000, 2)
+
+    def _reconstruir(self, lote: int):
+        from .models import Propiedad
+        with self._bloqueo:
+            self._reconstruyendo = True
+            self._cambios_durante_reconstruccion = []
+        nuevo = IndicePrefijos()
+        try:
+            with self.app.app_context():
+                filas = db.session.query(Propiedad.id, Propiedad.titulo, Propiedad.direccion) \
+                    .execution_options(yield_per=lote)
+                for propiedad_id, titulo, direccion in filas:
+                    nuevo.actualizar(propiedad_id, titulo, direccion)
+                db.session.remove()
+            with self._bloqueo:
+                # Reaplicar es seguro aunque la lectura ya incluyera el cambio (actualizar es idempotente)
+                self.aplicar(self._cambios_durante_reconstruccion, nuevo)
+                self.indice = nuevo
+                self.listo = True
+        finally:
+            with self._bloqueo:
+                self._reconstruyendo = False
+                self._cambios_durante_reconstruccion = []
+
+    def iniciar(self):
+        # Reconstrucción inicial (y periódica, si se configuró) en un hilo de fondo
+        if self._hilo is not None:
+            return
+        from .tasks import programar_trabajo_periodico
+        self._hilo = programar_trabajo_periodico(self.app, self.reconstruir, self.intervalo_reconstruccion,
+                                                 'autocompletado')
+
+    def sugerir(self, texto: str, limite: int = 8) -> List[Dict[str, Any]]:
+        # Completa la última palabra del texto y conserva las anteriores tal como se escribieron
+        anteriores, _, ultima = texto.rpartition(' ')
+        prefijo_texto = f'{anteriores} ' if anteriores.strip() else ''
+        return [{'texto': prefijo_texto + palabra, 'cantidad': cantidad}
+                for palabra, cantidad in self.indice.sugerir(ultima, limite)]
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            'listo': self.listo,
+            'palabras': len(self.indice),
+            'reconstrucciones': self.reconstrucciones,
+            'ultima_reconstruccion_ms': self.ultima_reconstruccion_ms,
+        }
+
+
+@eventos.suscribir
+def _cambios_confirmados(cambios: List[Dict[str, Any]]):
+    if has_app_context():
+        autocompletado = current_app.extensions.get('autocompletado')
+        if autocompletado is not None:
+            autocompletado.recibir_cambios(cambios)
+
+
+def configurar(app):
+    app.extensions['autocompletado'] = Autocompletado(
+        app, intervalo_reconstruccion=app.config['AUTOCOMPLETADO_RECONSTRUIR_S'])
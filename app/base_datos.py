@@ -0,0 +1,213 @@
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Optional, Set
+
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, request, session as sesion_flask
+from flask_sqlalchemy.session import Session as SesionFlaskSQLAlchemy
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+
+# Clave del bind de la réplica de solo lectura en SQLALCHEMY_BINDS
+BIND_REPLICA = 'replica'
+
+# Fuerza la lectura desde la réplica fuera de una petición GET (p. ej., estadísticas en hilos)
+_forzar_replica: ContextVar[bool] = ContextVar('forzar_replica', default=False)
+
+
+def _es_sqlite_en_memoria(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def _opciones_pool(url: str) -> Dict[str, Any]:
+    # Tamaño explícito del pool de conexiones (SQLite en memoria usa StaticPool y no lo admite)
+    if _es_sqlite_en_memoria(url):
+        return {}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '10')),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', '30')),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+        'pool_pre_ping': make_url(url).get_backend_name() != 'sqlite',
+    }
+
+
+def configurar_motor(app):
+    # Completa la configuración de motores antes de db.init_app(app)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _opciones_pool(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLITE_PRAGMAS'] = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', '65536')),  # negativo = KiB
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_BYTES', str(256 * 1024 * 1024))),
+    }
+
+    replica = os.environ.get('DATABASE_REPLICA_URL')
+    if replica:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[BIND_REPLICA] = {'url': replica, **_opciones_pool(replica)}
+        app.config['SQLALCHEMY_BINDS'] = binds
+    # Segundos durante los que un cliente sigue leyendo de la primaria después de escribir
+    app.config['DB_VENTANA_LECTURA_PROPIA'] = float(os.environ.get('DB_VENTANA_LECTURA_PROPIA', '5'))
+
+
+def registrar_pragmas(app, db):
+    # Aplica los PRAGMA de SQLite a cada conexión nueva de los motores de esta app
+    # (db.init_app crea motores nuevos por app, así que cada uno se registra una sola vez)
+    pragmas = app.config['SQLITE_PRAGMAS']
+    with app.app_context():
+        motores = list(db.engines.values())
+
+    for motor in motores:
+        if motor.dialect.name != 'sqlite':
+            continue
+        # WAL no aplica a bases en memoria
+        aplicables = {k: v for k, v in pragmas.items()
+                      if not (k == 'journal_mode' and _es_sqlite_en_memoria(motor.url))}
+
+        @event.listens_for(motor, 'connect')
+        def _aplicar_pragmas(conexion_dbapi, registro, aplicables=aplicables):
+            cursor = conexion_dbapi.cursor()
+            try:
+                for nombre, valor in aplicables.items():
+                    cursor.execute(f'PRAGMA {nombre}={valor}')
+            finally:
+                cursor.close()
+
+
+@contextmanager
+def usar_replica():
+    # Enruta a la réplica las lecturas ejecutadas dentro del bloque (si hay réplica configurada)
+    token = _forzar_replica.set(True)
+    try:
+        yield
+    finally:
+        _forzar_replica.reset(token)
+
+
+def _lectura_en_replica() -> bool:
+    if _forzar_replica.get():
+        return True
+    if not has_request_context() or request.method not in ('GET', 'HEAD'):
+        return False
+    # Lectura de lo propio: tras un commit, el cliente vuelve a la primaria durante la ventana
+    if g.get('_db_escritura'):
+        return False
+    return sesion_flask.get('_db_primaria_hasta', 0) < time.time()
+
+
+class SesionEnrutada(SesionFlaskSQLAlchemy):
+    # Sesión que envía las lecturas de rutas GET (y de bloques usar_replica) a la réplica
+    # y todo lo demás (escrituras, flush, SELECT ... FOR UPDATE) a la primaria.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and isinstance(clause, sa.Select)
+            and clause._for_update_arg is None
+            and BIND_REPLICA in self._db.engines
+            and _lectura_en_replica()
+        ):
+            return self._db.engines[BIND_REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(SesionEnrutada, 'after_flush')
+def _marcar_escritura(sesion, contexto):
+    sesion.info['escribio'] = True
+    if has_request_context():
+        g._db_escritura = True
+
+
+@event.listens_for(SesionEnrutada, 'after_commit')
+def _activar_lectura_propia(sesion):
+    if not sesion.info.pop('escribio', False) or not has_request_context():
+        return
+    if BIND_REPLICA in sesion._db.engines:
+        ventana = current_app.config['DB_VENTANA_LECTURA_PROPIA']
+        sesion_flask['_db_primaria_hasta'] = time.time() + ventana
+
+
+@event.listens_for(SesionEnrutada, 'after_rollback')
+def _limpiar_escritura(sesion):
+    sesion.info.pop('escribio', None)
+
+
+# ===== ESTADO DEL ESQUEMA =====
+
+_RE_REVISION = re.compile(r"^revision\s*=\s*['\"]([^'\"]+)['\"]", re.MULTILINE)
+_RE_DOWN_REVISION = re.compile(r"^down_revision\s*=\s*(.+)$", re.MULTILINE)
+
+
+@lru_cache(maxsize=None)
+def _heads_de_migraciones(directorio: str, _firma: tuple) -> FrozenSet[str]:
+    # Calcula las revisiones "head" leyendo los scripts de Alembic sin importar Alembic
+    revisiones, referenciadas = set(), set()
+    versiones = os.path.join(directorio, 'versions')
+    for nombre in os.listdir(versiones):
+        if not nombre.endswith('.py'):
+            continue
+        with open(os.path.join(versiones, nombre), encoding='utf-8') as f:
+            contenido = f.read()
+        revision = _RE_REVISION.search(contenido)
+        if revision:
+            revisiones.add(revision.group(1))
+        anterior = _RE_DOWN_REVISION.search(contenido)
+        if anterior:
+            referenciadas.update(re.findall(r"['\"]([^'\"]+)['\"]", anterior.group(1)))
+    return frozenset(revisiones - referenciadas)
+
+
+def revisiones_head(directorio: str) -> FrozenSet[str]:
+    # Revisiones head de las migraciones (cacheadas mientras no cambien los archivos)
+    versiones = os.path.join(directorio, 'versions')
+    if not os.path.isdir(versiones):
+        return frozenset()
+    firma = tuple(sorted((e.name, e.stat().st_mtime_ns) for e in os.scandir(versiones)))
+    return _heads_de_migraciones(directorio, firma)
+
+
+def revisiones_actuales(db) -> Optional[FrozenSet[str]]:
+    # Revisiones anotadas en alembic_version de la base principal (None si nunca se versionó)
+    try:
+        with db.engine.connect() as conexion:
+            return frozenset(fila[0] for fila in conexion.execute(text('SELECT version_num FROM alembic_version')))
+    except DBAPIError:
+        return None
+
+
+def esquema_en_head(db, directorio: str) -> bool:
+    # True si la base de datos principal ya está en la última revisión de las migraciones
+    heads = revisiones_head(directorio)
+    return bool(heads) and revisiones_actuales(db) == heads
+
+
+def marcar_revisiones(db, revisiones: FrozenSet[str]):
+    # Equivalente a "flask db stamp" sin importar Alembic (misma tabla que crea Alembic)
+    with db.engine.begin() as conexion:
+        conexion.execute(text('CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32) NOT NULL, '
+                              'CONSTRAINT alembic_version_pkc PRIMARY KEY (version_num))'))
+        conexion.execute(text('DELETE FROM alembic_version'))
+        for revision in sorted(revisiones):
+            conexion.execute(text('INSERT INTO alembic_version (version_num) VALUES (:r)'), {'r': revision})
+
+
+def columnas_faltantes(db) -> Dict[str, Set[str]]:
+    # Columnas de los modelos que faltan en las tablas que ya existen en la base principal
+    inspector = sa.inspect(db.engine)
+    existentes = set(inspector.get_table_names())
+    faltantes: Dict[str, Set[str]] = {}
+    for nombre, tabla in db.metadata.tables.items():
+        if nombre in existentes:
+            columnas = {columna['name'] for columna in inspector.get_columns(nombre)}
+            faltan = {columna.name for columna in tabla.columns} - columnas
+            if faltan:
+                faltantes[nombre] = faltan
+    return faltantes
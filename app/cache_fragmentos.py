@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Hashable, Optional
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+
+class CacheLRU:
+    # Caché en memoria acotada por cantidad de entradas y por tamaño total (caracteres),
+    # con expulsión del elemento menos usado recientemente
+    def __init__(self, max_entradas: int = 5000, max_caracteres: int = 32 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.max_caracteres = max_caracteres
+        self._datos: 'OrderedDict[Hashable, str]' = OrderedDict()
+        self._caracteres = 0
+        self._bloqueo = Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def obtener(self, clave: Hashable) -> Optional[str]:
+        with self._bloqueo:
+            valor = self._datos.get(clave)
+            if valor is None:
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave: Hashable, valor: str):
+        if len(valor) > self.max_caracteres:
+            return
+        with self._bloqueo:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self._caracteres -= len(anterior)
+            self._datos[clave] = valor
+            self._caracteres += len(valor)
+            while len(self._datos) > self.max_entradas or self._caracteres > self.max_caracteres:
+                _, expulsado = self._datos.popitem(last=False)
+                self._caracteres -= len(expulsado)
+                self.expulsiones += 1
+
+    def limpiar(self):
+        with self._bloqueo:
+            self._datos.clear()
+            self._caracteres = 0
+
+    def metricas(self) -> Dict[str, Any]:
+        consultas = self.aciertos + self.fallos
+        return {
+            'entradas': len(self._datos),
+            'caracteres': self._caracteres,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'expulsiones': self.expulsiones,
+            'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else 0.0,
+        }
+
+
+class ExtensionCacheFragmentos(Extension):
+    # Etiqueta {% cache clave1, clave2, ... %}...{% endcache %} para guardar fragmentos renderizados.
+    # La clave debe incluir todo lo que cambia el contenido (p. ej., id y fecha de actualización);
+    # lo que depende del usuario que mira la página debe quedar fuera del bloque.
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(cache_fragmentos=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        partes = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            partes.append(parser.parse_expression())
+        # El nombre del template forma parte de la clave para evitar colisiones entre archivos
+        partes.insert(0, nodes.Const(parser.name))
+        cuerpo = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_renderizar', [nodes.List(partes)]), [], [], cuerpo
+        ).set_lineno(lineno)
+
+    def _renderizar(self, partes, caller):
+        cache = self.environment.cache_fragmentos
+        if cache is None:
+            return caller()
+        clave = tuple(partes)
+        html = cache.obtener(clave)
+        if html is None:
+            html = str(caller())
+            cache.guardar(clave, html)
+        return Markup(html)
@@ -0,0 +1,33 @@
+import click
+
+
+def registrar_comandos(app):
+    # Comandos de mantenimiento disponibles en la CLI de Flask (flask <comando>)
+
+    @app.cli.command('recalcular-contadores')
+    @click.option('--lote', default=5000, show_default=True, help='Usuarios por transacción')
+    def recalcular_contadores_cmd(lote):
+        """Recalcula los contadores desnormalizados de todos los usuarios."""
+        from .models import recalcular_contadores
+        actualizados = recalcular_contadores(lote=lote)
+        click.echo(f'Contadores recalculados para {actualizados} usuarios')
+
+    @app.cli.command('conciliar-pagos')
+    @click.option('--lote', default=None, type=int, help='Filas por transacción (por defecto CONCILIACION_LOTE)')
+    @click.option('--simular', is_flag=True, help='Solo informa las discrepancias, sin corregirlas')
+    def conciliar_pagos_cmd(lote, simular):
+        """Concilia pagos y propiedades: expira pagos colgados y marca ventas sin registrar."""
+        from . import auditoria
+        informe = app.extensions['conciliacion'].ejecutar(aplicar=not simular, lote=lote)
+        auditoria.vaciar()
+        if informe.get('omitida'):
+            click.echo('Otro proceso está conciliando en este momento; no se hizo nada')
+            return
+        prefijo = 'Se expirarían' if simular else 'Expirados'
+        click.echo(f"{prefijo} {informe['pagos_expirados']} pagos en proceso; "
+                   f"{informe['propiedades_vendidas']} propiedades {'por marcar' if simular else 'marcadas'} como vendidas")
+        click.echo(f"Discrepancias: {informe['vendidas_sin_pago']} vendidas sin pago, "
+                   f"{informe['ventas_duplicadas']} con más de un pago")
+        for clave, ids in informe['muestras'].items():
+            if ids:
+                click.echo(f'  {clave}: {ids}')
@@ -0,0 +1,234 @@
+import re
+import zlib
+from itertools import chain
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from jinja2 import BaseLoader
+
+try:  # Opcional: sin el paquete brotli se negocia solo gzip
+    import brotli
+except ImportError:  # pragma: no cover - depende del entorno
+    brotli = None
+
+# ===== MINIFICADO DE TEMPLATES =====
+
+_RE_PROTEGIDO = re.compile(r'(<(pre|textarea)\b.*?</\2\s*>)', re.IGNORECASE | re.DOTALL)
+_RE_SANGRIA = re.compile(r'[ \t]*\n[ \t]*')
+
+
+def minificar_html(fuente: str) -> str:
+    # Quita la sangría y los espacios al final de cada línea, salvo dentro de <pre> y <textarea>.
+    # Se conservan los saltos de línea: el JS en línea sigue siendo válido (ASI, comentarios //)
+    # y los errores de Jinja apuntan a la misma línea del archivo original.
+    partes = _RE_PROTEGIDO.split(fuente)
+    resultado = []
+    # split con dos grupos devuelve: texto, bloque protegido, nombre de etiqueta, texto, ...
+    for i in range(0, len(partes), 3):
+        resultado.append(_RE_SANGRIA.sub('\n', partes[i]))
+        if i + 1 < len(partes):
+            resultado.append(partes[i + 1])
+    return ''.join(resultado)
+
+
+class CargadorMinificado(BaseLoader):
+    # Envuelve el cargador de templates de Flask y minifica el HTML una sola vez, al cargarlo
+    # (Jinja guarda el template compilado, así que el costo no se paga por petición)
+    def __init__(self, cargador: BaseLoader):
+        self.cargador = cargador
+
+    def get_source(self, environment, template):
+        fuente, archivo, actualizado = self.cargador.get_source(environment, template)
+        if template.endswith(('.html', '.htm')):
+            fuente = minificar_html(fuente)
+        return fuente, archivo, actualizado
+
+    def list_templates(self):
+        return self.cargador.list_templates()
+
+
+# ===== COMPRESIÓN DE RESPUESTAS =====
+
+def elegir_codificacion(aceptadas: str, disponibles: Tuple[str, ...]) -> Optional[str]:
+    # Primera codificación disponible que el cliente acepta según Accept-Encoding (q=0 = rechazada)
+    calidades: Dict[str, float] = {}
+    for parte in aceptadas.split(','):
+        nombre, _, parametros = parte.partition(';')
+        calidad = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        if nombre.strip():
+            calidades[nombre.strip().lower()] = calidad
+    comodin = calidades.get('*', 0.0)
+    for codificacion in disponibles:
+        if calidades.get(codificacion, comodin) > 0:
+            return codificacion
+    return None
+
+
+class _Gzip:
+    def __init__(self, nivel: int):
+        self._compresor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def comprimir(self, datos: bytes) -> bytes:
+        # Z_SYNC_FLUSH: lo comprimido sale ya, sin esperar al resto de una respuesta en streaming
+        return self._compresor.compress(datos) + self._compresor.flush(zlib.Z_SYNC_FLUSH)
+
+    def terminar(self) -> bytes:
+        return self._compresor.flush()
+
+
+class _Brotli:
+    def __init__(self, nivel: int):
+        self._compresor = brotli.Compressor(quality=nivel)
+
+    def comprimir(self, datos: bytes) -> bytes:
+        return self._compresor.process(datos) + self._compresor.flush()
+
+    def terminar(self) -> bytes:
+        return self._compresor.finish()
+
+
+class MiddlewareCompresion:
+    # Middleware WSGI que comprime las respuestas de los tipos configurados según Accept-Encoding.
+    # Acumula solo hasta conocer los encabezados y superar el mínimo; desde ahí comprime y envía
+    # cada fragmento a medida que la app lo produce, sin armar la respuesta completa en memoria.
+    def __init__(self, wsgi_app, minimo: int = 1024, nivel_gzip: int = 6, nivel_brotli: int = 5,
+                 tipos: Iterable[str] = ('text/html', 'application/json')):
+        self.wsgi_app = wsgi_app
+        self.minimo = minimo
+        self.nivel_gzip = nivel_gzip
+        self.nivel_brotli = nivel_brotli
+        self.tipos = frozenset(tipos)
+        self.disponibles: Tuple[str, ...] = ('br', 'gzip') if brotli is not None else ('gzip',)
+        self._bloqueo = Lock()
+        self.respuestas = 0
+        self.comprimidas = 0
+        self.bytes_originales = 0
+        self.bytes_enviados = 0
+        self.por_codificacion: Dict[str, int] = {c: 0 for c in self.disponibles}
+
+    def __call__(self, environ, start_response):
+        codificacion = None
+        if environ.get('REQUEST_METHOD') != 'HEAD':
+            codificacion = elegir_codificacion(environ.get('HTTP_ACCEPT_ENCODING', ''), self.disponibles)
+        if codificacion is None:
+            return self.wsgi_app(environ, start_response)
+
+        respuesta: Dict[str, Any] = {'escritos': []}
+
+        def start_response_diferido(status, headers, exc_info=None):
+            if exc_info and respuesta.get('iniciada'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            respuesta['status'] = status
+            respuesta['headers'] = headers
+            return respuesta['escritos'].append
+
+        cuerpo = self.wsgi_app(environ, start_response_diferido)
+        return self._transmitir(cuerpo, respuesta, codificacion, start_response)
+
+    def _comprimible(self, status: str, headers: List[Tuple[str, str]]) -> bool:
+        codigo = int(status.split(' ', 1)[0])
+        if codigo < 200 or codigo in (204, 206, 304):
+            return False
+        encabezados = {k.lower(): v for k, v in headers}
+        tipo = encabezados.get('content-type', '').split(';', 1)[0].strip().lower()
+        if tipo not in self.tipos or 'content-encoding' in encabezados:
+            return False
+        if 'no-transform' in encabezados.get('cache-control', '').lower():
+            return False
+        longitud = encabezados.get('content-length')
+        return not (longitud is not None and longitud.isdigit() and int(longitud) < self.minimo)
+
+    def _transmitir(self, cuerpo, respuesta, codificacion, start_response):
+        try:
+            iterador = iter(cuerpo)
+            bufer = respuesta['escritos']
+            tamano = sum(len(b) for b in bufer)
+            completa = True
+            for trozo in iterador:
+                bufer.append(trozo)
+                tamano += len(trozo)
+                if tamano >= self.minimo or not self._comprimible(respuesta['status'], respuesta['headers']):
+                    completa = False
+                    break
+
+            status, headers = respuesta['status'], respuesta['headers']
+            respuesta['iniciada'] = True
+            with self._bloqueo:
+                self.respuestas += 1
+            if (completa and tamano < self.minimo) or not self._comprimible(status, headers):
+                start_response(status, headers)
+                yield from bufer
+                yield from iterador
+                return
+
+            compresor = _Brotli(self.nivel_brotli) if codificacion == 'br' else _Gzip(self.nivel_gzip)
+            start_response(status, self._encabezados(headers, codificacion))
+            originales = enviados = 0
+            for trozo in chain([b''.join(bufer)], iterador):
+                originales += len(trozo)
+                comprimido = compresor.comprimir(trozo)
+                if comprimido:
+                    enviados += len(comprimido)
+                    yield comprimido
+            final = compresor.terminar()
+            enviados += len(final)
+            yield final
+            with self._bloqueo:
+                self.comprimidas += 1
+                self.por_codificacion[codificacion] += 1
+                self.bytes_originales += originales
+                self.bytes_enviados += enviados
+        finally:
+            if hasattr(cuerpo, 'close'):
+                cuerpo.close()
+
+    @staticmethod
+    def _encabezados(headers: List[Tuple[str, str]], codificacion: str) -> List[Tuple[str, str]]:
+        resultado, vary = [], []
+        for nombre, valor in headers:
+            clave = nombre.lower()
+            if clave == 'content-length':
+                continue  # El largo final no se conoce hasta terminar de comprimir
+            if clave == 'vary':
+                vary.append(valor)
+                continue
+            if clave == 'etag' and not valor.startswith('W/'):
+                valor = 'W/' + valor  # Otra representación del mismo recurso
+            resultado.append((nombre, valor))
+        if not any(v.strip() == '*' or 'accept-encoding' in v.lower() for v in vary):
+            vary.append('Accept-Encoding')
+        resultado.append(('Vary', ', '.join(vary)))
+        resultado.append(('Content-Encoding', codificacion))
+        return resultado
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._bloqueo:
+            return {
+                'codificaciones': list(self.disponibles),
+                'respuestas': self.respuestas,
+                'comprimidas': self.comprimidas,
+                'por_codificacion': dict(self.por_codificacion),
+                'bytes_originales': self.bytes_originales,
+                'bytes_enviados': self.bytes_enviados,
+                'proporcion': round(self.bytes_enviados / self.bytes_originales, 4) if self.bytes_originales else 0.0,
+            }
+
+
+def configurar(app):
+    # Minificado de templates y compresión de respuestas según app.config. Debe aplicarse antes de
+    # socketio.init_app: así el tráfico de Socket.IO (que tiene su propia compresión) no pasa por acá.
+    if app.config['HTML_MINIFICAR']:
+        app.jinja_env.loader = CargadorMinificado(app.jinja_env.loader)
+    if app.config['COMPRESION_ACTIVA']:
+        app.wsgi_app = MiddlewareCompresion(
+            app.wsgi_app,
+            minimo=app.config['COMPRESION_MINIMO_BYTES'],
+            nivel_gzip=app.config['COMPRESION_NIVEL_GZIP'],
+            nivel_brotli=app.config['COMPRESION_NIVEL_BROTLI'])
+        app.extensions['compresion'] = app.wsgi_app
@@ -0,0 +1,206 @@
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import auditoria, db
+
+ESTADO_EXPIRADO = 'expirado'
+MAX_MUESTRAS = 20  # Ids de ejemplo por tipo de discrepancia en el informe
+NOMBRE_BLOQUEO = 'conciliacion'
+BLOQUEO_MAX_S = 3600  # Si el proceso muere con el bloqueo tomado, otra ejecución lo toma pasado este tiempo
+
+
+class Conciliacion:
+    # Conciliación en lote del estado de venta, fuera de las peticiones:
+    #   - pagos en "procesando" más viejos que procesando_max (su hilo murió con el proceso) -> "expirado"
+    #   - propiedades con un pago "pagado" pero sin marcar como vendidas -> vendida = True
+    #   - vendidas sin pago y propiedades con más de un pago "pagado" -> solo se informan
+    # Cada sentencia lee a lo sumo `lote` filas: los pagos se recorren en el orden del índice
+    # (estado, fecha_creacion) y las propiedades en rangos fijos de clave primaria (id en
+    # (ultimo, ultimo + lote]), así la subconsulta de pagos nunca corre sobre más de un rango.
+    # Cada lote es una transacción corta. Las correcciones pasan por el ORM (contadores de
+    # usuario, difusión en vivo, índices) y se vuelven a comprobar con la fila bloqueada, así que
+    # dos ejecuciones simultáneas no aplican dos veces el mismo cambio. Además, una ejecución que aplica
+    # cambios toma un bloqueo en la base (bloqueo_tarea): en SQLite FOR UPDATE no bloquea nada, y
+    # durante una recarga de servidor.py el worker 0 nuevo y el que drena podrían coincidir.
+    def __init__(self, app, intervalo: float = 0, lote: int = 500, procesando_max: float = 900.0):
+        self.app = app
+        self.intervalo = intervalo
+        self.lote = lote
+        self.procesando_max = procesando_max
+        self._hilo = None
+
+        self.ejecuciones = 0
+        self.ultimo_informe: Optional[Dict[str, Any]] = None
+
+    def ejecutar(self, aplicar: bool = True, lote: Optional[int] = None) -> Dict[str, Any]:
+        # Corre una conciliación completa (con aplicar=False solo informa) y devuelve el informe
+        inicio = time.perf_counter()
+        lote = lote or self.lote
+        token = self._tomar_bloqueo() if aplicar else None
+        informe: Dict[str, Any] = {
+            'aplicado': aplicar,
+            'fecha': datetime.utcnow().isoformat(timespec='seconds'),
+            'lotes': 0,
+            'pagos_expirados': 0,
+            'propiedades_vendidas': 0,
+            'vendidas_sin_pago': 0,
+            'ventas_duplicadas': 0,
+            'muestras': {'pagos_expirados': [], 'propiedades_vendidas': [], 'vendidas_sin_pago': [],
+                         'ventas_duplicadas': []},
+        }
+        if aplicar and token is None:
+            self.app.logger.info('Conciliación omitida: otro proceso la está ejecutando')
+            informe['omitida'] = True
+            return informe
+        try:
+            self._expirar_pagos(informe, aplicar, lote)
+            self._revisar_propiedades(informe, aplicar, lote)
+        finally:
+            if token is not None:
+                self._soltar_bloqueo(token)
+        informe['duracion_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+
+        if informe['vendidas_sin_pago'] or informe['ventas_duplicadas']:
+            self.app.logger.warning('Conciliación: %d vendidas sin pago, %d con más de un pago (ej. %s / %s)',
+                                    informe['vendidas_sin_pago'], informe['ventas_duplicadas'],
+                                    informe['muestras']['vendidas_sin_pago'], informe['muestras']['ventas_duplicadas'])
+        if informe['pagos_expirados'] or informe['propiedades_vendidas']:
+            self.app.logger.info('Conciliación: %d pagos expirados, %d propiedades marcadas como vendidas%s',
+                                 informe['pagos_expirados'], informe['propiedades_vendidas'],
+                                 '' if aplicar else ' (simulado)')
+        self.ejecuciones += 1
+        self.ultimo_informe = informe
+        return informe
+
+    @staticmethod
+    def _tomar_bloqueo() -> Optional[str]:
+        # Devuelve el token del dueño, o None si otro proceso tiene el bloqueo vigente
+        from .models import BloqueoTarea
+        tabla = BloqueoTarea.__table__
+        token = str(uuid4())
+        ahora = datetime.utcnow()
+        vence = ahora + timedelta(seconds=BLOQUEO_MAX_S)
+        try:
+            with db.engine.begin() as conexion:
+                conexion.execute(insert(tabla).values(nombre=NOMBRE_BLOQUEO, duenio=token, vence=vence))
+            return token
+        except IntegrityError:
+            pass
+        with db.engine.begin() as conexion:
+            tomado = conexion.execute(update(tabla).where(tabla.c.nombre == NOMBRE_BLOQUEO, tabla.c.vence < ahora)
+                                      .values(duenio=token, vence=vence)).rowcount
+        return token if tomado == 1 else None
+
+    @staticmethod
+    def _soltar_bloqueo(token: str):
+        from .models import BloqueoTarea
+        tabla = BloqueoTarea.__table__
+        with db.engine.begin() as conexion:
+            conexion.execute(delete(tabla).where(tabla.c.nombre == NOMBRE_BLOQUEO, tabla.c.duenio == token))
+
+    @staticmethod
+    def _contar(informe: Dict[str, Any], clave: str, ids: List[int]):
+        informe[clave] += len(ids)
+        muestras = informe['muestras'][clave]
+        muestras.extend(ids[:MAX_MUESTRAS - len(muestras)])
+
+    def _expirar_pagos(self, informe: Dict[str, Any], aplicar: bool, lote: int):
+        from .models import Pago
+        pago = Pago.__table__
+        limite = datetime.utcnow() - timedelta(seconds=self.procesando_max)
+        desde = None  # (fecha_creacion, id) del último pago leído
+        while True:
+            consulta = select(pago.c.id, pago.c.fecha_creacion).where(
+                pago.c.estado == 'procesando', pago.c.fecha_creacion < limite)
+            if desde is not None:
+                consulta = consulta.where(or_(pago.c.fecha_creacion > desde[0],
+                                              and_(pago.c.fecha_creacion == desde[0], pago.c.id > desde[1])))
+            filas = db.session.execute(
+                consulta.order_by(pago.c.fecha_creacion, pago.c.id).limit(lote)).all()
+            db.session.commit()  # No retener la transacción de lectura entre lotes
+            if not filas:
+                return
+            desde = (filas[-1].fecha_creacion, filas[-1].id)
+            ids = [fila.id for fila in filas]
+            informe['lotes'] += 1
+            if not aplicar:
+                self._contar(informe, 'pagos_expirados', ids)
+                continue
+            expirados = []
+            for p in Pago.query.filter(Pago.id.in_(ids), Pago.estado == 'procesando').with_for_update().all():
+                p.estado = ESTADO_EXPIRADO
+                expirados.append((p.id, p.usuario_id, p.propiedad_id))
+            db.session.commit()
+            for pago_id, usuario_id, propiedad_id in expirados:
+                auditoria.registrar('pago.expirado', actor_id=usuario_id, objetivo_tipo='pago', objetivo_id=pago_id,
+                                    propiedad_id=propiedad_id, motivo='conciliacion')
+            self._contar(informe, 'pagos_expirados', [pago_id for pago_id, _, _ in expirados])
+
+    def _revisar_propiedades(self, informe: Dict[str, Any], aplicar: bool, lote: int):
+        from .models import Pago, Propiedad
+        propiedad, pago = Propiedad.__table__, Pago.__table__
+        # Subconsulta correlacionada sobre el índice (propiedad_id, estado)
+        pagados = (select(func.count()).where(pago.c.propiedad_id == propiedad.c.id, pago.c.estado == 'pagado')
+                   .scalar_subquery())
+        maximo = db.session.execute(select(func.max(propiedad.c.id))).scalar() or 0
+        ultimo = 0
+        while ultimo < maximo:
+            filas = db.session.execute(
+                select(propiedad.c.id, propiedad.c.vendida, pagados)
+                .where(propiedad.c.id > ultimo, propiedad.c.id <= ultimo + lote,
+                       or_(and_(propiedad.c.vendida.is_(False), pagados > 0),
+                           and_(propiedad.c.vendida.is_(True), pagados == 0),
+                           pagados > 1))
+                .order_by(propiedad.c.id)
+            ).all()
+            db.session.commit()
+            ultimo += lote
+            if not filas:
+                continue
+            informe['lotes'] += 1
+            self._contar(informe, 'vendidas_sin_pago', [i for i, vendida, n in filas if vendida and n == 0])
+            self._contar(informe, 'ventas_duplicadas', [i for i, _, n in filas if n > 1])
+            sin_marcar = [i for i, vendida, n in filas if not vendida and n > 0]
+            if not sin_marcar:
+                continue
+            if not aplicar:
+                self._contar(informe, 'propiedades_vendidas', sin_marcar)
+                continue
+            corregidas = []
+            for p in (Propiedad.query.filter(Propiedad.id.in_(sin_marcar), Propiedad.vendida.is_(False))
+                      .with_for_update().all()):
+                p.vendida = True
+                corregidas.append(p.id)
+            db.session.commit()
+            for propiedad_id in corregidas:
+                auditoria.registrar('propiedad.vendida', objetivo_tipo='propiedad', objetivo_id=propiedad_id,
+                                    motivo='conciliacion')
+            self._contar(informe, 'propiedades_vendidas', corregidas)
+
+    def iniciar(self):
+        if self._hilo is not None or not self.intervalo:
+            return
+        from .tasks import programar_trabajo_periodico
+        self._hilo = programar_trabajo_periodico(self.app, self.ejecutar, self.intervalo, 'conciliacion',
+                                                 inmediato=False)
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            'intervalo_s': self.intervalo,
+            'ejecuciones': self.ejecuciones,
+            'ultimo_informe': self.ultimo_informe,
+        }
+
+
+def configurar(app):
+    app.extensions['conciliacion'] = Conciliacion(
+        app,
+        intervalo=app.config['CONCILIACION_INTERVALO_S'],
+        lote=app.config['CONCILIACION_LOTE'],
+        procesando_max=app.config['PAGOS_PROCESANDO_MAX_S'],
+    )
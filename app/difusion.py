@@ -0,0 +1,329 @@
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from itertools import count
+from threading import Lock, local
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import uuid4
+
+import socketio as python_socketio
+
+from . import eventos, socketio
+
+# ===== BROKER LOCAL SOBRE SQLITE =====
+
+class GestorSQLite(python_socketio.PubSubManager):
+    # Gestor de clientes de Socket.IO que comparte eventos entre procesos a través de
+    # una tabla en un archivo SQLite local (no requiere servicios externos).
+    # Los mensajes publicados se agrupan y se escriben en una sola fila por intervalo.
+    name = 'sqlite'
+
+    def __init__(self, url: str, channel: str = 'flask-socketio', write_only: bool = False,
+                 logger=None, intervalo: float = 0.05, retencion: float = 60.0):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.ruta = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url
+        self.intervalo = intervalo
+        self.retencion = retencion
+        self._local = local()
+        self._bloqueo = Lock()
+        self._pendientes: List[Dict[str, Any]] = []
+        self._secuencia = count(1)
+        self._escritor_activo = False
+        self._ultima_limpieza = 0.0
+
+        # Métricas de este proceso
+        self.publicados = 0
+        self.recibidos = 0
+        self.perdidos = 0
+        self.latencia_total = 0.0
+        self.latencia_maxima = 0.0
+        self._ultima_secuencia: Dict[str, int] = {}
+
+        directorio = os.path.dirname(os.path.abspath(self.ruta))
+        os.makedirs(directorio, exist_ok=True)
+        conexion = self._conexion()
+        conexion.execute(
+            'CREATE TABLE IF NOT EXISTS socketio_mensajes ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' canal TEXT NOT NULL,'
+            ' creado REAL NOT NULL,'
+            ' contenido TEXT NOT NULL)'
+        )
+        conexion.execute('CREATE INDEX IF NOT EXISTS ix_socketio_mensajes_creado ON socketio_mensajes (creado)')
+        # Se escucha a partir de lo publicado desde que se creó este gestor (ver initialize)
+        self._ultimo_id = self._id_maximo()
+
+    def despues_del_fork(self):
+        # Un worker creado con fork hereda el gestor del maestro: mismo host_id (descartaría como
+        # propios los mensajes de los demás workers), la conexión SQLite, la secuencia y el cursor
+        self.host_id = uuid4().hex
+        self._local = local()
+        self._bloqueo = Lock()
+        self._pendientes = []
+        self._secuencia = count(1)
+        self._escritor_activo = False
+        self._ultima_secuencia = {}
+        self.publicados = self.recibidos = self.perdidos = 0
+        self.latencia_total = self.latencia_maxima = 0.0
+        self._ultimo_id = self._id_maximo()
+
+    def _id_maximo(self) -> int:
+        return self._conexion().execute('SELECT COALESCE(MAX(id), 0) FROM socketio_mensajes').fetchone()[0]
+
+    def initialize(self):
+        # El hilo de escucha arranca con la primera conexión de Engine.IO, que puede llegar mucho
+        # después de crear el gestor: lo publicado antes no tiene destinatarios en este proceso
+        self._ultimo_id = self._id_maximo()
+        super().initialize()
+
+    def _conexion(self) -> sqlite3.Connection:
+        # Una conexión por hilo; WAL permite leer mientras otro proceso escribe
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=5.0, isolation_level=None)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            self._local.conexion = conexion
+        return conexion
+
+    def _dormir(self, segundos: float):
+        if self.server is not None:
+            self.server.sleep(segundos)
+        else:
+            time.sleep(segundos)
+
+    def _publish(self, data):
+        # Encola el mensaje; el escritor lo publica junto con los demás del mismo intervalo.
+        # host_id es el destino en los callbacks, así que el emisor va aparte (métricas y secuencia)
+        data = dict(data, host_id=data.get('host_id', self.host_id), emisor=self.host_id, ts=time.time(),
+                    seq=next(self._secuencia))
+        with self._bloqueo:
+            self._pendientes.append(data)
+            iniciar = not self._escritor_activo
+            self._escritor_activo = True
+        if iniciar:
+            if self.server is not None:
+                self.server.start_background_task(self._escritor)
+            else:
+                self._escribir_pendientes()
+                with self._bloqueo:
+                    self._escritor_activo = False
+
+    def _escritor(self):
+        while True:
+            self._dormir(self.intervalo)
+            if not self._escribir_pendientes():
+                with self._bloqueo:
+                    if not self._pendientes:
+                        self._escritor_activo = False
+                        return
+
+    def _escribir_pendientes(self) -> bool:
+        with self._bloqueo:
+            lote, self._pendientes = self._pendientes, []
+        if not lote:
+            return False
+        conexion = self._conexion()
+        ahora = time.time()
+        conexion.execute(
+            'INSERT INTO socketio_mensajes (canal, creado, contenido) VALUES (?, ?, ?)',
+            (self.channel, ahora, json.dumps(lote)),
+        )
+        if ahora - self._ultima_limpieza > self.retencion:
+            self._ultima_limpieza = ahora
+            conexion.execute('DELETE FROM socketio_mensajes WHERE creado < ?', (ahora - self.retencion,))
+        self.publicados += len(lote)
+        return True
+
+    def _listen(self) -> Iterator[Dict[str, Any]]:
+        conexion = self._conexion()
+        while True:
+            filas = conexion.execute(
+                'SELECT id, contenido FROM socketio_mensajes WHERE id > ? AND canal = ? ORDER BY id',
+                (self._ultimo_id, self.channel),
+            ).fetchall()
+            for fila_id, contenido in filas:
+                self._ultimo_id = fila_id
+                for mensaje in json.loads(contenido):
+                    self._registrar_recepcion(mensaje)
+                    yield mensaje
+            if not filas:
+                self._dormir(self.intervalo)
+
+    def _registrar_recepcion(self, mensaje: Dict[str, Any]):
+        origen = mensaje.get('emisor')
+        if origen == self.host_id:
+            return
+        self.recibidos += 1
+        latencia = max(0.0, time.time() - mensaje.get('ts', time.time()))
+        self.latencia_total += latencia
+        self.latencia_maxima = max(self.latencia_maxima, latencia)
+        # Huecos en la secuencia de un emisor indican mensajes perdidos (p. ej., purgados por retención)
+        secuencia = mensaje.get('seq')
+        anterior = self._ultima_secuencia.get(origen)
+        if secuencia is not None:
+            if anterior is not None and secuencia > anterior + 1:
+                self.perdidos += secuencia - anterior - 1
+            self._ultima_secuencia[origen] = secuencia
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            'backend': self.name,
+            'publicados': self.publicados,
+            'recibidos': self.recibidos,
+            'perdidos': self.perdidos,
+            'latencia_media_ms': round(self.latencia_total / self.recibidos * 1000, 3) if self.recibidos else 0.0,
+            'latencia_maxima_ms': round(self.latencia_maxima * 1000, 3),
+        }
+
+
+def crear_gestor_cola(url: Optional[str], canal: str = 'flask-socketio'):
+    # Devuelve el gestor de clientes para la URL de cola configurada (None = solo este proceso)
+    if not url:
+        return None
+    if url.startswith('sqlite:'):
+        return GestorSQLite(url, channel=canal)
+    if url.startswith(('redis://', 'rediss://')):
+        return python_socketio.RedisManager(url, channel=canal)
+    if url.startswith('kafka://'):
+        return python_socketio.KafkaManager(url, channel=canal)
+    if url.startswith('zmq'):
+        return python_socketio.ZmqManager(url, channel=canal)
+    return python_socketio.KombuManager(url, channel=canal)
+
+
+# ===== AGRUPACIÓN DE EVENTOS SALIENTES POR SALA =====
+
+class Difusor:
+    # Acumula los eventos salientes por sala durante una ventana corta y los emite juntos.
+    # Los eventos marcados como "coalescibles" se reemplazan por el más reciente de la ventana.
+    def __init__(self, ventana: float = 0.05, max_pendientes: int = 10_000):
+        self.ventana = ventana
+        self.max_pendientes = max_pendientes
+        self._bloqueo = Lock()
+        self._salas: Dict[str, 'OrderedDict[Any, tuple]'] = {}
+        self._total_pendientes = 0
+        self._unicos = count()
+        self._activo = False
+
+        self.encolados = 0
+        self.coalescidos = 0
+        self.descartados = 0
+        self.emitidos = 0
+        self.latencia_total = 0.0
+        self.latencia_maxima = 0.0
+
+    def emitir(self, evento: str, datos: Any, room: str, coalescer: bool = False):
+        ahora = time.perf_counter()
+        with self._bloqueo:
+            pendientes = self._salas.setdefault(room, OrderedDict())
+            clave = evento if coalescer else (evento, next(self._unicos))
+            if clave in pendientes:
+                # Se conserva la marca de tiempo original para medir la latencia real
+                pendientes[clave] = (evento, datos, pendientes[clave][2])
+                self.coalescidos += 1
+            elif self._total_pendientes >= self.max_pendientes:
+                self.descartados += 1
+                return
+            else:
+                pendientes[clave] = (evento, datos, ahora)
+                self._total_pendientes += 1
+            self.encolados += 1
+            iniciar = not self._activo
+            self._activo = True
+        if iniciar:
+            socketio.start_background_task(self._bucle)
+
+    def _bucle(self):
+        while True:
+            socketio.sleep(self.ventana)
+            if not self.vaciar():
+                with self._bloqueo:
+                    if not self._total_pendientes:
+                        self._activo = False
+                        return
+
+    def vaciar(self) -> int:
+        # Emite todo lo pendiente; devuelve la cantidad de eventos emitidos
+        with self._bloqueo:
+            salas, self._salas = self._salas, {}
+            self._total_pendientes = 0
+        emitidos = 0
+        for room, pendientes in salas.items():
+            for evento, datos, encolado in pendientes.values():
+                socketio.emit(evento, datos, room=room)
+                latencia = time.perf_counter() - encolado
+                self.latencia_total += latencia
+                self.latencia_maxima = max(self.latencia_maxima, latencia)
+                emitidos += 1
+        self.emitidos += emitidos
+        return emitidos
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            'encolados': self.encolados,
+            'coalescidos': self.coalescidos,
+            'descartados': self.descartados,
+            'emitidos': self.emitidos,
+            'latencia_media_ms': round(self.latencia_total / self.emitidos * 1000, 3) if self.emitidos else 0.0,
+            'latencia_maxima_ms': round(self.latencia_maxima * 1000, 3),
+        }
+
+
+_difusor = Difusor()
+
+
+def configurar(app):
+    # Aplica la configuración de la app al difusor del proceso
+    _difusor.ventana = app.config['SOCKETIO_VENTANA_MS'] / 1000.0
+
+
+def emitir(evento: str, datos: Any, room: str, coalescer: bool = False):
+    # Punto único para emitir notificaciones desde rutas o hilos de trabajo
+    _difusor.emitir(evento, datos, room, coalescer=coalescer)
+
+
+def _gestor():
+    return getattr(socketio.server, 'manager', None) if socketio.server else None
+
+
+def despues_del_fork():
+    # Cada worker necesita su propio host_id en la cola de mensajes (servidor.py lo llama tras el fork)
+    gestor = _gestor()
+    if isinstance(gestor, GestorSQLite):
+        gestor.despues_del_fork()
+    elif isinstance(gestor, python_socketio.PubSubManager):
+        gestor.host_id = uuid4().hex
+
+
+def metricas() -> Dict[str, Any]:
+    resultado = {'difusor': _difusor.metricas()}
+    gestor = _gestor()
+    if isinstance(gestor, GestorSQLite):
+        resultado['cola'] = gestor.metricas()
+    return resultado
+
+
+# ===== SALAS POR PROPIEDAD =====
+
+# Cambios que se muestran en vivo a quienes tienen la propiedad en pantalla (detalle o listado)
+CAMPOS_EN_VIVO = frozenset({'precio', 'vendida'})
+MAX_SALAS_POR_CLIENTE = 50
+
+
+def sala_propiedad(propiedad_id: int) -> str:
+    return f'propiedad_{propiedad_id}'
+
+
+@eventos.suscribir
+def _estado_propiedades(cambios: List[Dict[str, Any]]):
+    # Ventas y cambios de precio confirmados: se agrupan por sala durante la ventana del difusor,
+    # así una propiedad muy visitada recibe un solo evento con el estado final
+    for cambio in cambios:
+        if cambio['operacion'] == eventos.ACTUALIZADA and CAMPOS_EN_VIVO.intersection(cambio['campos']):
+            propiedad = cambio['propiedad']
+            emitir('propiedad_actualizada',
+                   {'id': propiedad['id'], 'precio': propiedad['precio'], 'vendida': propiedad['vendida']},
+                   room=sala_propiedad(propiedad['id']), coalescer=True)
@@ -0,0 +1,77 @@
+import logging
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+# Despachador de cambios de propiedades confirmados: los suscriptores (índices en memoria,
+# notificaciones, etc.) reciben los cambios recién después del commit, nunca los de una
+# transacción que termina en rollback. Las actualizaciones incluyen además 'campos',
+# la lista de columnas que cambiaron.
+
+CREADA = 'creada'
+ACTUALIZADA = 'actualizada'
+ELIMINADA = 'eliminada'
+
+logger = logging.getLogger(__name__)
+
+_suscriptores: List[Callable[[List[Dict[str, Any]]], None]] = []
+
+
+def suscribir(fn: Callable[[List[Dict[str, Any]]], None]):
+    # Registra una función que recibe la lista de cambios de cada commit (una vez por proceso)
+    if fn not in _suscriptores:
+        _suscriptores.append(fn)
+    return fn
+
+
+def _datos_propiedad(propiedad) -> Dict[str, Any]:
+    return {
+        'id': propiedad.id,
+        'titulo': propiedad.titulo,
+        'descripcion': propiedad.descripcion,
+        'direccion': propiedad.direccion,
+        'precio': propiedad.precio,
+        'habitaciones': propiedad.habitaciones,
+        'metros_cuadrados': propiedad.metros_cuadrados,
+        'vendida': propiedad.vendida,
+        'propietario_id': propiedad.propietario_id,
+    }
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_cambios(sesion, contexto):
+    from .models import Propiedad
+    cambios = sesion.info.setdefault('cambios_propiedades', [])
+    for operacion, objetos in ((CREADA, sesion.new), (ACTUALIZADA, sesion.dirty), (ELIMINADA, sesion.deleted)):
+        for objeto in objetos:
+            if not isinstance(objeto, Propiedad):
+                continue
+            cambio = {'operacion': operacion, 'propiedad': _datos_propiedad(objeto)}
+            if operacion == ACTUALIZADA:
+                if not sesion.is_modified(objeto, include_collections=False):
+                    continue
+                # Columnas modificadas (el historial sigue disponible hasta terminar el flush)
+                estado = inspect(objeto)
+                cambio['campos'] = [c.key for c in estado.mapper.column_attrs
+                                    if estado.attrs[c.key].history.has_changes()]
+            cambios.append(cambio)
+
+
+@event.listens_for(Session, 'after_commit')
+def _despachar_cambios(sesion):
+    cambios = sesion.info.pop('cambios_propiedades', None)
+    if not cambios:
+        return
+    for suscriptor in _suscriptores:
+        try:
+            suscriptor(cambios)
+        except Exception:  # noqa: BLE001
+            # Un suscriptor con errores no debe afectar al commit ni a los demás suscriptores
+            logger.exception('Error en suscriptor de cambios de propiedades')
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_cambios(sesion, transaccion_anterior):
+    if transaccion_anterior.parent is None:
+        sesion.info.pop('cambios_propiedades', None)
@@ -0,0 +1,216 @@
+import math
+import os
+import sqlite3
+import time
+from functools import wraps
+from threading import BoundedSemaphore, Lock, local
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import current_app, jsonify, request, session
+
+
+class Regla:
+    # Límites de un endpoint: cubo de tokens por IP y por usuario (tasa por segundo y ráfaga)
+    # y cantidad máxima de peticiones atendidas a la vez en este proceso
+    def __init__(self, tasa: float, rafaga: int, concurrencia: Optional[int] = None):
+        self.tasa = tasa
+        self.rafaga = rafaga
+        self.concurrencia = concurrencia
+
+
+# ===== ALMACENES DE CUBOS DE TOKENS =====
+
+def _recargar(tokens: float, ultimo: float, ahora: float, regla: Regla) -> float:
+    return min(float(regla.rafaga), tokens + (ahora - ultimo) * regla.tasa)
+
+
+class AlmacenMemoria:
+    # Cubos de tokens en memoria repartidos en fragmentos con su propio lock,
+    # para que peticiones de claves distintas casi nunca compitan por el mismo bloqueo.
+    # Cada cubo es [tokens, último consumo, segundos hasta recargarse por completo según su regla].
+    def __init__(self, fragmentos: int = 64, purga_cada: int = 1000):
+        self._fragmentos: List[Tuple[Lock, Dict[str, List[float]]]] = [(Lock(), {}) for _ in range(fragmentos)]
+        self._purga_cada = purga_cada
+        self._operaciones = [0] * fragmentos
+
+    def consumir(self, clave: str, regla: Regla, ahora: Optional[float] = None) -> float:
+        # Devuelve 0 si se admitió la petición o los segundos a esperar hasta tener un token
+        ahora = time.monotonic() if ahora is None else ahora
+        indice = hash(clave) % len(self._fragmentos)
+        bloqueo, cubos = self._fragmentos[indice]
+        with bloqueo:
+            cubo = cubos.get(clave)
+            tokens = float(regla.rafaga) if cubo is None else _recargar(cubo[0], cubo[1], ahora, regla)
+            if tokens >= 1:
+                tokens -= 1
+                espera = 0.0
+            else:
+                espera = (1 - tokens) / regla.tasa
+            cubos[clave] = [tokens, ahora, regla.rafaga / regla.tasa]
+            self._operaciones[indice] += 1
+            if self._operaciones[indice] % self._purga_cada == 0:
+                self._purgar(cubos, ahora)
+        return espera
+
+    @staticmethod
+    def _purgar(cubos: Dict[str, List[float]], ahora: float):
+        # Un cubo que ya se habría recargado por completo equivale a uno nuevo: se descarta.
+        # Cada cubo usa su propio tiempo de recarga: en un fragmento conviven claves de varias reglas.
+        for clave in [c for c, (_, ultimo, lleno_en) in cubos.items() if ahora - ultimo > lleno_en]:
+            del cubos[clave]
+
+
+class AlmacenSQLite:
+    # Cubos de tokens compartidos entre procesos de la misma máquina en un archivo SQLite (WAL + mmap).
+    # Cada consumo es una transacción corta BEGIN IMMEDIATE sobre una sola fila.
+    def __init__(self, ruta: str, retencion: float = 3600.0):
+        self.ruta = ruta
+        self.retencion = retencion
+        self._local = local()
+        self._ultima_limpieza = 0.0
+        with self._conexion() as conexion:
+            conexion.execute('CREATE TABLE IF NOT EXISTS cubos (clave TEXT PRIMARY KEY, tokens REAL, ultimo REAL)')
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None, check_same_thread=False)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=OFF')  # Estado efímero: no hace falta durabilidad
+            conexion.execute('PRAGMA mmap_size=16777216')
+            self._local.conexion = conexion
+        return conexion
+
+    def consumir(self, clave: str, regla: Regla, ahora: Optional[float] = None) -> float:
+        # Reloj de pared: tiene que ser comparable entre procesos
+        ahora = time.time() if ahora is None else ahora
+        conexion = self._conexion()
+        conexion.execute('BEGIN IMMEDIATE')
+        try:
+            fila = conexion.execute('SELECT tokens, ultimo FROM cubos WHERE clave = ?', (clave,)).fetchone()
+            tokens = float(regla.rafaga) if fila is None else _recargar(fila[0], fila[1], ahora, regla)
+            espera = 0.0 if tokens >= 1 else (1 - tokens) / regla.tasa
+            if not espera:
+                tokens -= 1
+            conexion.execute('INSERT OR REPLACE INTO cubos (clave, tokens, ultimo) VALUES (?, ?, ?)',
+                             (clave, tokens, ahora))
+            if ahora - self._ultima_limpieza > 60:
+                self._ultima_limpieza = ahora
+                conexion.execute('DELETE FROM cubos WHERE ultimo < ?', (ahora - self.retencion,))
+            conexion.execute('COMMIT')
+        except Exception:
+            conexion.execute('ROLLBACK')
+            raise
+        return espera
+
+
+def crear_almacen(url: str):
+    # "" o "memoria" = por proceso; "sqlite:///ruta.db" = compartido entre procesos de la máquina
+    if url.startswith('sqlite:///'):
+        ruta = url[len('sqlite:///'):]
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        return AlmacenSQLite(ruta)
+    if url in ('', 'memoria'):
+        return AlmacenMemoria()
+    raise ValueError(f'Backend de límites no soportado: {url}')
+
+
+# ===== CONTROL DE ADMISIÓN =====
+
+class Limitador:
+    def __init__(self, reglas: Dict[str, Regla], almacen, activo: bool = True):
+        self.reglas = reglas
+        self.almacen = almacen
+        self.activo = activo
+        self._semaforos = {nombre: BoundedSemaphore(regla.concurrencia)
+                           for nombre, regla in reglas.items() if regla.concurrencia}
+        self._bloqueo = Lock()
+        self._contadores: Dict[str, Dict[str, int]] = {
+            nombre: {'admitidos': 0, 'limitados': 0, 'saturados': 0} for nombre in reglas
+        }
+
+    def contar(self, nombre: str, resultado: str):
+        with self._bloqueo:
+            self._contadores[nombre][resultado] += 1
+
+    def evaluar(self, nombre: str, claves: List[str]) -> float:
+        # Consume un token de cada cubo (IP, usuario); devuelve la mayor espera si alguno está vacío
+        regla = self.reglas[nombre]
+        return max((self.almacen.consumir(f'{nombre}:{clave}', regla) for clave in claves), default=0.0)
+
+    def semaforo(self, nombre: str) -> Optional[BoundedSemaphore]:
+        return self._semaforos.get(nombre)
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._bloqueo:
+            return {
+                'activo': self.activo,
+                'backend': type(self.almacen).__name__,
+                'endpoints': {nombre: dict(c) for nombre, c in self._contadores.items()},
+            }
+
+
+def configurar(app):
+    # Crea el limitador de la app con las reglas de app.config['LIMITES']
+    reglas = {nombre: Regla(**valores) for nombre, valores in app.config['LIMITES'].items()}
+    app.extensions['limites'] = Limitador(reglas, crear_almacen(app.config['LIMITES_BACKEND']),
+                                          activo=app.config['LIMITES_ACTIVOS'])
+
+
+def _clave_usuario_actual() -> Optional[str]:
+    # El id que Flask-Login guarda en la sesión: current_user.is_authenticated cargaría el usuario
+    # con una consulta, y el limitador corre en endpoints que responden desde memoria
+    usuario_id = session.get('_user_id')
+    return str(usuario_id) if usuario_id is not None else None
+
+
+def _respuesta_rechazo(codigo: int, espera: float, mensaje: str, como_json: bool):
+    segundos = max(1, math.ceil(espera))
+    if como_json:
+        respuesta = jsonify({'estado': 'limitado', 'exito': False, 'mensaje': mensaje, 'reintentar_en': segundos})
+    else:
+        respuesta = current_app.response_class(mensaje, mimetype='text/plain')
+    respuesta.status_code = codigo
+    respuesta.headers['Retry-After'] = str(segundos)
+    return respuesta
+
+
+def limitar(nombre: str, metodos: Optional[Tuple[str, ...]] = None,
+            solo_si: Optional[Callable[[], bool]] = None,
+            clave_usuario: Callable[[], Optional[str]] = _clave_usuario_actual, como_json: bool = False,
+            por_ip: bool = True):
+    # Decorador de control de admisión: 429 si se agotó el cubo de la IP o del usuario,
+    # 503 si el endpoint ya atiende el máximo de peticiones simultáneas. Ambos con Retry-After.
+    # Con por_ip=False solo se usa el cubo del usuario (para apilar una regla propia por cuenta).
+    def decorador(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            limitador = current_app.extensions['limites']
+            if (not limitador.activo
+                    or (metodos and request.method not in metodos)
+                    or (solo_si and not solo_si())):
+                return f(*args, **kwargs)
+
+            claves = [f'ip:{request.remote_addr}'] if por_ip else []
+            usuario = clave_usuario()
+            if usuario:
+                claves.append(f'usuario:{usuario}')
+            espera = limitador.evaluar(nombre, claves)
+            if espera:
+                limitador.contar(nombre, 'limitados')
+                return _respuesta_rechazo(429, espera, 'Demasiadas solicitudes. Intenta nuevamente en unos segundos.',
+                                          como_json)
+
+            semaforo = limitador.semaforo(nombre)
+            if semaforo is not None and not semaforo.acquire(blocking=False):
+                limitador.contar(nombre, 'saturados')
+                return _respuesta_rechazo(503, 1, 'El servidor está ocupado. Intenta nuevamente en unos segundos.',
+                                          como_json)
+            limitador.contar(nombre, 'admitidos')
+            try:
+                return f(*args, **kwargs)
+            finally:
+                if semaforo is not None:
+                    semaforo.release()
+        return decorated_function
+    return decorador
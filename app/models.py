@@ -1,5 +1,8 @@
 from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
 from flask_login import UserMixin
+from sqlalchemy import event, func, inspect, select
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Importar la instancia de la base de datos desde __init__.py
@@ -14,10 +17,20 @@ class Usuario(UserMixin, db.Model):
     password_hash = db.Column(db.String(255), nullable=False)  # Hash de contraseña
     es_administrador = db.Column(db.Boolean, default=False, nullable=False)  # Permisos de administrador
     activo = db.Column(db.Boolean, default=True, nullable=False)  # Estado de la cuenta (activa/desactivada)
+
+    # Contadores desnormalizados: los mantienen los eventos de Propiedad y Pago (ver más abajo)
+    # y se pueden recalcular con "flask recalcular-contadores"
+    total_propiedades = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    propiedades_vendidas = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    pagos_realizados = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    monto_pagado = db.Column(db.Float, default=0, server_default='0', nullable=False)
     
     # Relaciones con otras tablas  / Claves Forananeas
     propiedades = db.relationship('Propiedad', backref='propietario', lazy=True)
-    pagos = db.relationship('Pago', backref='usuario', lazy=True, order_by='desc(Pago.fecha_creacion)')
+    # Dinámica: devuelve una consulta (para paginar) en lugar de cargar todos los pagos
+    pagos = db.relationship('Pago', backref='usuario', lazy='dynamic', order_by='desc(Pago.fecha_creacion)')
+    busquedas = db.relationship('BusquedaGuardada', backref='usuario', lazy='dynamic',
+                                order_by='desc(BusquedaGuardada.fecha_creacion)')
 
     def establecer_password(self, password):
         # Crea un hash de la contraseña y lo almacena
@@ -34,9 +47,23 @@ class Usuario(UserMixin, db.Model):
         # Propiedad conveniente para verificar si es administrador
         return self.es_administrador
 
+    def resumen(self) -> Dict[str, Any]:
+        # Resumen de actividad del usuario (solo lee columnas de la propia fila)
+        return {
+            'propiedades': self.total_propiedades,
+            'propiedades_vendidas': self.propiedades_vendidas,
+            'pagos_realizados': self.pagos_realizados,
+            'monto_pagado': self.monto_pagado,
+        }
+
 
 class Propiedad(db.Model):
     # Modelo de propiedad inmobiliaria - Almacena detalles de las propiedades publicadas
+    __table_args__ = (
+        # orden=populares en el listado: se recorre el índice en orden descendente
+        db.Index('ix_propiedad_popularidad', 'popularidad', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(120), nullable=False)
     descripcion = db.Column(db.Text, nullable=False)
@@ -46,14 +73,23 @@ class Propiedad(db.Model):
     habitaciones = db.Column(db.Integer, nullable=False, default=0)
     banos = db.Column(db.Integer, nullable=False, default=0)
     estacionamientos = db.Column(db.Integer, nullable=False, default=0)
-    vendida = db.Column(db.Boolean, default=False, nullable=False)  # Estado de venta
+    # active_history: los contadores de Usuario necesitan el valor anterior aunque el atributo esté expirado
+    vendida = db.column_property(db.Column(db.Boolean, default=False, nullable=False),  # Estado de venta
+                                 active_history=True)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Versión de la fila: se usa como clave de la caché de fragmentos de los templates
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    # Vistas del detalle y puntaje de popularidad con decaimiento; solo los escribe el volcado en lote
+    # de vistas.py (sin tocar fecha_actualizacion)
+    vistas = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    popularidad = db.Column(db.Float, default=0, server_default='0', nullable=False)
     
     # Clave foránea que relaciona con el usuario propietario
-    propietario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
+    propietario_id = db.column_property(db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False),
+                                        active_history=True)
     
-    # Relación con pagos asociados a esta propiedad
-    pagos = db.relationship('Pago', backref='propiedad', lazy=True, order_by='desc(Pago.fecha_creacion)')
+    # Relación con pagos asociados a esta propiedad (dinámica, como Usuario.pagos)
+    pagos = db.relationship('Pago', backref='propiedad', lazy='dynamic', order_by='desc(Pago.fecha_creacion)')
     
     def marcar_como_vendida(self):
         # Marca la propiedad como vendida y guarda en la base de datos
@@ -62,15 +98,44 @@ class Propiedad(db.Model):
         return self
 
 
+class TarjetaPropiedad:
+    # Lectura compacta para los listados: solo las columnas que muestra la tarjeta (sin la descripción)
+    # en un objeto liviano de solo lectura, sin instancia del ORM ni entrada en el identity map
+    __slots__ = ('id', 'titulo', 'direccion', 'precio', 'vendida', 'metros_cuadrados', 'habitaciones', 'banos',
+                 'propietario_id', 'fecha_actualizacion')
+
+    def __init__(self, fila):
+        for nombre, valor in zip(self.__slots__, fila):
+            setattr(self, nombre, valor)
+
+    @classmethod
+    def consulta(cls):
+        # Consulta de las columnas de la tarjeta; admite los mismos filtros y órdenes sobre Propiedad
+        return db.session.query(*(getattr(Propiedad, nombre) for nombre in cls.__slots__))
+
+
 class Pago(db.Model):
     # Modelo de pago - Registra las transacciones de compra de propiedades
+    __table_args__ = (
+        # Índices de cobertura para los historiales paginados por (fecha_creacion, id):
+        # incluyen todas las columnas que muestran las páginas, así que se leen solo del índice
+        db.Index('ix_pago_usuario_fecha', 'usuario_id', 'fecha_creacion', 'id', 'propiedad_id', 'estado', 'monto'),
+        db.Index('ix_pago_propiedad_fecha', 'propiedad_id', 'fecha_creacion', 'id', 'usuario_id', 'estado', 'monto'),
+        # ¿La propiedad tiene un pago "pagado"? (verificar_disponibilidad y conciliación)
+        db.Index('ix_pago_propiedad_estado', 'propiedad_id', 'estado'),
+        # Pagos "procesando" más viejos que un límite (conciliación), recorridos en el orden del índice
+        db.Index('ix_pago_estado_fecha', 'estado', 'fecha_creacion'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    monto = db.Column(db.Float, nullable=False)
-    estado = db.Column(db.String(50), default='pendiente')  # pendiente, completado, fallido
+    monto = db.column_property(db.Column(db.Float, nullable=False), active_history=True)
+    estado = db.column_property(db.Column(db.String(50), default='pendiente'),  # procesando, pagado, expirado
+                                active_history=True)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
     # Claves foráneas para relacionar con usuario y propiedad
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
+    usuario_id = db.column_property(db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False),
+                                    active_history=True)
     propiedad_id = db.Column(db.Integer, db.ForeignKey('propiedad.id'), nullable=False)
     
     def marcar_como_pagado(self):
@@ -78,3 +143,215 @@ class Pago(db.Model):
         self.estado = 'pagado'
         db.session.commit()
         return self
+
+    @classmethod
+    def eliminar_de_propiedad(cls, propiedad_id: int) -> int:
+        # Borrado masivo de los pagos de una propiedad. Un DELETE masivo no dispara los eventos
+        # del mapper, así que primero se descuentan los pagos exitosos de los contadores de cada comprador.
+        tabla = Usuario.__table__
+        totales = db.session.execute(
+            select(cls.usuario_id, func.count(), func.sum(cls.monto))
+            .where(cls.propiedad_id == propiedad_id, cls.estado == 'pagado')
+            .group_by(cls.usuario_id)
+        ).all()
+        for usuario_id, cantidad, monto in totales:
+            db.session.execute(
+                tabla.update().where(tabla.c.id == usuario_id).values(
+                    pagos_realizados=tabla.c.pagos_realizados - cantidad,
+                    monto_pagado=tabla.c.monto_pagado - (monto or 0),
+                )
+            )
+        return cls.query.filter_by(propiedad_id=propiedad_id).delete()
+
+
+
+class EventoAuditoria(db.Model):
+    # Registro de auditoría de solo inserción: acciones administrativas y transiciones de pagos.
+    # Las filas las escribe en lotes el escritor de app/auditoria.py, nunca la petición.
+    __tablename__ = 'evento_auditoria'
+    __table_args__ = (
+        # Vista de administración paginada por (fecha, id), con filtros por acción, actor u objetivo
+        db.Index('ix_auditoria_fecha', 'fecha', 'id'),
+        db.Index('ix_auditoria_accion', 'accion', 'fecha', 'id'),
+        db.Index('ix_auditoria_actor', 'actor_id', 'fecha', 'id'),
+        db.Index('ix_auditoria_objetivo', 'objetivo_tipo', 'objetivo_id', 'fecha', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    fecha = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # Momento en que ocurrió la acción
+    accion = db.Column(db.String(50), nullable=False)  # p. ej. usuario.toggle_admin, pago.pagado
+    actor_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=True)  # None = sistema
+    objetivo_tipo = db.Column(db.String(30), nullable=True)
+    objetivo_id = db.Column(db.Integer, nullable=True)
+    detalles = db.Column(db.JSON, nullable=True)
+
+    actor = db.relationship('Usuario', lazy='joined')
+
+
+class BusquedaGuardada(db.Model):
+    # Búsqueda guardada por un usuario: se le avisa cuando se publica una propiedad que coincide
+    __tablename__ = 'busqueda_guardada'
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False, index=True)
+    texto = db.Column(db.String(200), nullable=False, default='')  # Palabras que deben aparecer (todas)
+    precio_min = db.Column(db.Float, nullable=True)
+    precio_max = db.Column(db.Float, nullable=True)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class AlertaBusqueda(db.Model):
+    # Coincidencia de una búsqueda guardada pendiente de enviar en el resumen por email.
+    # Guarda una copia de los datos de la propiedad para que el resumen no dependa de ella.
+    __tablename__ = 'alerta_busqueda'
+    __table_args__ = (
+        # El envío reclama lotes con UPDATE ... WHERE lote IS NULL, ordenados por usuario
+        db.Index('ix_alerta_lote', 'lote', 'usuario_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
+    busqueda_id = db.Column(db.Integer, nullable=False)
+    propiedad_id = db.Column(db.Integer, nullable=False)
+    titulo = db.Column(db.String(120), nullable=False)
+    precio = db.Column(db.Float, nullable=False)
+    fecha = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    lote = db.Column(db.String(36), nullable=True)  # Envío que la reclamó (None = pendiente)
+    fecha_envio = db.Column(db.DateTime, nullable=True)
+
+
+class BloqueoTarea(db.Model):
+    # Bloqueo con vencimiento para tareas que deben correr en un solo proceso a la vez (conciliación):
+    # lo toma quien inserta la fila o la actualiza ya vencida, y lo suelta borrándola
+    __tablename__ = 'bloqueo_tarea'
+    nombre = db.Column(db.String(50), primary_key=True)
+    duenio = db.Column(db.String(36), nullable=False)
+    vence = db.Column(db.DateTime, nullable=False)
+
+
+@event.listens_for(EventoAuditoria, 'before_update')
+@event.listens_for(EventoAuditoria, 'before_delete')
+def _auditoria_solo_insercion(mapper, conexion, evento_auditoria):
+    raise ValueError('Los eventos de auditoría no se pueden modificar ni eliminar')
+
+# ===== CONTADORES DESNORMALIZADOS =====
+# Cada fila de Propiedad/Pago "aporta" a los contadores de un usuario. En cada insert/update/delete
+# se resta el aporte anterior y se suma el nuevo con un UPDATE atómico (col = col + delta)
+# dentro de la misma transacción del flush.
+
+Aporte = Tuple[Optional[int], Dict[str, float]]
+
+
+def _valores(objeto, atributo: str) -> Tuple[Any, Any]:
+    # (valor anterior, valor actual) de un atributo durante el flush
+    historial = inspect(objeto).attrs[atributo].history
+    if historial.added:
+        actual = historial.added[0]
+    elif historial.unchanged:
+        actual = historial.unchanged[0]
+    else:
+        actual = getattr(objeto, atributo)
+    anterior = historial.deleted[0] if historial.deleted else actual
+    return anterior, actual
+
+
+def _aporte_propiedad(propietario_id, vendida) -> Aporte:
+    return propietario_id, {'total_propiedades': 1, 'propiedades_vendidas': 1 if vendida else 0}
+
+
+def _aporte_pago(usuario_id, estado, monto) -> Aporte:
+    if estado != 'pagado':
+        return usuario_id, {}
+    return usuario_id, {'pagos_realizados': 1, 'monto_pagado': monto or 0}
+
+
+def _aplicar_aportes(conexion, anterior: Optional[Aporte], actual: Optional[Aporte]):
+    deltas: Dict[int, Dict[str, float]] = {}
+    for aporte, signo in ((anterior, -1), (actual, 1)):
+        if aporte is None or aporte[0] is None:
+            continue
+        usuario_id, valores = aporte
+        acumulado = deltas.setdefault(usuario_id, {})
+        for columna, valor in valores.items():
+            acumulado[columna] = acumulado.get(columna, 0) + signo * valor
+
+    tabla = Usuario.__table__
+    for usuario_id, valores in deltas.items():
+        valores = {columna: delta for columna, delta in valores.items() if delta}
+        if valores:
+            conexion.execute(
+                tabla.update().where(tabla.c.id == usuario_id)
+                .values({columna: tabla.c[columna] + delta for columna, delta in valores.items()})
+            )
+
+
+def _aportes_propiedad(propiedad) -> Tuple[Aporte, Aporte]:
+    propietario = _valores(propiedad, 'propietario_id')
+    vendida = _valores(propiedad, 'vendida')
+    return (_aporte_propiedad(propietario[0], vendida[0]),
+            _aporte_propiedad(propietario[1], vendida[1]))
+
+
+def _aportes_pago(pago) -> Tuple[Aporte, Aporte]:
+    usuario = _valores(pago, 'usuario_id')
+    estado = _valores(pago, 'estado')
+    monto = _valores(pago, 'monto')
+    return (_aporte_pago(usuario[0], estado[0], monto[0]),
+            _aporte_pago(usuario[1], estado[1], monto[1]))
+
+
+@event.listens_for(Propiedad, 'after_insert')
+def _propiedad_insertada(mapper, conexion, propiedad):
+    _aplicar_aportes(conexion, None, _aportes_propiedad(propiedad)[1])
+
+
+@event.listens_for(Propiedad, 'after_update')
+def _propiedad_actualizada(mapper, conexion, propiedad):
+    _aplicar_aportes(conexion, *_aportes_propiedad(propiedad))
+
+
+@event.listens_for(Propiedad, 'after_delete')
+def _propiedad_eliminada(mapper, conexion, propiedad):
+    _aplicar_aportes(conexion, _aportes_propiedad(propiedad)[0], None)
+
+
+@event.listens_for(Pago, 'after_insert')
+def _pago_insertado(mapper, conexion, pago):
+    _aplicar_aportes(conexion, None, _aportes_pago(pago)[1])
+
+
+@event.listens_for(Pago, 'after_update')
+def _pago_actualizado(mapper, conexion, pago):
+    _aplicar_aportes(conexion, *_aportes_pago(pago))
+
+
+@event.listens_for(Pago, 'after_delete')
+def _pago_eliminado(mapper, conexion, pago):
+    _aplicar_aportes(conexion, _aportes_pago(pago)[0], None)
+
+
+def recalcular_contadores(lote: int = 5000) -> int:
+    # Recalcula los contadores de todos los usuarios con subconsultas correlacionadas,
+    # por rangos de IDs para no retener el bloqueo de escritura demasiado tiempo.
+    # Devuelve la cantidad de usuarios actualizados.
+    usuario = Usuario.__table__
+    propiedad = Propiedad.__table__
+    pago = Pago.__table__
+    pagados = (pago.c.usuario_id == usuario.c.id) & (pago.c.estado == 'pagado')
+    valores = {
+        'total_propiedades': select(func.count()).where(propiedad.c.propietario_id == usuario.c.id)
+        .scalar_subquery(),
+        'propiedades_vendidas': select(func.count())
+        .where(propiedad.c.propietario_id == usuario.c.id, propiedad.c.vendida.is_(True)).scalar_subquery(),
+        'pagos_realizados': select(func.count()).where(pagados).scalar_subquery(),
+        'monto_pagado': select(func.coalesce(func.sum(pago.c.monto), 0)).where(pagados).scalar_subquery(),
+    }
+
+    maximo = db.session.execute(select(func.max(usuario.c.id))).scalar() or 0
+    actualizados = 0
+    for inicio in range(0, maximo, lote):
+        resultado = db.session.execute(
+            usuario.update().where(usuario.c.id > inicio, usuario.c.id <= inicio + lote).values(valores)
+        )
+        db.session.commit()
+        actualizados += resultado.rowcount
+    return actualizados
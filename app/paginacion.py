@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+
+
+class PaginaClave:
+    # Página de una paginación por clave (keyset): en lugar de OFFSET se filtra por la última fila
+    # vista, así que el costo de cada página no crece con la profundidad del historial
+    def __init__(self, items: List[Any], siguiente: Optional[str], cursor: Optional[str]):
+        self.items = items
+        self.siguiente = siguiente  # Cursor de la página siguiente (None si es la última)
+        self.cursor = cursor        # Cursor con el que se pidió esta página (None = primera)
+
+    @property
+    def tiene_siguiente(self) -> bool:
+        return self.siguiente is not None
+
+    @property
+    def es_primera(self) -> bool:
+        return self.cursor is None
+
+
+def codificar_cursor(fecha: datetime, id_fila: int) -> str:
+    return f'{fecha.isoformat()}_{id_fila}'
+
+
+def decodificar_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    # Un cursor inválido se trata como "primera página"
+    if not cursor:
+        return None
+    try:
+        fecha, id_fila = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(fecha), int(id_fila)
+    except ValueError:
+        return None
+
+
+def paginar_por_clave(query, columna_fecha, columna_id, cursor: Optional[str], por_pagina: int = 20) -> PaginaClave:
+    # Ordena de más reciente a más antiguo por (fecha, id) y devuelve las filas posteriores al cursor.
+    # Pensado para apoyarse en un índice que empiece por el filtro y siga con (fecha, id).
+    desde = decodificar_cursor(cursor)
+    if desde is not None:
+        query = query.filter(tuple_(columna_fecha, columna_id) < desde)
+    filas = query.order_by(None).order_by(columna_fecha.desc(), columna_id.desc()).limit(por_pagina + 1).all()
+
+    siguiente = None
+    if len(filas) > por_pagina:
+        filas = filas[:por_pagina]
+        ultima = filas[-1]
+        siguiente = codificar_cursor(getattr(ultima, columna_fecha.key), getattr(ultima, columna_id.key))
+    return PaginaClave(filas, siguiente, cursor if desde is not None else None)
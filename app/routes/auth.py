@@ -1,13 +1,25 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
-from ..models import db, Usuario
+from ..models import db, Usuario, EventoAuditoria
 from ..auth_utils import admin_required
+from ..paginacion import paginar_por_clave
+from ..limites import limitar
+from .. import auditoria, difusion
 
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
 
+def _email_login():
+    return request.form.get('email', '').strip().lower() or None
+
+
+# Dos reglas: "login" por IP (estricta) y "login_cuenta" por email intentado, con una ráfaga mucho
+# mayor. La de la cuenta frena el ataque a una cuenta desde muchas IPs; por ser más holgada,
+# bloquear a la víctima cuesta muchos más intentos que los que una IP puede hacer seguidos.
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@limitar('login', metodos=('POST',), clave_usuario=lambda: None)
+@limitar('login_cuenta', metodos=('POST',), clave_usuario=_email_login, por_ip=False)
 def login():
     if request.method == 'POST':
         email = request.form.get('email', '').strip().lower()
@@ -78,26 +90,25 @@ def toggle_admin(usuario_id):
     usuario = Usuario.query.get_or_404(usuario_id)
     usuario.es_administrador = not usuario.es_administrador
     db.session.commit()
+    auditoria.registrar('usuario.toggle_admin', actor_id=current_user.id, objetivo_tipo='usuario',
+                        objetivo_id=usuario.id, es_administrador=usuario.es_administrador)
     
     accion = 'ahora es administrador' if usuario.es_administrador else 'ya no es administrador'
     flash(f'Usuario {usuario.nombre_usuario} {accion}', 'success')
     
     # Notificar al usuario a través de WebSocket si está conectado
     if usuario.es_administrador:
-        socketio.emit('rol_admin_asignado', 
-                     {'mensaje': f'¡Felicidades! Se te han asignado permisos de administrador.'},
-                     room=f'user_{usuario_id}')
+        difusion.emitir('rol_admin_asignado', 
+                        {'mensaje': f'¡Felicidades! Se te han asignado permisos de administrador.'},
+                        room=f'user_{usuario_id}')
     else:
-        socketio.emit('rol_admin_revocado', 
-                     {'mensaje': 'Tus permisos de administrador han sido revocados.'},
-                     room=f'user_{usuario_id}')
+        difusion.emitir('rol_admin_revocado', 
+                        {'mensaje': 'Tus permisos de administrador han sido revocados.'},
+                        room=f'user_{usuario_id}')
     
     return redirect(url_for('auth.admin_usuarios'))
 
 
-from flask_socketio import emit
-from app import socketio
-
 @auth_bp.route('/admin/usuario/<int:usuario_id>/toggle_estado', methods=['POST'])
 @admin_required
 def toggle_estado(usuario_id):
@@ -108,19 +119,59 @@ def toggle_estado(usuario_id):
     usuario = Usuario.query.get_or_404(usuario_id)
     usuario.activo = not usuario.activo
     db.session.commit()
+    auditoria.registrar('usuario.toggle_estado', actor_id=current_user.id, objetivo_tipo='usuario',
+                        objetivo_id=usuario.id, activo=usuario.activo)
     
     accion = 'activada' if usuario.activo else 'desactivada'
     flash(f'Cuenta de {usuario.nombre_usuario} {accion} correctamente', 'success')
     
     # Notificar al usuario a través de WebSocket si está conectado
     if not usuario.activo:
-        socketio.emit('cuenta_desactivada', 
-                     {'mensaje': 'Tu cuenta ha sido desactivada por un administrador.'},
-                     room=f'user_{usuario_id}')
+        difusion.emitir('cuenta_desactivada', 
+                        {'mensaje': 'Tu cuenta ha sido desactivada por un administrador.'},
+                        room=f'user_{usuario_id}')
     
     return redirect(url_for('auth.admin_usuarios'))
 
 
+@auth_bp.route('/admin/auditoria')
+@admin_required
+def admin_auditoria():
+    # Registro de auditoría paginado por clave sobre (fecha, id); cada filtro usa su propio índice
+    filtros = {
+        'accion': request.args.get('accion', '').strip(),
+        'actor_id': request.args.get('actor_id', type=int),
+        'objetivo_tipo': request.args.get('objetivo_tipo', '').strip(),
+        'objetivo_id': request.args.get('objetivo_id', type=int),
+    }
+    consulta = EventoAuditoria.query
+    for columna, valor in filtros.items():
+        if valor not in (None, ''):
+            consulta = consulta.filter(getattr(EventoAuditoria, columna) == valor)
+    pagina = paginar_por_clave(consulta, EventoAuditoria.fecha, EventoAuditoria.id,
+                               request.args.get('despues'), por_pagina=50)
+    filtros_activos = {k: v for k, v in filtros.items() if v not in (None, '')}
+    return render_template('admin/auditoria.html', pagina=pagina, filtros=filtros, filtros_activos=filtros_activos)
+
+
+@auth_bp.route('/admin/metricas')
+@admin_required
+def admin_metricas():
+    # Métricas internas de este proceso
+    cache = current_app.jinja_env.cache_fragmentos
+    return jsonify({
+        'difusion': difusion.metricas(),
+        'cache_fragmentos': cache.metricas() if cache else None,
+        'auditoria': auditoria.metricas(),
+        'limites': current_app.extensions['limites'].metricas(),
+        'autocompletado': current_app.extensions['autocompletado'].metricas(),
+        'alertas': current_app.extensions['alertas'].metricas(),
+        'vistas': current_app.extensions['vistas'].metricas(),
+        'conciliacion': current_app.extensions['conciliacion'].metricas(),
+        'compresion': current_app.extensions['compresion'].metricas() if 'compresion' in current_app.extensions else None,
+    })
+
+
 @auth_bp.route('/logout')
 @login_required
 def logout():
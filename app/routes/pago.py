@@ -1,8 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, jsonify, current_app, flash
+from flask import Blueprint, abort, render_template, request, redirect, url_for, jsonify, current_app, flash
 from flask_login import login_required, current_user
-from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import exists
+from sqlalchemy.orm import joinedload
 from ..models import db, Pago, Propiedad
-from .. import tasks
+from ..paginacion import paginar_por_clave
+from ..limites import limitar
+from .. import auditoria, tasks
 from functools import wraps
 
 
@@ -12,24 +15,19 @@ pago_bp = Blueprint('pago', __name__)
 def verificar_disponibilidad(f):
     @wraps(f)
     def decorated_function(propiedad_id, *args, **kwargs):
-        # Verificar si la propiedad existe y está disponible
-        propiedad = Propiedad.query.get_or_404(propiedad_id)
+        # Una sola lectura: la propiedad y si ya tiene un pago exitoso (índice propiedad_id, estado).
+        # Si hay pago pero falta la marca de vendida no se corrige aquí: lo hace la conciliación.
+        pagada = exists().where(Pago.propiedad_id == Propiedad.id, Pago.estado == 'pagado')
+        fila = db.session.query(Propiedad, pagada).filter(Propiedad.id == propiedad_id).first()
+        if fila is None:
+            abort(404)
+        propiedad, tiene_pago = fila
         
         # Verificar si la propiedad ya está vendida
         if propiedad.vendida:
             flash('Lo sentimos, esta propiedad ya ha sido vendida.', 'error')
             return redirect(url_for('propiedades.detalle', propiedad_id=propiedad_id))
-            
-        # Verificar si hay un pago exitoso para esta propiedad
-        pago_exitoso = Pago.query.filter_by(
-            propiedad_id=propiedad_id,
-            estado='pagado'
-        ).first()
-        
-        if pago_exitoso:
-            # Si encontramos un pago exitoso, marcamos la propiedad como vendida
-            propiedad.vendida = True
-            db.session.commit()
+        if tiene_pago:
             flash('Lo sentimos, esta propiedad ya ha sido vendida recientemente.', 'error')
             return redirect(url_for('propiedades.detalle', propiedad_id=propiedad_id))
             
@@ -67,10 +65,12 @@ def pagar(propiedad):
             
             db.session.add(pago)
             db.session.commit()
+            auditoria.registrar('pago.creado', actor_id=current_user.id, objetivo_tipo='pago', objetivo_id=pago.id,
+                                propiedad_id=propiedad.id, monto=pago.monto, estado=pago.estado)
             
             # Iniciar el procesamiento del pago en segundo plano
             job_id = tasks.enviar_procesar_pago(current_app._get_current_object(), pago.id)
-            return redirect(url_for('pago.esperar', job_id=job_id))
+            return redirect(url_for('pago.esperar', job_id=job_id, pago=pago.id))
             
         except Exception as e:
             db.session.rollback()
@@ -83,16 +83,42 @@ def pagar(propiedad):
 @pago_bp.route('/esperar/<job_id>')
 @login_required
 def esperar(job_id):
-    return render_template('pago/esperar.html', job_id=job_id)
+    return render_template('pago/esperar.html', job_id=job_id, pago_id=request.args.get('pago', type=int))
+
+
+def _estado_desde_pago(pago_id):
+    # Con varios workers el trabajo solo existe en el proceso que lo recibió: si el sondeo llega
+    # a otro, el estado se deduce de la fila del pago (una lectura por clave primaria)
+    pago = db.session.get(Pago, pago_id) if pago_id else None
+    if pago is None or pago.usuario_id != current_user.id:
+        return None
+    respuesta = {'pago_id': pago.id, 'propiedad_id': pago.propiedad_id}
+    if pago.estado == 'pagado':
+        respuesta.update(estado='completado', exito=True, mensaje='Pago procesado exitosamente',
+                         propiedad_vendida=True)
+    elif pago.estado != 'procesando':
+        respuesta.update(estado='completado', exito=False, mensaje='El pago ya no está en proceso',
+                         propiedad_vendida=False)
+    elif pago.propiedad is not None and pago.propiedad.vendida:
+        # El trabajo lo rechaza sin cambiar su estado: la propiedad la compró otro pago
+        respuesta.update(estado='completado', exito=False, mensaje='La propiedad ya ha sido vendida',
+                         propiedad_vendida=True)
+    else:
+        respuesta.update(estado='procesando', exito=False, mensaje='Procesando...')
+    return respuesta
 
 
 @pago_bp.route('/estado/<job_id>')
+@limitar('pago_estado', como_json=True)
 @login_required
 def estado(job_id):
     try:
         info = tasks.obtener_estado_trabajo(job_id)
         
         if not info or info.get('estado') == 'no_encontrado':
+            respuesta = _estado_desde_pago(request.args.get('pago', type=int))
+            if respuesta is not None:
+                return jsonify(respuesta)
             return jsonify({
                 "estado": "no_encontrado",
                 "exito": False,
@@ -148,6 +174,15 @@ def exito(pago_id):
     # Verificar que el pago pertenece al usuario actual
     if pago.usuario_id != current_user.id:
         flash('No tienes permiso para ver este pago', 'error')
-        return redirect(url_for('main.index'))
+        return redirect(url_for('main.inicio'))
     
     return render_template('pago/exito.html', pago=pago)
+
+
+@pago_bp.route('/mis-pagos')
+@login_required
+def mis_pagos():
+    # Historial de pagos del usuario, paginado por clave sobre el índice (usuario_id, fecha_creacion, id)
+    consulta = current_user.pagos.options(joinedload(Pago.propiedad).load_only(Propiedad.titulo))
+    pagina = paginar_por_clave(consulta, Pago.fecha_creacion, Pago.id, request.args.get('despues'), por_pagina=20)
+    return render_template('pago/mis_pagos.html', pagina=pagina, resumen=current_user.resumen())
@@ -1,7 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, abort, flash
+import math
+
+from flask import Blueprint, render_template, request, redirect, url_for, abort, flash, current_app, jsonify
 from flask_login import login_required, current_user
 from sqlalchemy import or_
-from ..models import db, Propiedad
+from sqlalchemy.orm import joinedload
+from ..models import db, Propiedad, Pago, Usuario, BusquedaGuardada, TarjetaPropiedad
+from ..paginacion import paginar_por_clave
+from ..limites import limitar
+from .. import auditoria
 from ..auth_utils import login_required, admin_required, propietario_o_admin_required
 
 
@@ -9,6 +15,7 @@ propiedades_bp = Blueprint('propiedades', __name__)
 
 
 @propiedades_bp.route('/')
+@limitar('busqueda', solo_si=lambda: bool(request.args.get('q')))
 def listar():
     # Configuración de paginación
     page = request.args.get('page', 1, type=int)
@@ -20,8 +27,8 @@ def listar():
     orden = request.args.get('orden', 'recientes')
     mis_propiedades = request.args.get('mis_propiedades', '')
     
-    # Construir la consulta base
-    query = Propiedad.query
+    # Construir la consulta base: solo las columnas de la tarjeta (ver TarjetaPropiedad)
+    query = TarjetaPropiedad.consulta()
     
     # Aplicar filtros
     if busqueda:
@@ -38,18 +45,21 @@ def listar():
     #     query = query.filter_by(tipo=tipo)
         
     if mis_propiedades and current_user.is_authenticated:
-        query = query.filter_by(propietario_id=current_user.id)
+        query = query.filter(Propiedad.propietario_id == current_user.id)
     
     # Ordenar
     if orden == 'precio_asc':
         query = query.order_by(Propiedad.precio.asc())
     elif orden == 'precio_desc':
         query = query.order_by(Propiedad.precio.desc())
+    elif orden == 'populares':
+        query = query.order_by(Propiedad.popularidad.desc(), Propiedad.id.desc())
     else:  # recientes
         query = query.order_by(Propiedad.fecha_creacion.desc())
     
     # Paginar los resultados
     propiedades_paginadas = query.paginate(page=page, per_page=per_page, error_out=False)
+    propiedades_paginadas.items = [TarjetaPropiedad(fila) for fila in propiedades_paginadas.items]
     
     return render_template(
         'propiedades/lista.html',
@@ -62,17 +72,101 @@ def listar():
     )
 
 
+@propiedades_bp.route('/sugerencias')
+@limitar('sugerencias', como_json=True)
+def sugerencias():
+    # Autocompletado del buscador: se responde desde el índice en memoria, sin consultar la base
+    autocompletado = current_app.extensions['autocompletado']
+    texto = request.args.get('q', '')[:100]
+    return jsonify({
+        'sugerencias': autocompletado.sugerir(texto) if texto.strip() else [],
+        'listo': autocompletado.listo,
+    })
+
+
 @propiedades_bp.route('/<int:propiedad_id>')
 def detalle(propiedad_id):
     # Cualquiera puede ver el detalle, pero mostramos acciones adicionales a propietarios/admins
     propiedad = Propiedad.query.get_or_404(propiedad_id)
     es_propietario = current_user.is_authenticated and propiedad.propietario_id == current_user.id
+    if not es_propietario:
+        # Solo se suma en memoria: la escritura la hace el volcado periódico (ver vistas.py)
+        current_app.extensions['vistas'].registrar(propiedad.id)
     return render_template('propiedades/detalle.html', 
                          propiedad=propiedad,
                          es_propietario=es_propietario,
                          es_admin=getattr(current_user, 'es_admin', False))
 
 
+@propiedades_bp.route('/<int:propiedad_id>/pagos')
+@login_required
+@propietario_o_admin_required
+def pagos(propiedad_id):
+    # Registro de pagos de la propiedad (propietario o admin), paginado por clave
+    # sobre el índice (propiedad_id, fecha_creacion, id)
+    propiedad = Propiedad.query.get_or_404(propiedad_id)
+    consulta = propiedad.pagos.options(joinedload(Pago.usuario).load_only(Usuario.nombre_usuario))
+    pagina = paginar_por_clave(consulta, Pago.fecha_creacion, Pago.id, request.args.get('despues'), por_pagina=20)
+    return render_template('propiedades/pagos.html', propiedad=propiedad, pagina=pagina)
+
+
+MAX_BUSQUEDAS_GUARDADAS = 20
+
+
+def _precio_opcional(valor: str):
+    # Campo de precio vacío = sin límite; negativo, no numérico o no finito (inf, nan, 1e400) = inválido
+    valor = (valor or '').strip()
+    if not valor:
+        return None
+    precio = float(valor)
+    if not math.isfinite(precio) or precio < 0:
+        raise ValueError(valor)
+    return precio
+
+
+@propiedades_bp.route('/busquedas', methods=['GET', 'POST'])
+@login_required
+def busquedas():
+    # Búsquedas guardadas del usuario: se avisa (en vivo y por email) cuando se publica una propiedad que coincide
+    if request.method == 'POST':
+        texto = request.form.get('q', '').strip()[:200]
+        try:
+            precio_min = _precio_opcional(request.form.get('precio_min'))
+            precio_max = _precio_opcional(request.form.get('precio_max'))
+        except ValueError:
+            flash('Los precios deben ser números positivos', 'danger')
+            return redirect(url_for('propiedades.busquedas'))
+        if not texto and precio_min is None and precio_max is None:
+            flash('Indica al menos un texto o un rango de precios para guardar la búsqueda', 'warning')
+            return redirect(url_for('propiedades.listar'))
+        if current_user.busquedas.count() >= MAX_BUSQUEDAS_GUARDADAS:
+            flash(f'Puedes guardar hasta {MAX_BUSQUEDAS_GUARDADAS} búsquedas', 'warning')
+            return redirect(url_for('propiedades.busquedas'))
+        if precio_min is not None and precio_max is not None and precio_min > precio_max:
+            precio_min, precio_max = precio_max, precio_min
+
+        busqueda = BusquedaGuardada(usuario_id=current_user.id, texto=texto,
+                                    precio_min=precio_min, precio_max=precio_max)
+        db.session.add(busqueda)
+        db.session.commit()
+        current_app.extensions['alertas'].agregar(busqueda)
+        flash('Búsqueda guardada: te avisaremos cuando se publique una propiedad que coincida', 'success')
+        return redirect(url_for('propiedades.busquedas'))
+
+    return render_template('propiedades/busquedas.html', busquedas=current_user.busquedas.all())
+
+
+@propiedades_bp.route('/busquedas/<int:busqueda_id>/eliminar', methods=['POST'])
+@login_required
+def eliminar_busqueda(busqueda_id):
+    busqueda = BusquedaGuardada.query.filter_by(id=busqueda_id, usuario_id=current_user.id).first_or_404()
+    db.session.delete(busqueda)
+    db.session.commit()
+    current_app.extensions['alertas'].quitar(busqueda_id)
+    flash('Búsqueda eliminada', 'success')
+    return redirect(url_for('propiedades.busquedas'))
+
+
 @propiedades_bp.route('/crear', methods=['GET', 'POST'])
 @login_required
 def crear():
@@ -175,8 +269,6 @@ def editar(propiedad_id):
 @propiedades_bp.route('/<int:propiedad_id>/eliminar', methods=['POST'])
 @login_required
 def eliminar(propiedad_id):
-    from ..models import Pago
-    
     # Obtener la propiedad con bloqueo para evitar condiciones de carrera
     propiedad = Propiedad.query.with_for_update().get_or_404(propiedad_id)
     
@@ -184,12 +276,15 @@ def eliminar(propiedad_id):
         abort(403)
     
     try:
-        # Primero eliminamos los pagos asociados a esta propiedad
-        Pago.query.filter_by(propiedad_id=propiedad.id).delete()
+        # Primero eliminamos los pagos asociados a esta propiedad (descontándolos de los contadores)
+        pagos_eliminados = Pago.eliminar_de_propiedad(propiedad.id)
+        titulo = propiedad.titulo
         
         # Luego eliminamos la propiedad
         db.session.delete(propiedad)
         db.session.commit()
+        auditoria.registrar('propiedad.eliminar', actor_id=current_user.id, objetivo_tipo='propiedad',
+                            objetivo_id=propiedad_id, titulo=titulo, pagos_eliminados=pagos_eliminados)
         
         # Limpiar la caché del navegador para forzar la actualización
         response = redirect(url_for('propiedades.listar'))
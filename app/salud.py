@@ -0,0 +1,106 @@
+import os
+import time
+from threading import Lock
+from typing import Any, Dict
+
+from flask import Blueprint, current_app, jsonify
+from sqlalchemy import text
+from werkzeug.wsgi import ClosingIterator
+
+from . import db
+
+salud_bp = Blueprint('salud', __name__)
+
+
+class EstadoProceso:
+    # Estado del proceso que atiende la petición: peticiones en curso (HTTP y conexiones de
+    # Socket.IO por separado), si está drenando y si ya arrancaron los servicios de fondo.
+    # Con el servidor de varios procesos (servidor.py) cada worker informa el suyo.
+    def __init__(self):
+        self.pid = os.getpid()
+        self.worker = None
+        self.inicio = time.time()
+        self.drenando = False
+        self.servicios_iniciados = False
+        self._bloqueo = Lock()
+        self._http = 0
+        self._socketio = 0
+        self.atendidas = 0
+
+    def despues_del_fork(self, worker: int):
+        self.pid = os.getpid()
+        self.worker = worker
+        self.inicio = time.time()
+        self._http = self._socketio = self.atendidas = 0
+
+    def envolver(self, wsgi_app):
+        # Middleware exterior (por fuera de Socket.IO) que cuenta lo que está en curso hasta que
+        # la respuesta se cierra; con el modo threading una conexión WebSocket dura toda la llamada
+        def app_contada(environ, start_response):
+            tipo = '_socketio' if environ.get('PATH_INFO', '').startswith('/socket.io') else '_http'
+
+            def start_response_contado(status, headers, exc_info=None):
+                if self.drenando:
+                    # Que el cliente no reutilice la conexión keep-alive con un proceso que se va
+                    headers = [(k, v) for k, v in headers if k.lower() != 'connection'] + [('Connection', 'close')]
+                return start_response(status, headers, exc_info)
+
+            self._sumar(tipo, 1)
+            try:
+                respuesta = wsgi_app(environ, start_response_contado)
+            except BaseException:
+                self._sumar(tipo, -1)
+                raise
+            return ClosingIterator(respuesta, [lambda: self._sumar(tipo, -1)])
+        return app_contada
+
+    def _sumar(self, tipo: str, delta: int):
+        with self._bloqueo:
+            setattr(self, tipo, getattr(self, tipo) + delta)
+            if delta > 0:
+                self.atendidas += 1
+
+    @property
+    def http_en_curso(self) -> int:
+        return self._http
+
+    @property
+    def socketio_en_curso(self) -> int:
+        return self._socketio
+
+    def resumen(self) -> Dict[str, Any]:
+        from .tasks import trabajos_en_curso
+        return {
+            'pid': self.pid,
+            'worker': self.worker,
+            'segundos_activo': round(time.time() - self.inicio, 1),
+            'drenando': self.drenando,
+            'servicios_iniciados': self.servicios_iniciados,
+            'http_en_curso': self._http,
+            'socketio_en_curso': self._socketio,
+            'atendidas': self.atendidas,
+            'trabajos_en_curso': trabajos_en_curso(),
+        }
+
+
+@salud_bp.route('/salud')
+def salud():
+    # Liveness: el proceso responde (no consulta dependencias)
+    return jsonify(current_app.extensions['salud'].resumen())
+
+
+@salud_bp.route('/listo')
+def listo():
+    # Readiness: el proceso acepta tráfico nuevo si no está drenando, ya arrancó sus servicios
+    # y llega a la base de datos. 503 en caso contrario, para que el balanceador lo saque.
+    estado = current_app.extensions['salud']
+    datos = estado.resumen()
+    datos['autocompletado'] = current_app.extensions['autocompletado'].listo
+    datos['alertas'] = current_app.extensions['alertas'].listo
+    try:
+        db.session.execute(text('SELECT 1'))
+        datos['base_datos'] = True
+    except Exception:  # noqa: BLE001
+        datos['base_datos'] = False
+    datos['listo'] = not estado.drenando and estado.servicios_iniciados and datos['base_datos']
+    return jsonify(datos), 200 if datos['listo'] else 503
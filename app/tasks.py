@@ -3,7 +3,8 @@ from uuid import uuid4
 from time import sleep
 from typing import Any, Dict, Optional
 
-from . import db
+from . import auditoria, db
+from .base_datos import usar_replica
 from .models import Pago, Usuario, Propiedad
 
 # Variables globales para gestionar trabajos en memoria
@@ -53,6 +54,32 @@ def enviar_trabajo(app, fn, *args, meta: Optional[Dict[str, Any]] = None, **kwar
     return id_trabajo
 
 
+def trabajos_en_curso() -> int:
+    # Trabajos todavía en ejecución en este proceso (un worker los espera antes de terminar)
+    with _bloqueo:
+        return sum(1 for trabajo in _trabajos.values() if trabajo["estado"] == "ejecutando")
+
+
+def programar_trabajo_periodico(app, fn, intervalo: float, nombre: str, inmediato: bool = True) -> Thread:
+    # Ejecuta fn en el contexto de la aplicación cada `intervalo` segundos en un hilo daemon
+    # (intervalo 0 = una sola vez). Un error se registra y no detiene las ejecuciones siguientes.
+    def bucle():
+        if not inmediato:
+            sleep(intervalo)
+        while True:
+            try:
+                _ejecutar_en_app(app, fn)
+            except Exception:  # noqa: BLE001
+                app.logger.error(f"Error en el trabajo periódico {nombre}", exc_info=True)
+            if not intervalo:
+                return
+            sleep(intervalo)
+
+    hilo = Thread(target=bucle, name=nombre, daemon=True)
+    hilo.start()
+    return hilo
+
+
 def obtener_estado_trabajo(id_trabajo: str) -> Dict[str, Any]:
     # Obtiene el estado actual de un trabajo
     with _bloqueo:
@@ -63,17 +90,17 @@ def obtener_estado_trabajo(id_trabajo: str) -> Dict[str, Any]:
 
 def _procesar_pago(pago_id: int) -> Dict[str, Any]:
     # Procesa un pago de forma asíncrona - Simula procesamiento con delay
+    from flask import current_app
     from sqlalchemy.orm import sessionmaker
-    from . import create_app
     
-    # Configuración inicial
-    app = create_app()
+    # Se reutiliza la app del contexto en el que se ejecuta el trabajo (ver enviar_trabajo)
+    app = current_app._get_current_object()
     Session = sessionmaker(bind=db.engine)
     session = Session()
     
     try:
-        # Pequeña pausa para simular procesamiento
-        sleep(2)
+        # Pequeña pausa para simular procesamiento (configurable para benchmarks)
+        sleep(app.config['PAGO_DEMORA_SEGUNDOS'])
         
         # Obtener el pago con bloqueo para evitar actualizaciones simultáneas
         pago = session.query(Pago).with_for_update(skip_locked=True).get(pago_id)
@@ -96,8 +123,20 @@ def _procesar_pago(pago_id: int) -> Dict[str, Any]:
                 "propiedad_vendida": False
             }
             
+        if pago.estado != 'procesando':
+            # La conciliación ya lo dio por expirado (o lo resolvió otro proceso)
+            app.logger.warning(f"Pago {pago.id} en estado {pago.estado}: no se procesa")
+            return {
+                "exito": False,
+                "mensaje": "El pago ya no está en proceso",
+                "pago_id": pago.id,
+                "propiedad_vendida": False
+            }
+            
         if pago.propiedad.vendida:
             app.logger.warning(f"Intento de pago para propiedad ya vendida: {pago.propiedad.id}")
+            auditoria.registrar('pago.rechazado', actor_id=pago.usuario_id, objetivo_tipo='pago', objetivo_id=pago.id,
+                                propiedad_id=pago.propiedad.id, motivo='propiedad_vendida')
             return {
                 "exito": False, 
                 "mensaje": "La propiedad ya ha sido vendida",
@@ -114,6 +153,8 @@ def _procesar_pago(pago_id: int) -> Dict[str, Any]:
         
         # Confirmar los cambios
         session.commit()
+        auditoria.registrar('pago.pagado', actor_id=pago.usuario_id, objetivo_tipo='pago', objetivo_id=pago.id,
+                            propiedad_id=pago.propiedad.id, monto=pago.monto)
         
         app.logger.info(f"Pago {pago.id} procesado exitosamente para la propiedad {pago.propiedad.id}")
         
@@ -130,6 +171,7 @@ def _procesar_pago(pago_id: int) -> Dict[str, Any]:
         session.rollback()
         error_msg = f"Error procesando pago {pago_id}: {str(e)}"
         app.logger.error(error_msg, exc_info=True)
+        auditoria.registrar('pago.error', objetivo_tipo='pago', objetivo_id=pago_id, error=str(e))
         
         return {
             "exito": False,
@@ -175,7 +217,9 @@ def calcular_estadisticas_paralelo(app) -> Dict[str, Any]:
     resultados: Dict[str, Any] = {}
 
     def ejecutar_y_guardar(clave, fn):
-        valor = _ejecutar_en_app(app, fn)
+        # Las estadísticas toleran datos levemente desfasados: se leen de la réplica
+        with usar_replica():
+            valor = _ejecutar_en_app(app, fn)
         resultados[clave] = valor
 
     # Métricas adicionales
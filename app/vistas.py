@@ -0,0 +1,195 @@
+import atexit
+import itertools
+import re
+import threading
+import time
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from flask import request, session
+from sqlalchemy import bindparam, update
+
+from . import db
+
+# User-Agent de rastreadores y clientes automáticos que no cuentan como vistas
+PATRON_BOTS = (r'bot|crawl|spider|slurp|preview|facebookexternalhit|headless|lighthouse|curl|wget|'
+               r'python-requests|python-urllib|httpclient|go-http-client')
+
+# Origen fijo del puntaje de popularidad. Cada vista suma 2^(t / vida media) contado desde aquí,
+# así que ordenar por el puntaje guardado equivale a ordenar por vistas con decaimiento exponencial
+# (todas las filas "envejecen" en el mismo factor y no hace falta reescribirlas). Un float alcanza
+# para ~1000 vidas medias: con 7 días, casi 20 años.
+EPOCA_POPULARIDAD = datetime(2024, 1, 1)
+
+CLAVE_SESION = 'vistas'
+MAX_VISTAS_SESION = 50  # Propiedades recordadas por sesión para no contar dos veces la misma
+
+
+class ContadorFragmentado:
+    # Contadores por propiedad repartidos en fragmentos con su propio lock. Cada hilo usa siempre
+    # el mismo fragmento, así los hilos que atienden peticiones casi nunca compiten por un lock;
+    # tomar() vacía todos los fragmentos y devuelve la suma.
+    def __init__(self, fragmentos: int = 16):
+        self._contadores: List[Dict[int, int]] = [{} for _ in range(fragmentos)]
+        self._bloqueos = [Lock() for _ in range(fragmentos)]
+        self._siguiente = itertools.count()
+        self._local = threading.local()
+
+    def _fragmento(self) -> int:
+        indice = getattr(self._local, 'fragmento', None)
+        if indice is None:
+            indice = self._local.fragmento = next(self._siguiente) % len(self._contadores)
+        return indice
+
+    def sumar(self, clave: int, cantidad: int = 1):
+        indice = self._fragmento()
+        with self._bloqueos[indice]:
+            contadores = self._contadores[indice]
+            contadores[clave] = contadores.get(clave, 0) + cantidad
+
+    def tomar(self) -> Dict[int, int]:
+        total: Dict[int, int] = {}
+        for indice, bloqueo in enumerate(self._bloqueos):
+            with bloqueo:
+                contadores, self._contadores[indice] = self._contadores[indice], {}
+            for clave, cantidad in contadores.items():
+                total[clave] = total.get(clave, 0) + cantidad
+        return total
+
+    def pendientes(self) -> int:
+        total = 0
+        for indice, bloqueo in enumerate(self._bloqueos):
+            with bloqueo:
+                total += sum(self._contadores[indice].values())
+        return total
+
+
+class Vistas:
+    # Vistas del detalle de propiedades: la petición solo suma en memoria y un hilo vuelca los
+    # contadores cada `intervalo` segundos con un UPDATE en lote (vistas = vistas + n). Varios
+    # procesos pueden volcar sobre las mismas filas: los incrementos se acumulan.
+    def __init__(self, app, activas: bool = True, intervalo: float = 10.0, fragmentos: int = 16,
+                 vida_media_dias: float = 7.0, filtrar_bots: bool = True, deduplicar: float = 1800.0):
+        self.app = app
+        self.activas = activas
+        self.intervalo = intervalo
+        self.vida_media = vida_media_dias * 86400
+        self.patron_bots = re.compile(PATRON_BOTS, re.IGNORECASE) if filtrar_bots else None
+        self.deduplicar = deduplicar
+        self.contador = ContadorFragmentado(fragmentos)
+        self._hilo: Optional[threading.Thread] = None
+        self._bloqueo_volcado = Lock()
+
+        self.registradas = 0
+        self.bots = 0
+        self.repetidas = 0
+        self.volcados = 0
+        self.filas_actualizadas = 0
+        self.errores = 0
+        self.tiempo_volcado = 0.0
+
+    # ----- Lado de la petición -----
+
+    def registrar(self, propiedad_id: int) -> bool:
+        # Cuenta una vista de la petición actual; devuelve False si no se cuenta (bot o repetida)
+        if not self.activas:
+            return False
+        if self.patron_bots is not None:
+            agente = request.user_agent.string
+            if not agente or self.patron_bots.search(agente):
+                self.bots += 1
+                return False
+        if self.deduplicar and not self._primera_en_sesion(propiedad_id):
+            self.repetidas += 1
+            return False
+        self.contador.sumar(propiedad_id)
+        self.registradas += 1
+        return True
+
+    def _primera_en_sesion(self, propiedad_id: int) -> bool:
+        # La sesión guarda cuándo vio cada propiedad (las más recientes, dentro de la ventana);
+        # solo se modifica cuando la vista cuenta, así las repetidas no reescriben la cookie
+        ahora = int(time.time())
+        clave = str(propiedad_id)
+        vistas = session.get(CLAVE_SESION) or {}
+        if ahora - vistas.get(clave, 0) < self.deduplicar:
+            return False
+        vigentes = sorted(((k, v) for k, v in vistas.items() if ahora - v < self.deduplicar),
+                          key=lambda par: par[1])[-(MAX_VISTAS_SESION - 1):]
+        session[CLAVE_SESION] = dict(vigentes, **{clave: ahora})
+        return True
+
+    # ----- Volcado -----
+
+    def peso(self, fecha: datetime) -> float:
+        return 2.0 ** ((fecha - EPOCA_POPULARIDAD).total_seconds() / self.vida_media)
+
+    def volcar(self) -> int:
+        # Escribe lo acumulado en una sola transacción; devuelve las propiedades actualizadas
+        with self._bloqueo_volcado:
+            conteos = self.contador.tomar()
+            if not conteos:
+                return 0
+            from .models import Propiedad
+            inicio = time.perf_counter()
+            tabla = Propiedad.__table__
+            peso = self.peso(datetime.utcnow())
+            sentencia = update(tabla).where(tabla.c.id == bindparam('b_id')).values(
+                vistas=tabla.c.vistas + bindparam('b_vistas'),
+                popularidad=tabla.c.popularidad + bindparam('b_puntaje'),
+                # Una vista no modifica la propiedad: no debe invalidar la caché de fragmentos
+                fecha_actualizacion=tabla.c.fecha_actualizacion,
+            )
+            # Orden por id: los procesos toman los locks de fila en el mismo orden
+            filas = [{'b_id': propiedad_id, 'b_vistas': cantidad, 'b_puntaje': cantidad * peso}
+                     for propiedad_id, cantidad in sorted(conteos.items())]
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as conexion:
+                        conexion.execute(sentencia, filas)
+            except Exception:  # noqa: BLE001
+                # Se devuelven a los contadores y se reintentan en el próximo volcado
+                self.errores += 1
+                for propiedad_id, cantidad in conteos.items():
+                    self.contador.sumar(propiedad_id, cantidad)
+                self.app.logger.error('No se pudieron volcar las vistas de %d propiedades', len(conteos),
+                                      exc_info=True)
+                return 0
+            self.volcados += 1
+            self.filas_actualizadas += len(filas)
+            self.tiempo_volcado += time.perf_counter() - inicio
+            return len(filas)
+
+    def iniciar(self):
+        # Volcado periódico en un hilo de fondo y uno final al salir del proceso
+        if self._hilo is not None or not self.activas or not self.intervalo:
+            return
+        from .tasks import programar_trabajo_periodico
+        self._hilo = programar_trabajo_periodico(self.app, self.volcar, self.intervalo, 'vistas-volcado',
+                                                 inmediato=False)
+        atexit.register(self.volcar)
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            'registradas': self.registradas,
+            'bots': self.bots,
+            'repetidas': self.repetidas,
+            'pendientes': self.contador.pendientes(),
+            'volcados': self.volcados,
+            'filas_actualizadas': self.filas_actualizadas,
+            'errores': self.errores,
+            'volcado_medio_ms': round(self.tiempo_volcado / self.volcados * 1000, 2) if self.volcados else 0.0,
+        }
+
+
+def configurar(app):
+    app.extensions['vistas'] = Vistas(
+        app,
+        activas=app.config['VISTAS_ACTIVAS'],
+        intervalo=app.config['VISTAS_INTERVALO_S'],
+        fragmentos=app.config['VISTAS_FRAGMENTOS'],
+        vida_media_dias=app.config['VISTAS_VIDA_MEDIA_DIAS'],
+        filtrar_bots=app.config['VISTAS_FILTRAR_BOTS'],
+        deduplicar=app.config['VISTAS_DEDUPLICAR_S'],
+    )
@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Se ejecuta en un intérprete nuevo para medir un arranque en frío real
+_SCRIPT_MEDICION = """
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+instancia = app.create_app()
+t2 = time.perf_counter()
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'create_app_ms': (t2 - t1) * 1000}))
+"""
+
+
+def _entorno(db_path: str) -> Dict[str, str]:
+    entorno = dict(os.environ)
+    entorno['DATABASE_URL'] = 'sqlite:///' + db_path
+    entorno['FLASK_APP'] = 'run.py'
+    return entorno
+
+
+def medir_arranque(repeticiones: int = 10, db_path: Optional[str] = None) -> Dict[str, Any]:
+    # Mide la importación del paquete y create_app() en procesos nuevos, con el esquema ya en head
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = db_path or os.path.join(tmp, 'arranque.db')
+        subprocess.run([sys.executable, '-m', 'flask', 'db', 'upgrade'], cwd=RAIZ, env=_entorno(db_path),
+                       check=True, capture_output=True)
+        muestras: List[Dict[str, float]] = []
+        for _ in range(repeticiones):
+            salida = subprocess.run([sys.executable, '-c', _SCRIPT_MEDICION], cwd=RAIZ, env=_entorno(db_path),
+                                    check=True, capture_output=True, text=True).stdout
+            muestras.append(json.loads(salida.strip().splitlines()[-1]))
+
+    resultado: Dict[str, Any] = {'repeticiones': repeticiones}
+    for clave in ('import_ms', 'create_app_ms'):
+        valores = [m[clave] for m in muestras]
+        resultado[clave] = round(statistics.median(valores), 2)
+        resultado[clave.replace('_ms', '_max_ms')] = round(max(valores), 2)
+    resultado['total_ms'] = round(resultado['import_ms'] + resultado['create_app_ms'], 2)
+    return resultado
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark de tiempo de importación y arranque de la app')
+    parser.add_argument('--repeticiones', type=int, default=10)
+    parser.add_argument('--max-total-ms', type=float, help='Umbral absoluto para import + create_app (mediana)')
+    parser.add_argument('--base', help='JSON de una medición anterior para comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help='Aumento relativo permitido respecto a --base (0.25 = 25%%)')
+    parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto, stdout)')
+    args = parser.parse_args(argv)
+
+    resultado = medir_arranque(args.repeticiones)
+    texto = json.dumps(resultado, indent=2, sort_keys=True)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+
+    regresiones = []
+    if args.max_total_ms is not None and resultado['total_ms'] > args.max_total_ms:
+        regresiones.append(f"total_ms {resultado['total_ms']} > umbral {args.max_total_ms}")
+    if args.base:
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+        for clave in ('import_ms', 'create_app_ms', 'total_ms'):
+            limite = base[clave] * (1 + args.tolerancia)
+            if resultado[clave] > limite:
+                regresiones.append(f'{clave} {resultado[clave]} > {round(limite, 2)} (base {base[clave]})')
+    for regresion in regresiones:
+        print('REGRESIÓN:', regresion, file=sys.stderr)
+    return 1 if regresiones else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# Métricas comparadas: (clave, True si "más alto es mejor")
+METRICAS = [('p50_ms', False), ('p99_ms', False), ('ops_por_segundo', True)]
+
+
+def comparar(base: Dict[str, Any], nuevo: Dict[str, Any], tolerancia: float = 0.15) -> Tuple[List[Dict[str, Any]], bool]:
+    # Compara dos informes de la suite; devuelve las filas de diferencias y si hubo regresión
+    filas, hubo_regresion = [], False
+    for escenario, actual in sorted(nuevo['resultados'].items()):
+        anterior = base['resultados'].get(escenario)
+        if not anterior:
+            continue
+        for metrica, mayor_es_mejor in METRICAS:
+            a, b = anterior.get(metrica), actual.get(metrica)
+            if not a or b is None:
+                continue
+            cambio = (b - a) / a
+            regresion = cambio < -tolerancia if mayor_es_mejor else cambio > tolerancia
+            hubo_regresion = hubo_regresion or regresion
+            filas.append({
+                'escenario': escenario,
+                'metrica': metrica,
+                'base': a,
+                'nuevo': b,
+                'cambio_pct': round(cambio * 100, 1),
+                'regresion': regresion,
+            })
+    return filas, hubo_regresion
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Compara dos resultados JSON de la suite de benchmarks')
+    parser.add_argument('base')
+    parser.add_argument('nuevo')
+    parser.add_argument('--tolerancia', type=float, default=0.15,
+                        help='Cambio relativo permitido antes de marcar una regresión (0.15 = 15%%)')
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.nuevo, encoding='utf-8') as f:
+        nuevo = json.load(f)
+
+    filas, hubo_regresion = comparar(base, nuevo, args.tolerancia)
+    print(f"base: {base['meta'].get('commit')}  nuevo: {nuevo['meta'].get('commit')}")
+    for fila in filas:
+        marca = '  REGRESIÓN' if fila['regresion'] else ''
+        print(f"{fila['escenario']:<28} {fila['metrica']:<16} {fila['base']:>12} -> {fila['nuevo']:>12}"
+              f" ({fila['cambio_pct']:+.1f}%){marca}")
+    return 1 if hubo_regresion else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
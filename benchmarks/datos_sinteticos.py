@@ -0,0 +1,141 @@
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import insert, update
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models import Usuario, Propiedad, Pago, recalcular_contadores
+
+# Contraseña común a todos los usuarios sintéticos (se hashea una sola vez)
+PASSWORD_SINTETICA = 'benchmark'
+
+# Fecha base fija para que los datasets sean reproducibles entre ejecuciones
+FECHA_BASE = datetime(2024, 1, 1)
+
+_CALLES = [
+    'Av. Corrientes', 'Calle San Martín', 'Av. Libertador', 'Calle Belgrano', 'Av. Rivadavia',
+    'Calle Sarmiento', 'Pasaje Güemes', 'Av. Santa Fe', 'Calle Mitre', 'Calle Moreno',
+    'Av. Córdoba', 'Calle Lavalle', 'Calle Tucumán', 'Av. de Mayo', 'Calle Florida',
+]
+_CIUDADES = [
+    'Buenos Aires', 'Córdoba', 'Rosario', 'Mendoza', 'La Plata',
+    'Mar del Plata', 'Salta', 'Neuquén', 'San Miguel de Tucumán', 'Bahía Blanca',
+]
+_TIPOS = ['Casa', 'Departamento', 'Dúplex', 'PH', 'Loft', 'Monoambiente', 'Chalet', 'Quinta']
+_ADJETIVOS = ['luminoso', 'amplio', 'reciclado', 'a estrenar', 'con jardín', 'con vista',
+              'céntrico', 'con cochera', 'con pileta', 'silencioso']
+_FRASES = [
+    'Excelente ubicación cerca de transporte público y comercios.',
+    'Cocina integrada con muebles bajo mesada y alacena.',
+    'Pisos de madera en todos los ambientes.',
+    'Balcón al frente con muy buena luz natural.',
+    'Edificio con seguridad las 24 horas y amenities.',
+    'Patio con parrilla ideal para reuniones familiares.',
+    'Calefacción central y aire acondicionado en dormitorios.',
+    'Apto crédito hipotecario, escritura inmediata.',
+]
+
+
+def _filas_usuarios(rng: random.Random, cantidad: int, password_hash: str) -> List[Dict[str, Any]]:
+    filas = []
+    for i in range(cantidad):
+        filas.append({
+            'nombre_usuario': f'usuario{i:07d}',
+            'email': f'usuario{i:07d}@bench.local',
+            'password_hash': password_hash,
+            'es_administrador': i == 0,
+            'activo': True,
+        })
+    return filas
+
+
+def _fila_propiedad(rng: random.Random, indice: int, total_usuarios: int) -> Dict[str, Any]:
+    tipo = rng.choice(_TIPOS)
+    ciudad = rng.choice(_CIUDADES)
+    habitaciones = rng.randint(0, 6)
+    return {
+        'titulo': f'{tipo} {rng.choice(_ADJETIVOS)} en {ciudad}',
+        'descripcion': ' '.join(rng.choice(_FRASES) for _ in range(rng.randint(2, 12))),
+        'precio': float(rng.randrange(30_000, 2_000_000, 500)),
+        'direccion': f'{rng.choice(_CALLES)} {rng.randint(1, 9999)}, {ciudad}',
+        'metros_cuadrados': float(rng.randint(25, 600)),
+        'habitaciones': habitaciones,
+        'banos': rng.randint(1, max(1, habitaciones)),
+        'estacionamientos': rng.randint(0, 3),
+        'vendida': False,
+        'fecha_creacion': FECHA_BASE + timedelta(minutes=indice),
+        'propietario_id': rng.randint(1, total_usuarios),
+    }
+
+
+def generar_dataset(app, usuarios: int = 1000, propiedades: int = 10_000, pagos: int = 2_000,
+                    semilla: int = 42, lote: int = 10_000) -> Dict[str, int]:
+    # Inserta un dataset sintético reproducible usando inserciones masivas por lotes.
+    # Requiere una base de datos vacía (los IDs quedan en el rango 1..N): con datos se rechaza
+    # en lugar de mezclar o borrar lo que haya.
+    rng = random.Random(semilla)
+
+    with app.app_context():
+        db.create_all(bind_key=None)
+        if any(db.session.query(modelo.id).first() for modelo in (Usuario, Propiedad, Pago)):
+            raise ValueError(f'La base {db.engine.url.database} ya tiene datos: usar --reutilizar para medir '
+                             'sobre ella o indicar otro --db')
+        password_hash = generate_password_hash(PASSWORD_SINTETICA)
+
+        filas = _filas_usuarios(rng, usuarios, password_hash)
+        for inicio in range(0, len(filas), lote):
+            db.session.execute(insert(Usuario), filas[inicio:inicio + lote])
+            db.session.commit()
+
+        for inicio in range(0, propiedades, lote):
+            fin = min(inicio + lote, propiedades)
+            db.session.execute(
+                insert(Propiedad),
+                [_fila_propiedad(rng, i, usuarios) for i in range(inicio, fin)],
+            )
+            db.session.commit()
+
+        # Pagos: la mayoría exitosos (marcan la propiedad como vendida), el resto fallidos
+        vendidas = set()
+        filas_pagos = []
+        for i in range(pagos):
+            propiedad_id = rng.randint(1, propiedades)
+            estado = 'pagado' if propiedad_id not in vendidas and rng.random() < 0.7 else 'fallido'
+            if estado == 'pagado':
+                vendidas.add(propiedad_id)
+            filas_pagos.append({
+                'monto': float(rng.randrange(30_000, 2_000_000, 500)),
+                'estado': estado,
+                'fecha_creacion': FECHA_BASE + timedelta(minutes=propiedades + i),
+                'usuario_id': rng.randint(1, usuarios),
+                'propiedad_id': propiedad_id,
+            })
+            if len(filas_pagos) >= lote:
+                db.session.execute(insert(Pago), filas_pagos)
+                db.session.commit()
+                filas_pagos = []
+        if filas_pagos:
+            db.session.execute(insert(Pago), filas_pagos)
+            db.session.commit()
+
+        ids_vendidas = sorted(vendidas)
+        for inicio in range(0, len(ids_vendidas), lote):
+            db.session.execute(
+                update(Propiedad)
+                .where(Propiedad.id.in_(ids_vendidas[inicio:inicio + lote]))
+                .values(vendida=True)
+            )
+            db.session.commit()
+
+        # Las inserciones masivas no disparan los eventos del ORM: se recalculan los contadores
+        recalcular_contadores(lote=lote)
+
+    return {
+        'usuarios': usuarios,
+        'propiedades': propiedades,
+        'pagos': pagos,
+        'vendidas': len(vendidas),
+        'semilla': semilla,
+    }
@@ -0,0 +1,294 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from .datos_sinteticos import PASSWORD_SINTETICA, generar_dataset
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    k = (len(ordenados) - 1) * p
+    inferior = int(k)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (k - inferior)
+
+
+def resumir(latencias: List[float], duracion_total: float, errores: int = 0) -> Dict[str, Any]:
+    # Resume latencias (en segundos) como milisegundos y throughput en operaciones/segundo
+    ms = [l * 1000 for l in latencias]
+    return {
+        'n': len(ms),
+        'errores': errores,
+        'media_ms': round(statistics.fmean(ms), 3) if ms else 0.0,
+        'p50_ms': round(_percentil(ms, 0.50), 3),
+        'p90_ms': round(_percentil(ms, 0.90), 3),
+        'p99_ms': round(_percentil(ms, 0.99), 3),
+        'max_ms': round(max(ms), 3) if ms else 0.0,
+        'ops_por_segundo': round(len(ms) / duracion_total, 2) if duracion_total > 0 else 0.0,
+    }
+
+
+def medir(fn: Callable[[int], bool], repeticiones: int, calentamiento: int = 3) -> Dict[str, Any]:
+    # Ejecuta fn(i) secuencialmente; fn devuelve False si la operación falló
+    for i in range(calentamiento):
+        fn(i)
+    latencias, errores = [], 0
+    inicio_total = time.perf_counter()
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        ok = fn(i)
+        latencias.append(time.perf_counter() - inicio)
+        if not ok:
+            errores += 1
+    return resumir(latencias, time.perf_counter() - inicio_total, errores)
+
+
+# ===== ESCENARIOS SECUENCIALES (cliente de pruebas de Flask) =====
+
+def _escenario_get(cliente, rutas: List[str]) -> Callable[[int], bool]:
+    def fn(i: int) -> bool:
+        resp = cliente.get(rutas[i % len(rutas)])
+        return resp.status_code == 200
+    return fn
+
+
+def _escenario_login(app, email: str) -> Callable[[int], bool]:
+    def fn(i: int) -> bool:
+        cliente = app.test_client()
+        resp = cliente.post('/auth/login', data={'email': email, 'password': PASSWORD_SINTETICA})
+        return resp.status_code == 302
+    return fn
+
+
+def _escenario_flujo_pago(app, cliente, ids_disponibles: List[int], espera_max: float) -> Callable[[int], bool]:
+    # Flujo completo: POST pagar -> redirección a esperar -> sondeo de estado hasta terminar
+    pendientes = list(ids_disponibles)
+
+    def fn(i: int) -> bool:
+        if not pendientes:
+            return False
+        propiedad_id = pendientes.pop()
+        resp = cliente.post(f'/pago/pagar/{propiedad_id}')
+        if resp.status_code != 302 or '/pago/esperar/' not in resp.location:
+            return False
+        job_id = resp.location.rstrip('/').rsplit('/', 1)[-1]
+        limite = time.perf_counter() + espera_max
+        while time.perf_counter() < limite:
+            datos = cliente.get(f'/pago/estado/{job_id}').get_json()
+            if datos['estado'] in ('completado', 'error'):
+                return bool(datos.get('exito'))
+            time.sleep(0.005)
+        return False
+    return fn
+
+
+def _escenario_estadisticas(app) -> Callable[[int], bool]:
+    from app import tasks
+
+    def fn(i: int) -> bool:
+        return len(tasks.calcular_estadisticas_paralelo(app)) > 0
+    return fn
+
+
+# ===== ESCENARIOS CONCURRENTES (servidor local) =====
+
+class ServidorLocal:
+    # Levanta la aplicación en un servidor WSGI local con hilos, en un puerto libre
+    def __init__(self, app):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class _ManejadorSilencioso(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.servidor = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_ManejadorSilencioso)
+        self.url = f'http://127.0.0.1:{self.servidor.server_port}'
+        self.hilo = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.servidor.shutdown()
+        self.hilo.join()
+
+
+def medir_concurrente(url_base: str, rutas: List[str], hilos: int, peticiones: int) -> Dict[str, Any]:
+    latencias: List[float] = []
+    errores = 0
+    bloqueo = threading.Lock()
+
+    def pedir(i: int):
+        nonlocal errores
+        inicio = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url_base + rutas[i % len(rutas)], timeout=30) as resp:
+                resp.read()
+                ok = resp.status == 200
+        except Exception:  # noqa: BLE001
+            ok = False
+        duracion = time.perf_counter() - inicio
+        with bloqueo:
+            latencias.append(duracion)
+            if not ok:
+                errores += 1
+
+    inicio_total = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        list(ejecutor.map(pedir, range(peticiones)))
+    resultado = resumir(latencias, time.perf_counter() - inicio_total, errores)
+    resultado['hilos'] = hilos
+    return resultado
+
+
+# ===== EJECUCIÓN DE LA SUITE =====
+
+def _commit_actual() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except Exception:  # noqa: BLE001
+        return None
+
+
+def ejecutar_suite(db_path: str, usuarios: int = 1000, propiedades: int = 10_000, pagos: int = 2_000,
+                   repeticiones: int = 50, pagos_flujo: int = 5, hilos: int = 8,
+                   peticiones_concurrentes: int = 400, semilla: int = 42,
+                   reutilizar: bool = False) -> Dict[str, Any]:
+    # La app (y los hilos de pago que crean su propia app) leen la configuración del entorno
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(db_path)
+    os.environ['PAGO_DEMORA_SEGUNDOS'] = '0'
+    # Todas las peticiones salen de la misma IP: sin límites para medir la app en sí
+    os.environ['LIMITES_ACTIVOS'] = '0'
+    from app import create_app
+    from app.models import Propiedad
+
+    app = create_app()
+
+    if reutilizar and os.path.exists(db_path):
+        with app.app_context():
+            from app.models import Usuario, Pago
+            dataset = {
+                'usuarios': Usuario.query.count(),
+                'propiedades': Propiedad.query.count(),
+                'pagos': Pago.query.count(),
+                'semilla': semilla,
+            }
+    else:
+        inicio = time.perf_counter()
+        dataset = generar_dataset(app, usuarios=usuarios, propiedades=propiedades, pagos=pagos, semilla=semilla)
+        dataset['segundos_generacion'] = round(time.perf_counter() - inicio, 2)
+
+    rng = random.Random(semilla)
+    total = dataset['propiedades']
+    paginas = max(1, (total + 9) // 10)
+    ids_detalle = [rng.randint(1, total) for _ in range(100)]
+    comprador = 'usuario0000001@bench.local'
+
+    with app.app_context():
+        from app.models import Usuario
+        comprador_id = Usuario.query.filter_by(email=comprador).first().id
+        ids_disponibles = [
+            fila.id for fila in Propiedad.query
+            .with_entities(Propiedad.id)
+            .filter(Propiedad.vendida.is_(False), Propiedad.propietario_id != comprador_id)
+            .order_by(Propiedad.id)
+            .limit(pagos_flujo + 10)
+        ]
+
+    anonimo = app.test_client()
+    autenticado = app.test_client()
+    autenticado.post('/auth/login', data={'email': comprador, 'password': PASSWORD_SINTETICA})
+
+    pagina_profunda = max(1, paginas // 2)
+    resultados: Dict[str, Any] = {
+        'listar_pagina_1': medir(_escenario_get(anonimo, ['/propiedades/']), repeticiones),
+        'listar_pagina_profunda': medir(_escenario_get(anonimo, [f'/propiedades/?page={pagina_profunda}']), repeticiones),
+        'listar_busqueda_pagina_1': medir(_escenario_get(anonimo, ['/propiedades/?q=jard%C3%ADn']), repeticiones),
+        'listar_busqueda_profunda': medir(
+            _escenario_get(anonimo, [f'/propiedades/?q=Departamento&page={max(1, paginas // 20)}']), repeticiones),
+        'detalle': medir(_escenario_get(anonimo, [f'/propiedades/{i}' for i in ids_detalle]), repeticiones),
+        'login': medir(_escenario_login(app, comprador), max(5, repeticiones // 5), calentamiento=1),
+        'flujo_pago': medir(
+            _escenario_flujo_pago(app, autenticado, ids_disponibles, espera_max=30.0), pagos_flujo, calentamiento=0),
+        'estadisticas': medir(_escenario_estadisticas(app), max(5, repeticiones // 5), calentamiento=1),
+    }
+
+    if hilos > 0 and peticiones_concurrentes > 0:
+        with ServidorLocal(app) as servidor:
+            resultados['concurrente_listar'] = medir_concurrente(
+                servidor.url, ['/propiedades/', f'/propiedades/?page={pagina_profunda}'],
+                hilos, peticiones_concurrentes)
+            resultados['concurrente_detalle'] = medir_concurrente(
+                servidor.url, [f'/propiedades/{i}' for i in ids_detalle], hilos, peticiones_concurrentes)
+
+    return {
+        'meta': {
+            'commit': _commit_actual(),
+            'fecha': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'repeticiones': repeticiones,
+        },
+        'dataset': dataset,
+        'resultados': resultados,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark de LVT Inmuebles con datos sintéticos')
+    parser.add_argument('--usuarios', type=int, default=1000)
+    parser.add_argument('--propiedades', type=int, default=10_000)
+    parser.add_argument('--pagos', type=int, default=2_000)
+    parser.add_argument('--repeticiones', type=int, default=50)
+    parser.add_argument('--pagos-flujo', type=int, default=5)
+    parser.add_argument('--hilos', type=int, default=8, help='0 desactiva las pruebas concurrentes')
+    parser.add_argument('--peticiones-concurrentes', type=int, default=400)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--db', help='Ruta del archivo SQLite (por defecto, uno temporal)')
+    parser.add_argument('--reutilizar', action='store_true', help='Reutilizar la base de --db ya generada')
+    parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto, stdout)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, 'bench.db')
+        try:
+            informe = ejecutar_suite(
+                db_path,
+                usuarios=args.usuarios, propiedades=args.propiedades, pagos=args.pagos,
+                repeticiones=args.repeticiones, pagos_flujo=args.pagos_flujo, hilos=args.hilos,
+                peticiones_concurrentes=args.peticiones_concurrentes, semilla=args.semilla,
+                reutilizar=args.reutilizar,
+            )
+        except ValueError as error:
+            parser.error(str(error))
+
+    texto = json.dumps(informe, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
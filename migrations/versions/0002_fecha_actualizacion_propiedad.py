@@ -0,0 +1,29 @@
+"""fecha de actualización en propiedad
+
+Revision ID: 0002_fecha_actualizacion
+Revises: 0001_esquema_inicial
+Create Date: 2026-10-19 16:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_fecha_actualizacion'
+down_revision = '0001_esquema_inicial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('propiedad') as batch_op:
+        batch_op.add_column(sa.Column('fecha_actualizacion', sa.DateTime(), nullable=True))
+    op.execute('UPDATE propiedad SET fecha_actualizacion = fecha_creacion')
+    with op.batch_alter_table('propiedad') as batch_op:
+        batch_op.alter_column('fecha_actualizacion', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('propiedad') as batch_op:
+        batch_op.drop_column('fecha_actualizacion')
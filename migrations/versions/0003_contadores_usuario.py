@@ -0,0 +1,42 @@
+"""contadores desnormalizados en usuario
+
+Revision ID: 0003_contadores_usuario
+Revises: 0002_fecha_actualizacion
+Create Date: 2026-10-19 17:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_contadores_usuario'
+down_revision = '0002_fecha_actualizacion'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('usuario') as batch_op:
+        batch_op.add_column(sa.Column('total_propiedades', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('propiedades_vendidas', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('pagos_realizados', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('monto_pagado', sa.Float(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE usuario SET
+            total_propiedades = (SELECT count(*) FROM propiedad WHERE propiedad.propietario_id = usuario.id),
+            propiedades_vendidas = (SELECT count(*) FROM propiedad
+                                    WHERE propiedad.propietario_id = usuario.id AND propiedad.vendida),
+            pagos_realizados = (SELECT count(*) FROM pago
+                                WHERE pago.usuario_id = usuario.id AND pago.estado = 'pagado'),
+            monto_pagado = (SELECT coalesce(sum(monto), 0) FROM pago
+                            WHERE pago.usuario_id = usuario.id AND pago.estado = 'pagado')
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('usuario') as batch_op:
+        batch_op.drop_column('monto_pagado')
+        batch_op.drop_column('pagos_realizados')
+        batch_op.drop_column('propiedades_vendidas')
+        batch_op.drop_column('total_propiedades')
@@ -0,0 +1,27 @@
+"""índices de cobertura para los historiales de pagos
+
+Revision ID: 0004_indices_pagos
+Revises: 0003_contadores_usuario
+Create Date: 2026-10-19 18:10:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_indices_pagos'
+down_revision = '0003_contadores_usuario'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_pago_usuario_fecha', 'pago',
+                    ['usuario_id', 'fecha_creacion', 'id', 'propiedad_id', 'estado', 'monto'])
+    op.create_index('ix_pago_propiedad_fecha', 'pago',
+                    ['propiedad_id', 'fecha_creacion', 'id', 'usuario_id', 'estado', 'monto'])
+
+
+def downgrade():
+    op.drop_index('ix_pago_propiedad_fecha', table_name='pago')
+    op.drop_index('ix_pago_usuario_fecha', table_name='pago')
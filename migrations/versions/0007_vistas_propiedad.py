@@ -0,0 +1,30 @@
+"""vistas y popularidad de propiedades
+
+Revision ID: 0007_vistas
+Revises: 0006_alertas
+Create Date: 2026-10-19 18:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_vistas'
+down_revision = '0006_alertas'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('propiedad') as batch_op:
+        batch_op.add_column(sa.Column('vistas', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('popularidad', sa.Float(), server_default='0', nullable=False))
+        batch_op.create_index('ix_propiedad_popularidad', ['popularidad', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('propiedad') as batch_op:
+        batch_op.drop_index('ix_propiedad_popularidad')
+        batch_op.drop_column('popularidad')
+        batch_op.drop_column('vistas')
@@ -0,0 +1,26 @@
+"""índice de pagos por propiedad y estado
+
+Revision ID: 0008_pago_estado
+Revises: 0007_vistas
+Create Date: 2026-10-19 19:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_pago_estado'
+down_revision = '0007_vistas'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pago') as batch_op:
+        batch_op.create_index('ix_pago_propiedad_estado', ['propiedad_id', 'estado'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('pago') as batch_op:
+        batch_op.drop_index('ix_pago_propiedad_estado')
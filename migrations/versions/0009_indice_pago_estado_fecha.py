@@ -0,0 +1,26 @@
+"""índice de pagos por estado y fecha de creación
+
+Revision ID: 0009_pago_estado_fecha
+Revises: 0008_pago_estado
+Create Date: 2026-10-19 21:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_pago_estado_fecha'
+down_revision = '0008_pago_estado'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pago') as batch_op:
+        batch_op.create_index('ix_pago_estado_fecha', ['estado', 'fecha_creacion'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('pago') as batch_op:
+        batch_op.drop_index('ix_pago_estado_fecha')
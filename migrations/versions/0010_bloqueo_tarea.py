@@ -0,0 +1,30 @@
+"""bloqueos de tareas en la base de datos
+
+Revision ID: 0010_bloqueo_tarea
+Revises: 0009_pago_estado_fecha
+Create Date: 2026-10-19 21:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_bloqueo_tarea'
+down_revision = '0009_pago_estado_fecha'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'bloqueo_tarea',
+        sa.Column('nombre', sa.String(length=50), nullable=False),
+        sa.Column('duenio', sa.String(length=36), nullable=False),
+        sa.Column('vence', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('nombre'),
+    )
+
+
+def downgrade():
+    op.drop_table('bloqueo_tarea')
@@ -1,6 +1,6 @@
 from app import create_app, socketio
 
-app = create_app()
+app = create_app(servicios=True)
 
 if __name__ == "__main__":
     socketio.run(app, debug=True, host='0.0.0.0')
@@ -0,0 +1,273 @@
+# Servidor de producción con varios procesos (pre-fork) sobre create_app/socketio.
+#
+#   python servidor.py --workers 4 --puerto 8000
+#
+# El maestro abre el puerto una sola vez y crea los workers con fork: todos aceptan conexiones del
+# mismo socket, así se usan todos los núcleos. Con precarga (por defecto) la app se construye en el
+# maestro antes del fork y los workers comparten esa memoria (copy-on-write); sin precarga
+# (--sin-precarga) cada worker importa la app, y una recarga toma el código nuevo.
+#
+# Señales al maestro:
+#   SIGTERM / SIGINT  detención ordenada: cada worker deja de aceptar, termina las peticiones y los
+#                     trabajos de pago en curso, cierra los WebSocket (el navegador reconecta) y sale
+#   SIGHUP            recarga gradual: se crea un worker nuevo por cada uno existente y recién
+#                     cuando el nuevo está listo se drena el anterior
+#
+# Cada worker expone /salud (liveness) y /listo (readiness) con su pid y su estado.
+
+import argparse
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger('servidor')
+
+
+# ===== WORKER =====
+
+def _ejecutar_worker(app, sock: socket.socket, host: str, puerto: int, indice: int, aviso: int, gracia: float):
+    # Ctrl+C llega a todo el grupo de procesos: quien coordina la detención es el maestro
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    from werkzeug.serving import make_server
+
+    if app is None:
+        from app import create_app
+        app = create_app(servicios=False)
+    else:
+        # Las conexiones del pool se abrieron en el maestro: no se pueden compartir entre procesos
+        from app import db
+        with app.app_context():
+            for motor in db.engines.values():
+                motor.dispose(close=False)
+    from app import difusion, iniciar_servicios
+    estado = app.extensions['salud']
+    estado.despues_del_fork(indice)
+    difusion.despues_del_fork()
+    iniciar_servicios(app)
+
+    servidor = make_server(host, puerto, app, threaded=True, fd=sock.fileno())
+    sock.close()
+
+    def drenar(*_):
+        if not estado.drenando:
+            estado.drenando = True
+            # shutdown espera a que termine serve_forever: tiene que llamarse desde otro hilo
+            threading.Thread(target=servidor.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drenar)
+    os.write(aviso, b'1')
+    os.close(aviso)
+    logger.info('Worker %d listo (pid %d)', indice, os.getpid())
+    servidor.serve_forever()
+    _drenar(app, gracia)
+    logger.info('Worker %d terminado (pid %d)', indice, os.getpid())
+
+
+def _drenar(app, gracia: float):
+    from app import socketio
+    from app.tasks import trabajos_en_curso
+
+    estado = app.extensions['salud']
+    limite = time.monotonic() + gracia
+    # 1. Peticiones HTTP y trabajos de pago en curso
+    while (estado.http_en_curso or trabajos_en_curso()) and time.monotonic() < limite:
+        time.sleep(0.1)
+    if estado.http_en_curso or trabajos_en_curso():
+        logger.warning('Worker %s: se agotó la gracia con %d peticiones y %d trabajos en curso',
+                       estado.worker, estado.http_en_curso, trabajos_en_curso())
+    # 2. Conexiones de Socket.IO: cierre ordenado; el cliente reconecta solo (a otro worker)
+    #    y vuelve a unirse a sus salas en el evento connect
+    if socketio.server is not None:
+        socketio.server.eio.disconnect()
+    limite_socketio = time.monotonic() + 5
+    while estado.socketio_en_curso and time.monotonic() < limite_socketio:
+        time.sleep(0.1)
+    # 3. Lo que sigue en memoria: vistas sin volcar y eventos de auditoría
+    app.extensions['vistas'].volcar()
+    app.extensions['auditoria'].vaciar()
+
+
+# ===== MAESTRO =====
+
+def _abrir_socket(host: str, puerto: int, backlog: int = 1024) -> socket.socket:
+    familia = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(familia, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, puerto))
+    sock.listen(backlog)
+    return sock
+
+
+class Maestro:
+    def __init__(self, host: str, puerto: int, workers: int, precarga: bool = True, gracia: float = 30.0,
+                 arranque_max: float = 60.0):
+        self.host = host
+        self.puerto = puerto
+        self.cantidad = workers
+        self.precarga = precarga
+        self.gracia = gracia
+        self.arranque_max = arranque_max
+        self.app = None
+        self.sock: Optional[socket.socket] = None
+        self.workers: Dict[int, int] = {}  # pid -> índice de worker
+        self.avisos: Dict[int, int] = {}   # pid -> extremo de lectura del aviso de "listo"
+        self.drenando: Set[int] = set()
+        self.deteniendo = False
+        self._senales: List[int] = []
+        self._ultimo_reinicio: Dict[int, float] = {}
+
+    def _senal(self, numero, marco):
+        self._senales.append(numero)
+
+    def ejecutar(self) -> int:
+        self.sock = _abrir_socket(self.host, self.puerto)
+        if self.precarga:
+            from app import create_app
+            self.app = create_app(servicios=False)
+            # Lo que ya existe pasa a la generación permanente: el recolector de los workers no lo
+            # recorre (ni toca sus cabeceras), así esas páginas siguen compartidas con el maestro
+            gc.collect()
+            gc.freeze()
+        for numero in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(numero, self._senal)
+        for indice in range(self.cantidad):
+            self._lanzar(indice)
+        logger.info('Maestro %d: %d workers en %s:%d (precarga=%s)', os.getpid(), self.cantidad,
+                    self.host, self.puerto, self.precarga)
+
+        while True:
+            self._recoger()
+            while self._senales:
+                numero = self._senales.pop(0)
+                if numero in (signal.SIGTERM, signal.SIGINT):
+                    return self._detener()
+                if numero == signal.SIGHUP:
+                    self._recargar()
+            time.sleep(0.2)
+
+    def _lanzar(self, indice: int) -> int:
+        lectura, escritura = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(lectura)
+            codigo = 0
+            try:
+                _ejecutar_worker(self.app, self.sock, self.host, self.puerto, indice, escritura, self.gracia)
+            except BaseException:  # noqa: BLE001
+                logger.exception('Error en el worker %d', indice)
+                codigo = 1
+            finally:
+                logging.shutdown()
+                os._exit(codigo)
+        os.close(escritura)
+        self.workers[pid] = indice
+        self.avisos[pid] = lectura
+        return pid
+
+    def _esperar_listo(self, pid: int, timeout: float) -> bool:
+        # El worker escribe en su pipe cuando ya atiende; si muere antes, la lectura devuelve b''
+        fd = self.avisos.get(pid)
+        if fd is None:
+            return False
+        listos, _, _ = select.select([fd], [], [], timeout)
+        return bool(listos) and os.read(fd, 1) == b'1'
+
+    def _recoger(self):
+        # Procesa los workers que terminaron; uno que no se estaba drenando se reemplaza
+        while True:
+            try:
+                pid, estado = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            indice = self.workers.pop(pid, None)
+            fd = self.avisos.pop(pid, None)
+            if fd is not None:
+                os.close(fd)
+            if pid in self.drenando:
+                self.drenando.discard(pid)
+                continue
+            if indice is None or self.deteniendo:
+                continue
+            logger.warning('Worker %d (pid %d) terminó inesperadamente (estado %d); se reemplaza', indice, pid, estado)
+            # Si falla al arrancar, se espera un poco antes de reintentar para no girar en vacío
+            espera = 1.0 - (time.monotonic() - self._ultimo_reinicio.get(indice, 0.0))
+            if espera > 0:
+                time.sleep(espera)
+            self._ultimo_reinicio[indice] = time.monotonic()
+            self._lanzar(indice)
+
+    def _recargar(self):
+        # Recarga gradual: nunca baja la cantidad de workers listos
+        logger.info('Maestro: recarga gradual de %d workers', len(self.workers))
+        for pid, indice in [(p, i) for p, i in self.workers.items() if p not in self.drenando]:
+            nuevo = self._lanzar(indice)
+            if not self._esperar_listo(nuevo, self.arranque_max):
+                logger.error('El worker nuevo %d (pid %d) no quedó listo: se conservan los actuales', indice, nuevo)
+                os.kill(nuevo, signal.SIGKILL)
+                return
+            self.drenando.add(pid)
+            os.kill(pid, signal.SIGTERM)
+
+    def _detener(self) -> int:
+        logger.info('Maestro: deteniendo %d workers', len(self.workers))
+        self.deteniendo = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        limite = time.monotonic() + self.gracia + 10
+        while self.workers and time.monotonic() < limite:
+            self._recoger()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            logger.warning('Worker pid %d no terminó a tiempo: se fuerza', pid)
+            os.kill(pid, signal.SIGKILL)
+        self.sock.close()
+        return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='Servidor de LVT Inmuebles con varios procesos')
+    parser.add_argument('--host', default=os.environ.get('SERVIDOR_HOST', '0.0.0.0'))
+    parser.add_argument('--puerto', type=int, default=int(os.environ.get('SERVIDOR_PUERTO', '5000')))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SERVIDOR_WORKERS') or os.cpu_count() or 1))
+    parser.add_argument('--gracia', type=float, default=float(os.environ.get('SERVIDOR_GRACIA_S', '30')),
+                        help='segundos para terminar peticiones y pagos en curso al drenar un worker')
+    parser.add_argument('--sin-precarga', action='store_true',
+                        default=os.environ.get('SERVIDOR_PRECARGA', '1') != '1',
+                        help='cada worker importa la app (una recarga toma el código nuevo)')
+    opciones = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] %(name)s: %(message)s')
+
+    if opciones.workers > 1:
+        # Varios procesos: los eventos de Socket.IO y los cubos de límites se comparten por archivo
+        # local, y el navegador usa solo WebSocket (una conexión queda en un único worker)
+        instancia = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+        os.makedirs(instancia, exist_ok=True)
+        os.environ.setdefault('SOCKETIO_MESSAGE_QUEUE', 'sqlite:///' + os.path.join(instancia, 'socketio.db'))
+        os.environ.setdefault('LIMITES_BACKEND', 'sqlite:///' + os.path.join(instancia, 'limites.db'))
+        os.environ.setdefault('SOCKETIO_TRANSPORTES', 'websocket')
+
+    maestro = Maestro(opciones.host, opciones.puerto, opciones.workers, precarga=not opciones.sin_precarga,
+                      gracia=opciones.gracia)
+    return maestro.ejecutar()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
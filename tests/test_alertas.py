@@ -0,0 +1,148 @@
+import time
+
+from app import create_app, db, difusion
+from app.alertas import IndiceBusquedas
+from app.models import AlertaBusqueda, BusquedaGuardada, Propiedad, Usuario
+
+
+def _propiedad(id, titulo, precio, propietario_id=99, descripcion='', direccion=''):
+    return {'id': id, 'titulo': titulo, 'descripcion': descripcion, 'direccion': direccion,
+            'precio': precio, 'propietario_id': propietario_id}
+
+
+def test_indice_por_palabras_y_cubos_de_precio():
+    indice = IndiceBusquedas()
+    indice.agregar(1, 10, 'casa jardín', None, None)
+    indice.agregar(2, 11, 'Córdoba', 100_000, 200_000)
+    indice.agregar(3, 12, '', None, 150_000)
+    indice.agregar(4, 13, '', 1_000_000, None)
+    indice.agregar(5, 99, 'casa', None, None)  # Del propio propietario: no se avisa
+
+    casa = _propiedad(1, 'Casa con jardin', 120_000, direccion='Av. Cordoba 100')
+    assert sorted(indice.coincidencias(casa)) == [(1, 10), (2, 11), (3, 12)]
+    depto = _propiedad(2, 'Depto', 2_000_000, descripcion='Sin jardín, en Córdoba')
+    assert indice.coincidencias(depto) == [(4, 13)]
+    assert indice.coincidencias(_propiedad(3, 'Casa', 150_001, propietario_id=1)) == [(5, 99)]
+
+    indice.quitar(2)
+    indice.agregar(3, 12, 'depto', None, None)  # Reemplaza los criterios anteriores
+    assert sorted(indice.coincidencias(casa)) == [(1, 10)]
+    assert indice.coincidencias(depto) == [(3, 12), (4, 13)]
+    assert len(indice) == 4
+
+
+def test_alerta_en_vivo_y_resumen_por_email(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('LIMITES_ACTIVOS', '1')
+    emitidos = []
+    monkeypatch.setattr(difusion, 'emitir', lambda evento, datos, room, coalescer=False: emitidos.append((room, datos)))
+    app = create_app()
+    alertas = app.extensions['alertas']
+    with app.app_context():
+        for nombre in ('ana', 'dueno'):
+            usuario = Usuario(nombre_usuario=nombre, email=f'{nombre}@x.com')
+            usuario.establecer_password('secreta')
+            db.session.add(usuario)
+        db.session.commit()
+        ana_id = Usuario.query.filter_by(nombre_usuario='ana').one().id
+        dueno_id = Usuario.query.filter_by(nombre_usuario='dueno').one().id
+
+    cliente = app.test_client()
+    cliente.post('/auth/login', data={'email': 'ana@x.com', 'password': 'secreta'})
+    assert cliente.post('/propiedades/busquedas', data={'q': 'jardín', 'precio_max': '200000'}).status_code == 302
+    assert cliente.post('/propiedades/busquedas', data={'q': '', 'precio_min': 'abc'}).status_code == 302
+    assert 'jardín' in cliente.get('/propiedades/busquedas').get_data(as_text=True)
+
+    with app.app_context():
+        db.session.add_all([
+            Propiedad(titulo='Casa con jardin', descripcion='Amplia', precio=150_000, direccion='Calle 1',
+                      metros_cuadrados=80, propietario_id=dueno_id),
+            Propiedad(titulo='Casa con jardin', descripcion='Cara', precio=900_000, direccion='Calle 2',
+                      metros_cuadrados=80, propietario_id=dueno_id),
+        ])
+        db.session.commit()
+
+        # La evaluación corre en un trabajo aparte después del commit
+        limite = time.monotonic() + 5
+        while not AlertaBusqueda.query.count() and time.monotonic() < limite:
+            time.sleep(0.02)
+        alerta = AlertaBusqueda.query.one()
+        assert (alerta.usuario_id, alerta.precio, alerta.lote) == (ana_id, 150_000, None)
+        assert emitidos == [(f'user_{ana_id}', {
+            'mensaje': 'Nueva propiedad para tu búsqueda guardada: Casa con jardin',
+            'propiedad_id': alerta.propiedad_id, 'titulo': 'Casa con jardin', 'precio': 150_000})]
+
+        enviados = []
+
+        class Enviador:
+            def enviar(self, destinatario, asunto, cuerpo):
+                enviados.append((destinatario, asunto, cuerpo))
+
+        alertas.enviador = Enviador()
+        assert alertas.enviar_resumenes() == 1
+        assert enviados[0][0] == 'ana@x.com' and 'Casa con jardin' in enviados[0][2]
+        assert alertas.enviar_resumenes() == 0  # Ya reclamada: no se envía dos veces
+        busqueda_id = alerta.busqueda_id
+
+    assert cliente.post(f'/propiedades/busquedas/{busqueda_id}/eliminar').status_code == 302
+    assert len(alertas.indice) == 0
+    assert alertas.metricas()['coincidencias'] == 1
+
+
+def test_busquedas_de_otro_worker_antes_de_evaluar(tmp_path, monkeypatch):
+    # Dos apps sobre la misma base hacen de dos workers: la búsqueda se guarda y se borra en uno
+    # y las propiedades nuevas se evalúan en el otro
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setattr(difusion, 'emitir', lambda *args, **kwargs: None)
+    worker_a, worker_b = create_app(), create_app()
+    with worker_a.app_context():
+        for nombre in ('ana', 'dueno'):
+            usuario = Usuario(nombre_usuario=nombre, email=f'{nombre}@x.com')
+            usuario.establecer_password('secreta')
+            db.session.add(usuario)
+        db.session.commit()
+        dueno_id = Usuario.query.filter_by(nombre_usuario='dueno').one().id
+    alertas_b = worker_b.extensions['alertas']
+    alertas_b.reconstruir()
+
+    cliente = worker_a.test_client()
+    cliente.post('/auth/login', data={'email': 'ana@x.com', 'password': 'secreta'})
+    cliente.post('/propiedades/busquedas', data={'q': 'quincho'})
+    assert alertas_b.procesar_nuevas([_propiedad(1, 'Casa con quincho', 1000, dueno_id)]) == 1
+    assert len(alertas_b.indice) == 1
+
+    with worker_a.app_context():
+        busqueda_id = BusquedaGuardada.query.one().id
+    cliente.post(f'/propiedades/busquedas/{busqueda_id}/eliminar')
+    assert alertas_b.procesar_nuevas([_propiedad(2, 'Casa con quincho', 1000, dueno_id)]) == 0
+    assert len(alertas_b.indice) == 0
+
+
+def test_precios_no_finitos_no_rompen_las_alertas(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setattr(difusion, 'emitir', lambda *args, **kwargs: None)
+    app = create_app()
+    alertas = app.extensions['alertas']
+    with app.app_context():
+        for nombre in ('ana', 'dueno'):
+            usuario = Usuario(nombre_usuario=nombre, email=f'{nombre}@x.com')
+            usuario.establecer_password('secreta')
+            db.session.add(usuario)
+        db.session.commit()
+        ana_id = Usuario.query.filter_by(nombre_usuario='ana').one().id
+        dueno_id = Usuario.query.filter_by(nombre_usuario='dueno').one().id
+
+    cliente = app.test_client()
+    cliente.post('/auth/login', data={'email': 'ana@x.com', 'password': 'secreta'})
+    for valor in ('inf', 'nan', '1e400', '-inf'):
+        assert cliente.post('/propiedades/busquedas', data={'q': '', 'precio_max': valor}).status_code == 302
+    with app.app_context():
+        assert BusquedaGuardada.query.count() == 0
+        # Una fila inválida guardada antes de la validación se omite sin frenar la reconstrucción
+        db.session.add_all([BusquedaGuardada(usuario_id=ana_id, texto='', precio_max=float('inf')),
+                            BusquedaGuardada(usuario_id=ana_id, texto='quincho')])
+        db.session.commit()
+    alertas.reconstruir()
+    assert alertas.listo and len(alertas.indice) == 1
+    assert alertas.procesar_nuevas([_propiedad(1, 'Casa con quincho', 1e300, dueno_id)]) == 1
+    assert IndiceBusquedas().agregar(1, 1, '', None, float('nan')) is False
@@ -0,0 +1,83 @@
+from click.testing import CliRunner
+from flask.cli import FlaskGroup
+from sqlalchemy import inspect, text
+
+import flask_migrate
+
+from app import REVISION_INICIAL, _registrar_migraciones, create_app, db, obtener_app
+from app.base_datos import esquema_en_head, revisiones_head
+
+
+def test_create_app_omite_create_all_con_esquema_en_head(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    app = create_app()
+    directorio = app.config['MIGRACIONES_DIR']
+    heads = revisiones_head(directorio)
+    assert heads
+
+    with app.app_context():
+        # La base nueva se crea con create_all y queda anotada en la última revisión
+        assert esquema_en_head(db, directorio)
+
+    def _no_llamar(*args, **kwargs):
+        raise AssertionError('create_all no debe ejecutarse con el esquema en head')
+
+    monkeypatch.setattr(db, 'create_all', _no_llamar)
+    create_app()
+
+
+def test_obtener_app_reutiliza_la_app_del_proceso():
+    assert obtener_app() is obtener_app()
+
+
+def test_create_app_sin_servicios_fuera_de_los_puntos_de_entrada(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    assert not create_app().extensions['salud'].servicios_iniciados
+    assert create_app(servicios=True).extensions['salud'].servicios_iniciados
+
+
+def test_flask_run_arranca_completa_y_flask_db_no(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    apps = []
+    cli = FlaskGroup(create_app=lambda: apps.append(create_app()) or apps[-1])
+
+    @cli.command('run')
+    def run():
+        # Como flask run: la app se carga ya dentro del subcomando
+        apps.append(create_app())
+
+    assert CliRunner().invoke(cli, ['db', 'current'], catch_exceptions=False).exit_code == 0
+    with apps[-1].app_context():
+        assert not inspect(db.engine).has_table('propiedad')  # El esquema lo gestionan las migraciones
+    assert not apps[-1].extensions['salud'].servicios_iniciados
+
+    assert CliRunner().invoke(cli, ['run'], catch_exceptions=False).exit_code == 0
+    with apps[-1].app_context():
+        assert inspect(db.engine).has_table('propiedad')
+    assert apps[-1].extensions['salud'].servicios_iniciados
+
+
+def test_base_sin_versionar_se_actualiza_al_arrancar(tmp_path, monkeypatch):
+    # Base creada con create_all antes de las migraciones: el esquema inicial, sin alembic_version
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    app = create_app(servicios=False)
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(text('DROP TABLE alembic_version'))
+        db.session.commit()
+    _registrar_migraciones(app)
+    with app.app_context():
+        flask_migrate.upgrade(directory=app.config['MIGRACIONES_DIR'], revision=REVISION_INICIAL)
+        db.session.execute(text('DROP TABLE alembic_version'))
+        db.session.execute(text("INSERT INTO usuario (nombre_usuario, email, password_hash, es_administrador, activo) "
+                                "VALUES ('ana', 'ana@x.com', '-', 0, 1)"))
+        db.session.execute(text("INSERT INTO propiedad (titulo, descripcion, precio, direccion, metros_cuadrados, "
+                                "habitaciones, banos, estacionamientos, vendida, fecha_creacion, propietario_id) "
+                                "VALUES ('Casa vieja', '-', 1, '-', 1, 0, 0, 0, 0, '2024-01-01', 1)"))
+        db.session.commit()
+
+    app = create_app()
+    with app.app_context():
+        assert esquema_en_head(db, app.config['MIGRACIONES_DIR'])
+    html = app.test_client().get('/propiedades/').get_data(as_text=True)
+    assert 'Casa vieja' in html
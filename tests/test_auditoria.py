@@ -0,0 +1,123 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app import auditoria, create_app, db
+from app.auditoria import RegistroAuditoria
+from app.models import EventoAuditoria, Usuario
+
+
+def _usuario(nombre, admin=False):
+    usuario = Usuario(nombre_usuario=nombre, email=f'{nombre}@x.com', es_administrador=admin)
+    usuario.establecer_password('secreta')
+    db.session.add(usuario)
+    return usuario
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    return create_app()
+
+
+def test_desborde_a_archivo_y_reingreso(app, tmp_path):
+    registro = RegistroAuditoria(capacidad=5, lote=3, intervalo=10, desborde='archivo',
+                                 archivo=str(tmp_path / 'desborde.jsonl'))
+    archivo = tmp_path / f'desborde.{os.getpid()}.jsonl'  # Uno por proceso
+    # Sin app todavía no arranca el escritor: la cola se llena y el resto va al archivo
+    for i in range(8):
+        registro.registrar('prueba.evento', objetivo_tipo='prueba', objetivo_id=i, indice=i)
+    assert registro.metricas()['desbordados'] == 3
+    assert len(archivo.read_text().splitlines()) == 3
+
+    registro.app = app
+    assert registro.vaciar()
+    metricas = registro.metricas()
+    assert (metricas['escritos'], metricas['reingresados'], metricas['en_cola']) == (8, 3, 0)
+    assert not archivo.exists()
+    with app.app_context():
+        filas = EventoAuditoria.query.order_by(EventoAuditoria.objetivo_id).all()
+        assert [f.objetivo_id for f in filas] == list(range(8))
+        assert filas[7].detalles == {'indice': 7}
+
+        # Solo inserción
+        filas[0].accion = 'otra'
+        with pytest.raises(ValueError):
+            db.session.commit()
+        db.session.rollback()
+    registro.detener()
+
+
+def test_reingreso_tolera_lineas_truncadas_y_toma_archivos_de_procesos_terminados(app, tmp_path):
+    proceso = subprocess.Popen([sys.executable, '-c', ''])
+    proceso.wait()
+    terminado = proceso.pid
+    (tmp_path / f'desborde.{terminado}.jsonl').write_text(
+        '{"fecha": "2024-01-01T00:00:00", "accion": "prueba.huerfano", "actor_id": null, '
+        '"objetivo_tipo": null, "objetivo_id": null, "detalles": null}\n{"fecha": "2024-01-0')
+    (tmp_path / 'desborde.1.jsonl').write_text('')  # pid 1 sigue vivo: no es de este proceso
+    registro = RegistroAuditoria(intervalo=10, desborde='archivo', archivo=str(tmp_path / 'desborde.jsonl'))
+    registro.app = app
+    registro.registrar('prueba.evento')
+    assert registro.vaciar()
+    metricas = registro.metricas()
+    assert (metricas['escritos'], metricas['reingresados'], metricas['descartados']) == (2, 1, 1)
+    assert sorted(p.name for p in tmp_path.glob('desborde.*')) == ['desborde.1.jsonl']
+
+    # Un error al reingresar no detiene al escritor
+    registro._reingresar_desborde = lambda: 1 / 0
+    registro.registrar('prueba.otro')
+    assert registro.vaciar()
+    assert registro.metricas()['escritos'] == 3 and registro._hilo.is_alive()
+    registro.detener()
+
+
+def test_descartar_cuenta_los_eventos_perdidos():
+    registro = RegistroAuditoria(capacidad=2, desborde='descartar')
+    for _ in range(5):
+        registro.registrar('prueba.evento')
+    assert registro.metricas()['descartados'] == 3
+
+
+def test_acciones_admin_quedan_auditadas(app):
+    with app.app_context():
+        admin, otro = _usuario('admin', admin=True), _usuario('otro')
+        db.session.commit()
+        otro_id = otro.id
+
+    cliente = app.test_client()
+    cliente.post('/auth/login', data={'email': 'admin@x.com', 'password': 'secreta'})
+    cliente.post(f'/auth/admin/usuario/{otro_id}/toggle_estado')
+    cliente.post(f'/auth/admin/usuario/{otro_id}/toggle_admin')
+    assert app.extensions['auditoria'].vaciar()
+
+    with app.app_context():
+        acciones = [e.accion for e in EventoAuditoria.query.filter_by(objetivo_tipo='usuario', objetivo_id=otro_id)
+                    .order_by(EventoAuditoria.id)]
+        assert acciones == ['usuario.toggle_estado', 'usuario.toggle_admin']
+
+    html = cliente.get('/auth/admin/auditoria?accion=usuario.toggle_admin').get_data(as_text=True)
+    assert 'usuario.toggle_admin' in html and 'usuario.toggle_estado' not in html
+
+
+def test_registro_propio_de_cada_app(tmp_path, monkeypatch):
+    # Cada app escribe sus eventos en su propia base y con su propia configuración
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'a.db'}")
+    app_a = create_app()
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'b.db'}")
+    monkeypatch.setenv('AUDITORIA_LOTE', '7')
+    app_b = create_app()
+    assert app_a.extensions['auditoria'] is not app_b.extensions['auditoria']
+    assert app_b.extensions['auditoria'].lote == 7
+
+    with app_a.app_context():
+        auditoria.registrar('prueba.a')
+        assert auditoria.vaciar()
+    with app_b.app_context():
+        auditoria.registrar('prueba.b')
+        assert auditoria.vaciar()
+        assert [e.accion for e in EventoAuditoria.query] == ['prueba.b']
+    with app_a.app_context():
+        assert [e.accion for e in EventoAuditoria.query] == ['prueba.a']
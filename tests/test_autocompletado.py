@@ -0,0 +1,74 @@
+from sqlalchemy import event
+
+from app import create_app, db
+from app.autocompletado import IndicePrefijos
+from app.models import Usuario, Propiedad
+
+
+def test_indice_por_prefijo_sin_tildes_y_por_frecuencia():
+    indice = IndicePrefijos()
+    indice.actualizar(1, 'Casa luminosa', 'Av. Córdoba 1234, Córdoba')
+    indice.actualizar(2, 'Casa con jardín', 'Calle Corrientes 50, Rosario')
+    indice.actualizar(3, 'Depto', 'Av. Córdoba 900, Buenos Aires')
+
+    assert indice.sugerir('cor') == [('Córdoba', 2), ('Corrientes', 1)]
+    assert indice.sugerir('CÓR') == indice.sugerir('cor')
+    assert indice.sugerir('ca')[0] == ('Casa', 2)
+    assert indice.sugerir('12') == []  # Los números no se indexan
+
+    indice.actualizar(3, 'Depto', 'Calle Mitre 10, Rosario')
+    assert indice.sugerir('cor') == [('Córdoba', 1), ('Corrientes', 1)]  # Empates en orden alfabético
+    indice.eliminar(1)
+    indice.eliminar(2)
+    assert indice.sugerir('cor') == []
+    assert indice.sugerir('ro') == [('Rosario', 1)]
+
+
+def test_endpoint_de_sugerencias_sin_consultar_la_base(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('LIMITES_ACTIVOS', '1')
+    app = create_app()
+    autocompletado = app.extensions['autocompletado']
+    with app.app_context():
+        usuario = Usuario(nombre_usuario='ana', email='ana@x.com')
+        usuario.establecer_password('secreta')
+        db.session.add(usuario)
+        db.session.flush()
+        db.session.add(Propiedad(titulo='Casa', descripcion='Desc', precio=1.0, direccion='Av. Córdoba 1',
+                                 metros_cuadrados=50, propietario_id=usuario.id))
+        db.session.commit()
+        autocompletado.reconstruir()
+        assert autocompletado.listo
+
+        # Los cambios confirmados se aplican al índice sin reconstruirlo
+        nueva = Propiedad(titulo='Quinta', descripcion='Desc', precio=1.0, direccion='Calle Corrientes 5',
+                          metros_cuadrados=50, propietario_id=usuario.id)
+        db.session.add(nueva)
+        db.session.commit()
+        assert [s['texto'] for s in autocompletado.sugerir('av cor')] == ['av Córdoba', 'av Corrientes']
+
+        # Un rollback no llega al índice
+        nueva.titulo = 'Chacra'
+        db.session.flush()
+        db.session.rollback()
+        assert autocompletado.sugerir('chac') == []
+
+        db.session.delete(db.session.get(Propiedad, nueva.id))
+        db.session.commit()
+        motor = db.engine
+
+    consultas = []
+    event.listen(motor, 'before_cursor_execute', lambda *args: consultas.append(args[2]))
+    respuesta = app.test_client().get('/propiedades/sugerencias?q=Cor')
+    assert respuesta.get_json() == {'sugerencias': [{'texto': 'Córdoba', 'cantidad': 1}], 'listo': True}
+    assert consultas == []
+
+    # Con sesión iniciada el cubo por usuario sale de la cookie: tampoco se carga el usuario
+    cliente = app.test_client()
+    cliente.post('/auth/login', data={'email': 'ana@x.com', 'password': 'secreta'})
+    consultas.clear()
+    respuesta = cliente.get('/propiedades/sugerencias?q=Cor')
+    assert respuesta.get_json()['sugerencias'] == [{'texto': 'Córdoba', 'cantidad': 1}]
+    assert consultas == []
+    assert any(clave.startswith('sugerencias:usuario:') for _, cubos in
+               app.extensions['limites'].almacen._fragmentos for clave in cubos)
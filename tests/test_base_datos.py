@@ -0,0 +1,57 @@
+import sqlite3
+
+from sqlalchemy import text
+
+from app import create_app, db
+from app.base_datos import usar_replica
+from app.models import Usuario, Propiedad
+
+
+def _nueva_propiedad(propietario_id, titulo='Casa'):
+    return Propiedad(titulo=titulo, descripcion='Desc', precio=100.0, direccion='Calle 1',
+                     metros_cuadrados=50, propietario_id=propietario_id)
+
+
+def test_lecturas_get_van_a_la_replica(tmp_path, monkeypatch):
+    primaria = tmp_path / 'primaria.db'
+    replica = tmp_path / 'replica.db'
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{primaria}')
+    monkeypatch.delenv('DATABASE_REPLICA_URL', raising=False)
+
+    app = create_app()
+    with app.app_context():
+        usuario = Usuario(nombre_usuario='ana', email='ana@x.com')
+        usuario.establecer_password('secreta')
+        db.session.add(usuario)
+        db.session.commit()
+        db.engine.dispose()
+
+    # La réplica es una copia instantánea de la primaria
+    with sqlite3.connect(primaria) as origen, sqlite3.connect(replica) as destino:
+        origen.backup(destino)
+
+    monkeypatch.setenv('DATABASE_REPLICA_URL', f'sqlite:///{replica}')
+    app = create_app()
+    with app.app_context():
+        assert db.session.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        propiedad = _nueva_propiedad(Usuario.query.filter_by(email='ana@x.com').one().id)
+        db.session.add(propiedad)
+        db.session.commit()
+        nueva_id = propiedad.id
+        with usar_replica():
+            assert Propiedad.query.count() == 0
+        assert Propiedad.query.count() == 1
+
+    cliente = app.test_client()
+    # Una petición GET anónima lee de la réplica, que todavía no tiene la propiedad
+    assert cliente.get(f'/propiedades/{nueva_id}').status_code == 404
+
+    # Tras escribir, el mismo cliente lee de la primaria (lectura de lo propio)
+    cliente.post('/auth/login', data={'email': 'ana@x.com', 'password': 'secreta'})
+    resp = cliente.post('/propiedades/crear', data={
+        'titulo': 'Depto', 'descripcion': 'Desc', 'precio': '10', 'direccion': 'Calle 2',
+        'metros_cuadrados': '40',
+    })
+    assert resp.status_code == 302
+    assert cliente.get(resp.location).status_code == 200
+    assert cliente.get(f'/propiedades/{nueva_id}').status_code == 200
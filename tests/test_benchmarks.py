@@ -0,0 +1,32 @@
+import pytest
+
+from benchmarks.comparar import comparar
+from benchmarks.datos_sinteticos import generar_dataset
+from benchmarks.suite import ejecutar_suite
+
+
+def test_suite_con_dataset_minimo(tmp_path, monkeypatch):
+    # ejecutar_suite modifica el entorno; monkeypatch lo restaura al terminar
+    monkeypatch.setenv('DATABASE_URL', '')
+    monkeypatch.setenv('PAGO_DEMORA_SEGUNDOS', '0')
+    informe = ejecutar_suite(
+        str(tmp_path / 'bench.db'),
+        usuarios=10, propiedades=50, pagos=10,
+        repeticiones=2, pagos_flujo=1, hilos=2, peticiones_concurrentes=4,
+    )
+    assert informe['dataset']['propiedades'] == 50
+    for nombre in ('listar_pagina_1', 'listar_busqueda_profunda', 'detalle', 'login',
+                   'flujo_pago', 'estadisticas', 'concurrente_listar'):
+        assert informe['resultados'][nombre]['errores'] == 0
+
+    filas, hubo_regresion = comparar(informe, informe)
+    assert filas and not hubo_regresion
+
+
+def test_generar_dataset_rechaza_una_base_con_datos(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'bench.db'}")
+    from app import create_app
+    app = create_app()
+    assert generar_dataset(app, usuarios=3, propiedades=5, pagos=2)['propiedades'] == 5
+    with pytest.raises(ValueError, match='--reutilizar'):
+        generar_dataset(app, usuarios=3, propiedades=5, pagos=2)
@@ -0,0 +1,43 @@
+from jinja2 import Environment
+
+from app.cache_fragmentos import CacheLRU, ExtensionCacheFragmentos
+
+
+def _entorno():
+    entorno = Environment(extensions=[ExtensionCacheFragmentos], autoescape=True)
+    entorno.cache_fragmentos = CacheLRU(max_entradas=2)
+    return entorno
+
+
+def test_fragmento_se_reutiliza_hasta_cambiar_la_version():
+    entorno = _entorno()
+    llamadas = []
+
+    def precio(valor):
+        llamadas.append(valor)
+        return f'$ {valor:,.0f}'
+
+    plantilla = entorno.from_string(
+        "{% cache 'tarjeta', p.id, p.version %}<b>{{ precio(p.precio) }}</b>{% endcache %}"
+        "{% if propio %}<a>editar</a>{% endif %}"
+    )
+    p = {'id': 1, 'version': 1, 'precio': 1000}
+    assert plantilla.render(p=p, precio=precio, propio=False) == '<b>$ 1,000</b>'
+    assert plantilla.render(p=p, precio=precio, propio=True) == '<b>$ 1,000</b><a>editar</a>'
+    assert llamadas == [1000]
+
+    p = dict(p, version=2, precio=2000)
+    assert plantilla.render(p=p, precio=precio, propio=False) == '<b>$ 2,000</b>'
+    metricas = entorno.cache_fragmentos.metricas()
+    assert (metricas['aciertos'], metricas['fallos']) == (1, 2)
+
+
+def test_cache_lru_acotada():
+    cache = CacheLRU(max_entradas=2)
+    cache.guardar('a', '1')
+    cache.guardar('b', '2')
+    cache.obtener('a')
+    cache.guardar('c', '3')
+    assert cache.obtener('b') is None
+    assert cache.obtener('a') == '1'
+    assert cache.metricas()['expulsiones'] == 1
@@ -0,0 +1,60 @@
+import gzip
+import zlib
+
+from flask import Response
+
+from app import create_app
+from app.compresion import elegir_codificacion, minificar_html
+
+
+def test_minificado_conserva_lineas_pre_y_textarea():
+    fuente = '<div>\n    <p>Hola</p>   \n\t<pre>\n  a\n    b\n</pre>\n  <TEXTAREA>\n  x\n</TEXTAREA>\n</div>'
+    minificado = minificar_html(fuente)
+    assert minificado == '<div>\n<p>Hola</p>\n<pre>\n  a\n    b\n</pre>\n<TEXTAREA>\n  x\n</TEXTAREA>\n</div>'
+    assert minificado.count('\n') == fuente.count('\n')
+
+
+def test_negociacion_de_codificacion():
+    assert elegir_codificacion('gzip, deflate, br', ('br', 'gzip')) == 'br'
+    assert elegir_codificacion('gzip, deflate, br', ('gzip',)) == 'gzip'
+    assert elegir_codificacion('br;q=0, gzip;q=0.5', ('br', 'gzip')) == 'gzip'
+    assert elegir_codificacion('*', ('gzip',)) == 'gzip'
+    assert elegir_codificacion('gzip;q=0', ('gzip',)) is None
+    assert elegir_codificacion('', ('gzip',)) is None
+
+
+def test_respuestas_comprimidas_y_en_streaming(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    app = create_app()
+
+    @app.route('/prueba-streaming')
+    def prueba_streaming():
+        return Response((f'<p>fila {i}</p>\n' * 50 for i in range(20)), mimetype='text/html')
+
+    cliente = app.test_client()
+    plano = cliente.get('/auth/login')
+    assert 'Content-Encoding' not in plano.headers
+
+    comprimido = cliente.get('/auth/login', headers={'Accept-Encoding': 'gzip'})
+    assert comprimido.headers['Content-Encoding'] == 'gzip'
+    assert comprimido.headers['Vary'] == 'Cookie, Accept-Encoding'  # Se conserva el Vary de la sesión
+    assert gzip.decompress(comprimido.data) == plano.data
+    assert len(comprimido.data) * 2 < len(plano.data)
+
+    # Debajo del mínimo no vale la pena comprimir
+    pequeno = cliente.get('/propiedades/sugerencias?q=ca', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in pequeno.headers and pequeno.is_json
+
+    # Cada fragmento se comprime y se envía a medida que la vista lo produce
+    streaming = cliente.get('/prueba-streaming', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    fragmentos = list(streaming.response)
+    streaming.close()
+    assert len(fragmentos) > 2
+    descompresor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    primero = descompresor.decompress(fragmentos[0])
+    assert primero.startswith(b'<p>fila 0</p>')  # Legible sin esperar al final de la respuesta
+    texto = primero + b''.join(descompresor.decompress(f) for f in fragmentos[1:])
+    assert texto == b''.join(f'<p>fila {i}</p>\n'.encode() * 50 for i in range(20))
+
+    metricas = app.extensions['compresion'].metricas()
+    assert metricas['comprimidas'] == 2 and metricas['bytes_enviados'] < metricas['bytes_originales']
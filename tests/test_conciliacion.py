@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, text
+
+from app import create_app, db
+from app.models import BloqueoTarea, Pago, Propiedad, Usuario
+
+
+def _usuario(nombre):
+    usuario = Usuario(nombre_usuario=nombre, email=f'{nombre}@x.com')
+    usuario.establecer_password('secreta')
+    db.session.add(usuario)
+    return usuario
+
+
+def _propiedad(titulo, propietario, vendida=False):
+    propiedad = Propiedad(titulo=titulo, descripcion='-', precio=100.0, direccion='-', propietario_id=propietario.id,
+                          vendida=vendida)
+    db.session.add(propiedad)
+    return propiedad
+
+
+def test_conciliacion_en_lotes_y_verificacion_sin_escrituras(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('CONCILIACION_INTERVALO_S', '0')
+    app = create_app()
+    with app.app_context():
+        vendedor, comprador = _usuario('vende'), _usuario('compra')
+        db.session.flush()
+        sin_marcar = _propiedad('Sin marcar', vendedor)
+        sin_pago = _propiedad('Sin pago', vendedor, vendida=True)
+        duplicada = _propiedad('Duplicada', vendedor, vendida=True)
+        libre = _propiedad('Libre', vendedor)
+        db.session.flush()
+        viejo = datetime.utcnow() - timedelta(hours=2)
+        db.session.add_all([
+            Pago(monto=100.0, estado='pagado', usuario_id=comprador.id, propiedad_id=sin_marcar.id),
+            Pago(monto=100.0, estado='pagado', usuario_id=comprador.id, propiedad_id=duplicada.id),
+            Pago(monto=100.0, estado='pagado', usuario_id=comprador.id, propiedad_id=duplicada.id),
+            Pago(monto=100.0, estado='procesando', usuario_id=comprador.id, propiedad_id=libre.id,
+                 fecha_creacion=viejo),
+            Pago(monto=100.0, estado='procesando', usuario_id=comprador.id, propiedad_id=libre.id),
+        ])
+        db.session.commit()
+        ids = {p.titulo: p.id for p in Propiedad.query}
+        motor = db.engine
+
+    # La verificación de disponibilidad es una sola lectura y ya no corrige nada
+    sentencias = []
+    event.listen(motor, 'before_cursor_execute', lambda *args: sentencias.append(args[2]))
+    cliente = app.test_client()
+    cliente.post('/auth/login', data={'email': 'compra@x.com', 'password': 'secreta'})
+    sentencias.clear()
+    respuesta = cliente.get(f"/pago/pagar/{ids['Sin marcar']}")
+    assert respuesta.status_code == 302 and f"/propiedades/{ids['Sin marcar']}" in respuesta.location
+    propias = [s for s in sentencias if 'FROM propiedad' in s or s.startswith(('INSERT', 'UPDATE'))]
+    assert len(propias) == 1 and propias[0].startswith('SELECT') and 'EXISTS' in propias[0]
+    assert cliente.get(f"/pago/pagar/{ids['Libre']}").status_code == 200
+
+    conciliacion = app.extensions['conciliacion']
+    with app.app_context():
+        simulado = conciliacion.ejecutar(aplicar=False)
+        assert (simulado['pagos_expirados'], simulado['propiedades_vendidas'],
+                simulado['vendidas_sin_pago'], simulado['ventas_duplicadas']) == (1, 1, 1, 1)
+        assert not db.session.get(Propiedad, ids['Sin marcar']).vendida
+
+        sentencias.clear()
+        informe = conciliacion.ejecutar(lote=1)  # Una fila por transacción
+        # Cada sentencia lee a lo sumo un lote: propiedades por rango fijo de id, pagos por el índice (estado, fecha)
+        rangos = [s for s in sentencias if s.startswith('SELECT propiedad.id, propiedad.vendida')]
+        assert len(rangos) == 4 and all('propiedad.id <= ' in s for s in rangos)
+        plan = ' '.join(str(fila) for fila in db.session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM pago WHERE estado = 'procesando' AND fecha_creacion < '2100-01-01' "
+            "ORDER BY fecha_creacion, id LIMIT 1")))
+        assert 'ix_pago_estado_fecha' in plan and 'TEMP B-TREE' not in plan
+        assert (informe['pagos_expirados'], informe['propiedades_vendidas']) == (1, 1)
+        assert informe['muestras']['vendidas_sin_pago'] == [ids['Sin pago']]
+        assert informe['muestras']['ventas_duplicadas'] == [ids['Duplicada']]
+        assert informe['lotes'] == 4
+        db.session.expire_all()
+        assert db.session.get(Propiedad, ids['Sin marcar']).vendida
+        assert sorted(p.estado for p in Pago.query.filter_by(propiedad_id=ids['Libre'])) == ['expirado', 'procesando']
+        # El contador desnormalizado del vendedor se actualizó con la corrección
+        assert Usuario.query.filter_by(nombre_usuario='vende').one().propiedades_vendidas == 3
+
+    resultado = app.test_cli_runner().invoke(args=['conciliar-pagos'])
+    assert resultado.exit_code == 0
+    assert 'Expirados 0 pagos en proceso; 0 propiedades marcadas' in resultado.output
+    assert '1 vendidas sin pago, 1 con más de un pago' in resultado.output
+
+
+def test_una_sola_conciliacion_a_la_vez(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('CONCILIACION_INTERVALO_S', '0')
+    app = create_app()
+    conciliacion = app.extensions['conciliacion']
+    with app.app_context():
+        vendedor, comprador = _usuario('vende'), _usuario('compra')
+        db.session.flush()
+        propiedad = _propiedad('Sin marcar', vendedor)
+        db.session.flush()
+        db.session.add(Pago(monto=100.0, estado='pagado', usuario_id=comprador.id, propiedad_id=propiedad.id))
+        # Otro proceso (p. ej. el worker 0 que drena durante una recarga) tiene el bloqueo vigente
+        db.session.add(BloqueoTarea(nombre='conciliacion', duenio='otro',
+                                    vence=datetime.utcnow() + timedelta(minutes=5)))
+        db.session.commit()
+        propiedad_id = propiedad.id
+
+        informe = conciliacion.ejecutar()
+        assert informe['omitida'] and informe['propiedades_vendidas'] == 0
+        assert not db.session.get(Propiedad, propiedad_id).vendida
+        # La simulación no escribe, así que no necesita el bloqueo
+        assert conciliacion.ejecutar(aplicar=False)['propiedades_vendidas'] == 1
+
+    resultado = app.test_cli_runner().invoke(args=['conciliar-pagos'])
+    assert resultado.exit_code == 0 and 'Otro proceso está conciliando' in resultado.output
+
+    with app.app_context():
+        # Un bloqueo vencido (su dueño murió sin soltarlo) se puede tomar, y al terminar se suelta
+        db.session.get(BloqueoTarea, 'conciliacion').vence = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        informe = conciliacion.ejecutar()
+        assert 'omitida' not in informe and informe['propiedades_vendidas'] == 1
+        db.session.expire_all()
+        assert db.session.get(Propiedad, propiedad_id).vendida
+        assert BloqueoTarea.query.count() == 0
@@ -0,0 +1,64 @@
+from app import create_app, db
+from app.models import Usuario, Propiedad, Pago, recalcular_contadores
+from app.tasks import _procesar_pago
+
+
+def _usuario(nombre):
+    usuario = Usuario(nombre_usuario=nombre, email=f'{nombre}@x.com')
+    usuario.establecer_password('secreta')
+    db.session.add(usuario)
+    return usuario
+
+
+def _resumen(usuario_id):
+    db.session.expire_all()
+    return db.session.get(Usuario, usuario_id).resumen()
+
+
+def test_contadores_siguen_altas_ventas_y_bajas(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('PAGO_DEMORA_SEGUNDOS', '0')
+    app = create_app()
+    with app.app_context():
+        vendedor, comprador = _usuario('vende'), _usuario('compra')
+        db.session.flush()
+        propiedades = [Propiedad(titulo=f'Casa {i}', descripcion='Desc', precio=100.0 * (i + 1),
+                                 direccion='Calle 1', metros_cuadrados=50, propietario_id=vendedor.id)
+                       for i in range(3)]
+        db.session.add_all(propiedades)
+        db.session.commit()
+        assert _resumen(vendedor.id)['propiedades'] == 3
+
+        pago = Pago(monto=200.0, estado='procesando', usuario_id=comprador.id, propiedad_id=propiedades[1].id)
+        db.session.add(pago)
+        db.session.commit()
+        assert _resumen(comprador.id)['pagos_realizados'] == 0
+
+        # Venta por el camino real: hilo de procesamiento con su propia sesión
+        assert _procesar_pago(pago.id)['exito']
+        assert _resumen(vendedor.id)['propiedades_vendidas'] == 1
+        assert _resumen(comprador.id) == {'propiedades': 0, 'propiedades_vendidas': 0,
+                                          'pagos_realizados': 1, 'monto_pagado': 200.0}
+
+        # Cambio sobre un objeto expirado tras el commit: se descuenta el valor anterior
+        pago = db.session.get(Pago, pago.id)
+        db.session.expire(pago)
+        pago.estado = 'reembolsado'
+        db.session.commit()
+        assert _resumen(comprador.id)['pagos_realizados'] == 0
+        pago.estado = 'pagado'
+        db.session.commit()
+
+        # Eliminación con borrado masivo de pagos
+        Pago.eliminar_de_propiedad(propiedades[1].id)
+        db.session.delete(db.session.get(Propiedad, propiedades[1].id))
+        db.session.commit()
+        esperado_vendedor = _resumen(vendedor.id)
+        esperado_comprador = _resumen(comprador.id)
+        assert esperado_vendedor['propiedades'] == 2 and esperado_vendedor['propiedades_vendidas'] == 0
+        assert esperado_comprador['pagos_realizados'] == 0 and esperado_comprador['monto_pagado'] == 0
+
+        # El recálculo masivo coincide con lo mantenido por los eventos
+        assert recalcular_contadores(lote=1) == 2
+        assert _resumen(vendedor.id) == esperado_vendedor
+        assert _resumen(comprador.id) == esperado_comprador
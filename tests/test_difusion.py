@@ -0,0 +1,103 @@
+import socketio as python_socketio
+
+from app import socketio
+from app.difusion import Difusor, GestorSQLite
+
+
+def test_broker_sqlite_entre_gestores(tmp_path):
+    # Dos gestores sobre el mismo archivo simulan dos procesos web
+    url = 'sqlite:///' + str(tmp_path / 'broker.db')
+    emisor = GestorSQLite(url)
+    receptor = GestorSQLite(url)
+
+    for i in range(3):
+        emisor._publish({'method': 'emit', 'event': 'aviso', 'data': [i], 'room': 'user_1'})
+
+    mensajes = receptor._listen()
+    recibidos = [next(mensajes) for _ in range(3)]
+    assert [m['data'] for m in recibidos] == [[0], [1], [2]]
+    assert receptor.metricas()['recibidos'] == 3
+    assert receptor.metricas()['perdidos'] == 0
+
+    # Los callbacks llevan el host_id del destino: la secuencia se sigue por el emisor, sin huecos falsos
+    emisor._publish({'method': 'callback', 'host_id': receptor.host_id, 'sid': 'x', 'namespace': '/',
+                     'id': 1, 'args': []})
+    emisor._publish({'method': 'emit', 'event': 'aviso', 'data': [3], 'room': 'user_1'})
+    assert [next(mensajes)['method'] for _ in range(2)] == ['callback', 'emit']
+    assert receptor.metricas()['recibidos'] == 5
+    assert receptor.metricas()['perdidos'] == 0
+
+
+def test_escucha_desde_la_primera_conexion(tmp_path):
+    # Lo publicado entre la creación del gestor y su primera conexión no se reenvía
+    url = 'sqlite:///' + str(tmp_path / 'broker.db')
+    emisor = GestorSQLite(url)
+    receptor = GestorSQLite(url, write_only=True)  # Sin hilo de escucha: se lee a mano
+    python_socketio.Server(client_manager=receptor)
+    emisor._publish({'method': 'emit', 'event': 'viejo', 'data': [], 'room': 'user_1'})
+
+    receptor.initialize()
+    emisor._publish({'method': 'emit', 'event': 'nuevo', 'data': [], 'room': 'user_1'})
+    assert next(receptor._listen())['event'] == 'nuevo'
+
+
+def test_difusor_coalesce_por_sala(monkeypatch):
+    emitidos = []
+    monkeypatch.setattr(socketio, 'emit', lambda evento, datos, room: emitidos.append((evento, datos, room)))
+    monkeypatch.setattr(socketio, 'start_background_task', lambda *args, **kwargs: None)
+
+    difusor = Difusor()
+    for precio in (100, 200, 300):
+        difusor.emitir('precio', {'precio': precio}, room='propiedad_1', coalescer=True)
+    difusor.emitir('aviso', {'n': 1}, room='user_1')
+    difusor.emitir('aviso', {'n': 2}, room='user_1')
+
+    assert difusor.vaciar() == 3
+    assert ('precio', {'precio': 300}, 'propiedad_1') in emitidos
+    assert [d['n'] for e, d, r in emitidos if e == 'aviso'] == [1, 2]
+    assert difusor.metricas()['coalescidos'] == 2
+
+
+def test_ventas_y_precios_en_vivo_por_sala_de_propiedad(tmp_path, monkeypatch):
+    import time
+
+    from app import create_app, db
+    from app.models import Propiedad, Usuario
+
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    app = create_app()
+    with app.app_context():
+        usuario = Usuario(nombre_usuario='ana', email='ana@x.com')
+        usuario.establecer_password('secreta')
+        db.session.add(usuario)
+        db.session.flush()
+        propiedades = [Propiedad(titulo=f'Casa {i}', descripcion='Desc', precio=100.0, direccion='Calle 1',
+                                 metros_cuadrados=50, propietario_id=usuario.id) for i in range(2)]
+        db.session.add_all(propiedades)
+        db.session.commit()
+        seguida, otra = [p.id for p in propiedades]
+
+    espectador = socketio.test_client(app)
+    espectador.emit('seguir_propiedades', {'ids': [seguida, 'x']})
+    with app.app_context():
+        propiedad = db.session.get(Propiedad, seguida)
+        propiedad.titulo = 'Casa renovada'  # Sin cambios de precio ni estado: no se emite
+        db.session.commit()
+        for precio in (120.0, 130.0):
+            propiedad.precio = precio
+            db.session.commit()
+        propiedad.vendida = True
+        db.session.commit()
+        db.session.get(Propiedad, otra).precio = 1.0  # Otra sala
+        db.session.commit()
+
+    final = {'id': seguida, 'precio': 130.0, 'vendida': True}
+    limite = time.monotonic() + 2
+    recibidos = []
+    while final not in recibidos and time.monotonic() < limite:
+        time.sleep(0.05)
+        recibidos += [m['args'][0] for m in espectador.get_received() if m['name'] == 'propiedad_actualizada']
+    # Los cambios de la misma sala dentro de la ventana se agrupan: llega el estado final
+    assert recibidos[-1] == final
+    assert all(d['id'] == seguida and d['precio'] != 100.0 for d in recibidos)
+    espectador.disconnect()
@@ -0,0 +1,57 @@
+import re
+from datetime import datetime, timedelta
+
+from app import create_app, db
+from app.models import Usuario, Propiedad, Pago
+
+
+def _usuario(nombre):
+    usuario = Usuario(nombre_usuario=nombre, email=f'{nombre}@x.com')
+    usuario.establecer_password('secreta')
+    db.session.add(usuario)
+    return usuario
+
+
+def _ids_de_paginas(cliente, url):
+    ids, paginas = [], 0
+    while url:
+        html = cliente.get(url).get_data(as_text=True)
+        ids += [int(i) for i in re.findall(r'<td>(\d+)</td>', html)]
+        siguiente = re.search(r'href="([^"]*despues=[^"]*)">Anteriores', html)
+        url = siguiente.group(1).replace('&amp;', '&') if siguiente else None
+        paginas += 1
+    return ids, paginas
+
+
+def test_historiales_paginados_por_clave(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    app = create_app()
+    with app.app_context():
+        vendedor, comprador, otro = _usuario('vende'), _usuario('compra'), _usuario('otro')
+        db.session.flush()
+        propiedad = Propiedad(titulo='Casa', descripcion='Desc', precio=100.0, direccion='Calle 1',
+                              metros_cuadrados=50, propietario_id=vendedor.id)
+        db.session.add(propiedad)
+        db.session.flush()
+        # Varias filas comparten fecha para ejercitar el desempate por id
+        base = datetime(2024, 1, 1)
+        db.session.add_all([
+            Pago(monto=100.0, estado='fallido', usuario_id=comprador.id, propiedad_id=propiedad.id,
+                 fecha_creacion=base + timedelta(minutes=i // 3))
+            for i in range(45)
+        ])
+        db.session.commit()
+        propiedad_id = propiedad.id
+        esperados = [p.id for p in Pago.query.order_by(Pago.fecha_creacion.desc(), Pago.id.desc())]
+
+    cliente = app.test_client()
+    cliente.post('/auth/login', data={'email': 'compra@x.com', 'password': 'secreta'})
+    assert _ids_de_paginas(cliente, '/pago/mis-pagos') == (esperados, 3)
+
+    cliente.get('/auth/logout')
+    cliente.post('/auth/login', data={'email': 'otro@x.com', 'password': 'secreta'})
+    assert cliente.get(f'/propiedades/{propiedad_id}/pagos').status_code == 302
+
+    cliente.get('/auth/logout')
+    cliente.post('/auth/login', data={'email': 'vende@x.com', 'password': 'secreta'})
+    assert _ids_de_paginas(cliente, f'/propiedades/{propiedad_id}/pagos') == (esperados, 3)
@@ -0,0 +1,103 @@
+from app import create_app, db, limites
+from app.limites import AlmacenMemoria, AlmacenSQLite, Regla
+from app.models import Usuario
+
+
+def test_cubo_de_tokens_en_memoria():
+    almacen = AlmacenMemoria(fragmentos=4)
+    regla = Regla(tasa=1.0, rafaga=3)
+    assert [almacen.consumir('ip:1', regla, ahora=0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert almacen.consumir('ip:1', regla, ahora=0.0) == 1.0
+    assert almacen.consumir('ip:2', regla, ahora=0.0) == 0.0  # Cada clave tiene su propio cubo
+    assert almacen.consumir('ip:1', regla, ahora=1.5) == 0.0
+
+
+def test_purga_usa_la_recarga_de_cada_cubo():
+    # Un consumo de una regla rápida dispara la purga del fragmento; el cubo agotado de la regla
+    # lenta sigue vacío aunque haya pasado más tiempo del que la rápida tarda en llenarse
+    almacen = AlmacenMemoria(fragmentos=1, purga_cada=2)
+    lenta, rapida = Regla(tasa=0.01, rafaga=1), Regla(tasa=10.0, rafaga=10)
+    assert almacen.consumir('login:usuario:ana', lenta, ahora=0.0) == 0.0
+    assert almacen.consumir('busqueda:ip:1', rapida, ahora=5.0) == 0.0  # Purga
+    assert almacen.consumir('login:usuario:ana', lenta, ahora=6.0) > 90
+    almacen.consumir('busqueda:ip:1', rapida, ahora=200.0)  # Purga: ahora el cubo lento sí está lleno
+    _, cubos = almacen._fragmentos[0]
+    assert 'login:usuario:ana' not in cubos
+
+
+def test_cubos_compartidos_entre_procesos_en_sqlite(tmp_path):
+    ruta = str(tmp_path / 'limites.db')
+    proceso_a, proceso_b = AlmacenSQLite(ruta), AlmacenSQLite(ruta)
+    regla = Regla(tasa=0.5, rafaga=2)
+    assert proceso_a.consumir('login:ip:1', regla, ahora=100.0) == 0.0
+    assert proceso_b.consumir('login:ip:1', regla, ahora=100.0) == 0.0
+    assert proceso_a.consumir('login:ip:1', regla, ahora=100.0) == 2.0
+
+
+def test_endpoints_responden_429_y_503_con_retry_after(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('LIMITES_ACTIVOS', '1')
+    app = create_app()
+    app.config['LIMITES'] = {
+        'login': {'tasa': 0.01, 'rafaga': 2},
+        'login_cuenta': {'tasa': 0.01, 'rafaga': 5},
+        'pago_estado': {'tasa': 100.0, 'rafaga': 100, 'concurrencia': 1},
+        'busqueda': {'tasa': 0.01, 'rafaga': 1},
+    }
+    limites.configurar(app)
+    with app.app_context():
+        usuario = Usuario(nombre_usuario='ana', email='ana@x.com')
+        usuario.establecer_password('secreta')
+        db.session.add(usuario)
+        db.session.commit()
+
+    abusivo = app.test_client()
+    abusivo.environ_base['REMOTE_ADDR'] = '10.0.0.1'
+    for _ in range(2):
+        abusivo.post('/auth/login', data={'email': 'x@x.com', 'password': 'mal'})
+    respuesta = abusivo.post('/auth/login', data={'email': 'y@x.com', 'password': 'mal'})
+    assert respuesta.status_code == 429
+    assert int(respuesta.headers['Retry-After']) >= 1
+    assert abusivo.get('/auth/login').status_code == 200  # Solo se limita el POST
+
+    # Otro cliente no se ve afectado por la ráfaga del primero
+    normal = app.test_client()
+    normal.environ_base['REMOTE_ADDR'] = '10.0.0.2'
+    assert normal.post('/auth/login', data={'email': 'ana@x.com', 'password': 'secreta'}).status_code == 302
+
+    # Una sola IP se queda sin ráfaga mucho antes que la cuenta: su dueño sigue entrando
+    atacante = app.test_client()
+    atacante.environ_base['REMOTE_ADDR'] = '10.0.0.3'
+    codigos = [atacante.post('/auth/login', data={'email': 'ana@x.com', 'password': 'mal'}).status_code
+               for _ in range(3)]
+    assert codigos[-1] == 429
+    victima = app.test_client()
+    victima.environ_base['REMOTE_ADDR'] = '10.0.0.4'
+    assert victima.post('/auth/login', data={'email': 'ana@x.com', 'password': 'secreta'}).status_code == 302
+
+    # Pero desde muchas IPs el cubo de la cuenta termina frenando el ataque
+    codigos = []
+    for i in range(5, 8):
+        distribuido = app.test_client()
+        distribuido.environ_base['REMOTE_ADDR'] = f'10.0.0.{i}'
+        codigos.append(distribuido.post('/auth/login', data={'email': 'ana@x.com', 'password': 'mal'}).status_code)
+    assert codigos == [200, 429, 429]
+
+    # Búsqueda: solo cuenta cuando hay texto a buscar
+    assert normal.get('/propiedades/?q=casa').status_code == 200
+    assert normal.get('/propiedades/?q=casa').status_code == 429
+    assert normal.get('/propiedades/').status_code == 200
+
+    # Concurrencia: con el único cupo ocupado, el sondeo de estado recibe 503 en JSON
+    semaforo = app.extensions['limites'].semaforo('pago_estado')
+    semaforo.acquire()
+    try:
+        respuesta = normal.get('/pago/estado/inexistente')
+        assert respuesta.status_code == 503 and respuesta.get_json()['estado'] == 'limitado'
+        assert respuesta.headers['Retry-After'] == '1'
+    finally:
+        semaforo.release()
+    assert normal.get('/pago/estado/inexistente').status_code == 404
+
+    metricas = app.extensions['limites'].metricas()['endpoints']
+    assert metricas['login']['limitados'] == 2 and metricas['login_cuenta']['limitados'] == 2 and metricas['pago_estado']['saturados'] == 1
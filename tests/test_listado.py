@@ -0,0 +1,37 @@
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import Propiedad, TarjetaPropiedad, Usuario
+
+
+def test_listado_sin_descripcion_ni_instancias_del_orm(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('LIMITES_ACTIVOS', '0')
+    app = create_app()
+    with app.app_context():
+        usuario = Usuario(nombre_usuario='ana', email='ana@x.com')
+        usuario.establecer_password('secreta')
+        db.session.add(usuario)
+        db.session.flush()
+        db.session.add_all([
+            Propiedad(titulo='Casa grande', descripcion='Con piscina climatizada', precio=150_000,
+                      direccion='Calle 1', metros_cuadrados=80, habitaciones=3, propietario_id=usuario.id),
+            Propiedad(titulo='Depto', descripcion='Sin patio', precio=90_000, direccion='Calle 2',
+                      metros_cuadrados=40, propietario_id=usuario.id, vendida=True),
+        ])
+        db.session.commit()
+
+        fila = TarjetaPropiedad.consulta().filter(Propiedad.titulo == 'Depto').one()
+        tarjeta = TarjetaPropiedad(fila)
+        assert (tarjeta.titulo, tarjeta.precio, tarjeta.vendida) == ('Depto', 90_000, True)
+        assert not hasattr(tarjeta, '__dict__')
+        motor = db.engine
+
+    consultas = []
+    event.listen(motor, 'before_cursor_execute', lambda *args: consultas.append(args[2]))
+    cliente = app.test_client()
+    # La búsqueda sigue filtrando por descripción, pero la descripción no se lee
+    html = cliente.get('/propiedades/?q=piscina').get_data(as_text=True)
+    assert 'Casa grande' in html and 'Depto' not in html
+    listados = [c for c in consultas if c.startswith('SELECT propiedad.id')]
+    assert listados and all('propiedad.descripcion' not in c.split('FROM')[0] for c in listados)
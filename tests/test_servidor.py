@@ -0,0 +1,222 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+import simple_websocket
+
+import servidor
+from app import create_app, db, tasks
+from app.models import Propiedad, Usuario
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as respuesta:
+            return respuesta.status, json.loads(respuesta.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+def _lanzar_servidor(tmp_path, workers=2, **variables):
+    # Maestro con `workers` procesos en un puerto libre; devuelve el proceso y la URL base cuando está listo
+    with socket.socket() as libre:
+        libre.bind(('127.0.0.1', 0))
+        puerto = libre.getsockname()[1]
+    entorno = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'app.db'}",
+                   SOCKETIO_MESSAGE_QUEUE=f"sqlite:///{tmp_path / 'socketio.db'}",
+                   LIMITES_BACKEND=f"sqlite:///{tmp_path / 'limites.db'}", **variables)
+    proceso = subprocess.Popen([sys.executable, 'servidor.py', '--host', '127.0.0.1', '--puerto', str(puerto),
+                                '--workers', str(workers), '--gracia', '5'],
+                               cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{puerto}'
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        try:
+            if _get(base + '/listo')[0] == 200:
+                break
+        except OSError:
+            pass
+        time.sleep(0.1)
+    return proceso, base
+
+
+def _detener(proceso):
+    if proceso.poll() is None:
+        proceso.send_signal(signal.SIGTERM)
+        try:
+            proceso.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+
+
+def _socketio_por_worker(base):
+    # Conexiones de Socket.IO abiertas en cada worker, según /salud
+    vistos = {}
+    limite = time.monotonic() + 10
+    while len(vistos) < 2 and time.monotonic() < limite:
+        salud = _get(base + '/salud')[1]
+        vistos[salud['pid']] = salud['socketio_en_curso']
+    return vistos
+
+
+def _conectar_socketio(base, propiedad_id):
+    # Cliente mínimo de Engine.IO 4 / Socket.IO 5 sobre WebSocket que sigue la sala de una propiedad
+    cliente = simple_websocket.Client.connect(base.replace('http', 'ws') + '/socket.io/?EIO=4&transport=websocket')
+    # El paquete de apertura puede llegar junto con la respuesta del handshake y simple-websocket
+    # no lo entrega hasta recibir más datos: se pide la conexión al namespace sin esperarlo
+    cliente.send('40')
+    apertura, conexion = cliente.receive(timeout=5), cliente.receive(timeout=5)
+    assert apertura.startswith('0') and conexion.startswith('40')
+    cliente.send('42' + json.dumps(['seguir_propiedades', {'ids': [propiedad_id]}]))
+    return cliente
+
+
+def _preparar_base(tmp_path, monkeypatch):
+    # Un administrador (también comprador) y una propiedad de otro usuario; devuelve el id de la propiedad
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    app = create_app(servicios=False)
+    with app.app_context():
+        for nombre, admin in (('admin', True), ('dueno', False)):
+            usuario = Usuario(nombre_usuario=nombre, email=f'{nombre}@x.com', es_administrador=admin)
+            usuario.establecer_password('secreta')
+            db.session.add(usuario)
+        db.session.flush()
+        dueno = Usuario.query.filter_by(nombre_usuario='dueno').one()
+        propiedad = Propiedad(titulo='Casa', descripcion='-', precio=100.0, direccion='-', propietario_id=dueno.id)
+        db.session.add(propiedad)
+        db.session.commit()
+        return propiedad.id
+
+
+def _navegador(base):
+    navegador = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    navegador.open(base + '/auth/login', urllib.parse.urlencode(
+        {'email': 'admin@x.com', 'password': 'secreta'}).encode(), timeout=5)
+    return navegador
+
+
+def _esperar_evento(cliente, evento, timeout=10):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        paquete = cliente.receive(timeout=max(0.0, limite - time.monotonic()))
+        if paquete == '2':
+            cliente.send('3')  # Ping de Engine.IO
+        elif paquete and paquete.startswith('42'):
+            nombre, datos = json.loads(paquete[2:])
+            if nombre == evento:
+                return datos
+    return None
+
+
+def test_salud_y_listo_por_proceso(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    app = create_app()
+    cliente = app.test_client()
+    # Sin los hilos de fondo el proceso atiende pero no está listo para recibir tráfico
+    assert cliente.get('/listo').status_code == 503
+    app = create_app(servicios=True)
+    cliente = app.test_client()
+    salud = cliente.get('/salud').get_json()
+    assert salud['pid'] == os.getpid() and salud['http_en_curso'] == 1  # La propia petición
+
+    listo = cliente.get('/listo')
+    assert listo.status_code == 200 and listo.get_json()['base_datos']
+
+    app.extensions['salud'].drenando = True
+    listo = cliente.get('/listo')
+    assert listo.status_code == 503 and not listo.get_json()['listo']
+    assert listo.headers['Connection'] == 'close'
+
+
+def test_drenado_espera_trabajos_en_curso(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    app = create_app()
+    tasks.enviar_trabajo(app, time.sleep, 0.5)
+    inicio = time.monotonic()
+    servidor._drenar(app, gracia=5)
+    assert tasks.trabajos_en_curso() == 0
+    assert time.monotonic() - inicio >= 0.4
+
+
+def test_maestro_recarga_gradual_y_detencion(tmp_path):
+    proceso, base = _lanzar_servidor(tmp_path)
+    try:
+        anteriores = {_get(base + '/salud')[1]['pid'] for _ in range(20)}
+        assert len(anteriores) == 2  # Los dos workers atienden el mismo puerto
+
+        proceso.send_signal(signal.SIGHUP)
+        codigos = set()
+        nuevos = set()
+        limite = time.monotonic() + 30
+        while time.monotonic() < limite and not (len(nuevos) == 2 and not nuevos & anteriores):
+            codigos.add(_get(base + '/listo')[0])
+            nuevos = {_get(base + '/salud')[1]['pid'] for _ in range(10)}
+        assert codigos == {200}  # Durante la recarga siempre hay workers listos
+        assert len(nuevos) == 2 and not nuevos & anteriores
+
+        proceso.send_signal(signal.SIGTERM)
+        assert proceso.wait(timeout=30) == 0
+    finally:
+        if proceso.poll() is None:
+            proceso.kill()
+
+
+def test_emision_de_un_worker_llega_a_clientes_del_otro(tmp_path, monkeypatch):
+    propiedad_id = _preparar_base(tmp_path, monkeypatch)
+    proceso, base = _lanzar_servidor(tmp_path)
+    clientes = []
+    try:
+        # Un cliente en cada worker: la edición la atiende uno solo, el otro recibe el evento por la cola
+        while len(clientes) < 10:
+            clientes.append(_conectar_socketio(base, propiedad_id))
+            por_worker = _socketio_por_worker(base)
+            if len(por_worker) == 2 and all(por_worker.values()):
+                break
+        assert len(por_worker) == 2 and all(por_worker.values())
+
+        _navegador(base).open(f'{base}/propiedades/editar/{propiedad_id}', urllib.parse.urlencode(
+            {'titulo': 'Casa', 'descripcion': '-', 'precio': '250'}).encode(), timeout=5)
+        for cliente in clientes:
+            assert _esperar_evento(cliente, 'propiedad_actualizada') == {
+                'id': propiedad_id, 'precio': 250.0, 'vendida': False}
+    finally:
+        for cliente in clientes:
+            cliente.close()
+        _detener(proceso)
+
+
+def test_estado_del_pago_desde_cualquier_worker(tmp_path, monkeypatch):
+    propiedad_id = _preparar_base(tmp_path, monkeypatch)
+    proceso, base = _lanzar_servidor(tmp_path, PAGO_DEMORA_SEGUNDOS='0.5', LIMITES_ACTIVOS='0')
+    try:
+        navegador = _navegador(base)
+        with navegador.open(f'{base}/pago/pagar/{propiedad_id}', b'', timeout=5) as respuesta:
+            esperar = urllib.parse.urlsplit(respuesta.geturl())
+        job_id = esperar.path.rsplit('/', 1)[-1]
+        url = f'{base}/pago/estado/{job_id}?{esperar.query}'
+
+        # El trabajo vive en un solo worker; los sondeos se reparten entre los dos y ninguno da 404
+        estados, pids = [], set()
+        limite = time.monotonic() + 20
+        while time.monotonic() < limite and (len(pids) < 2 or estados[-1]['estado'] != 'completado'):
+            with navegador.open(url, timeout=5) as respuesta:
+                estados.append(json.loads(respuesta.read()))
+            pids.add(_get(base + '/salud')[1]['pid'])
+        assert len(pids) == 2
+        assert {e['estado'] for e in estados} <= {'ejecutando', 'procesando', 'completado'}
+        for _ in range(10):
+            with navegador.open(url, timeout=5) as respuesta:
+                datos = json.loads(respuesta.read())
+            assert (datos['estado'], datos['exito'], datos['propiedad_id']) == ('completado', True, propiedad_id)
+    finally:
+        _detener(proceso)
@@ -0,0 +1,63 @@
+from threading import Thread
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import Propiedad, Usuario
+from app.vistas import ContadorFragmentado
+
+
+def test_contador_fragmentado_no_pierde_incrementos():
+    contador = ContadorFragmentado(fragmentos=4)
+    hilos = [Thread(target=lambda: [contador.sumar(i % 3) for i in range(3000)]) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert contador.pendientes() == 24_000
+    assert contador.tomar() == {0: 8000, 1: 8000, 2: 8000}
+    assert contador.tomar() == {} and contador.pendientes() == 0
+
+
+def test_vistas_en_memoria_volcadas_en_lote(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('VISTAS_INTERVALO_S', '0')  # Sin hilo: el volcado se llama a mano
+    app = create_app()
+    with app.app_context():
+        usuario = Usuario(nombre_usuario='ana', email='ana@x.com')
+        usuario.establecer_password('secreta')
+        db.session.add(usuario)
+        db.session.flush()
+        casa = Propiedad(titulo='Casa', descripcion='-', precio=1, direccion='-', propietario_id=usuario.id)
+        depto = Propiedad(titulo='Depto', descripcion='-', precio=2, direccion='-', propietario_id=usuario.id)
+        db.session.add_all([casa, depto])
+        db.session.commit()
+        casa_id, depto_id, version = casa.id, depto.id, casa.fecha_actualizacion
+        motor = db.engine
+
+    escrituras = []
+    event.listen(motor, 'before_cursor_execute',
+                 lambda *args: args[2].lstrip().upper().startswith(('INSERT', 'UPDATE')) and escrituras.append(args[2]))
+    visitante, otro = app.test_client(), app.test_client()
+    assert visitante.get(f'/propiedades/{casa_id}').status_code == 200
+    visitante.get(f'/propiedades/{casa_id}')  # Misma sesión: no se cuenta otra vez
+    otro.get(f'/propiedades/{casa_id}')
+    otro.get(f'/propiedades/{depto_id}')
+    otro.get(f'/propiedades/{depto_id}', headers={'User-Agent': 'Googlebot/2.1'})
+    app.test_client().get(f'/propiedades/{depto_id}', headers={'User-Agent': 'curl/8.0'})
+    assert escrituras == []  # El detalle no escribe en la base
+
+    vistas = app.extensions['vistas']
+    assert (vistas.registradas, vistas.repetidas, vistas.bots, vistas.contador.pendientes()) == (3, 1, 2, 3)
+    assert vistas.volcar() == 2
+    assert sum(e.startswith('UPDATE propiedad') for e in escrituras) == 1  # Un solo UPDATE en lote
+    with app.app_context():
+        casa = db.session.get(Propiedad, casa_id)
+        depto = db.session.get(Propiedad, depto_id)
+        assert (casa.vistas, depto.vistas) == (2, 1)
+        assert casa.popularidad == 2 * depto.popularidad > 0
+        assert casa.fecha_actualizacion == version  # Las cachés de fragmentos siguen válidas
+
+    html = app.test_client().get('/propiedades/?orden=populares').get_data(as_text=True)
+    assert html.index('Casa') < html.index('Depto')
+    assert vistas.metricas()['filas_actualizadas'] == 2